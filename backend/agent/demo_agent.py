@@ -16,7 +16,8 @@ class DemoAgent:
     def _execute_demo(self) -> Dict[str, Any]:
         url = f"{self.backend_url}/execute-demo"
         print(f"[demo-agent] POST {url}")
-        with httpx.Client(timeout=180) as client:
+        # Returns once the payment is broadcast; the backend records it when the receipt arrives.
+        with httpx.Client(timeout=30) as client:
             resp = client.post(url)
             resp.raise_for_status()
             return resp.json()
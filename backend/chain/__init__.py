@@ -0,0 +1 @@
+__all__ = ["aggregator", "channels", "fees", "indexer", "nonces", "policy", "pool", "receipts", "reconciler", "rpc", "signers", "simulator", "tracker", "verifier", "vouchers"]
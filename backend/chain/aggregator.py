@@ -0,0 +1,192 @@
+"""
+Batched settlement of backend payments through AgentVault.executeBatchPayment.
+
+Every executePayment call pays the 21k transaction overhead, a policy read
+and a token transfer of its own. PaymentAggregator holds payments for up to
+PAYMENT_BATCH_WINDOW_MS (or until PAYMENT_BATCH_MAX_ITEMS are waiting) and
+sends them as one transaction. Items are ordered by agent so the contract
+reads each agent's policy once, and it pays each recipient once with the
+summed amount.
+
+The contract emits one PaymentExecuted or PaymentBlocked log per item, in
+item order, so ``item_result`` maps a receipt back to a single payment. A
+blocked item does not revert the batch; its caller gets the reason instead.
+A window holding a single payment is sent as a plain executePayment.
+A transaction that ran out of gas can be told apart with ``out_of_gas``, so
+its callers can submit their items again on a fresh estimate.
+"""
+
+import asyncio
+import os
+from collections import OrderedDict
+
+from web3 import Web3
+
+PAYMENT_BATCH_WINDOW_MS = float(os.getenv("PAYMENT_BATCH_WINDOW_MS", "200"))
+PAYMENT_BATCH_MAX_ITEMS = int(os.getenv("PAYMENT_BATCH_MAX_ITEMS", "50"))
+# Transactions whose gas shape and limit are remembered for out_of_gas.
+PAYMENT_BATCH_SENT_HISTORY = 1024
+
+_EXECUTED_TOPIC = Web3.keccak(text="PaymentExecuted(bytes32,address,uint256,uint256)")
+_BLOCKED_TOPIC = Web3.keccak(text="PaymentBlocked(bytes32,string)")
+
+
+class PaymentAggregator:
+    def __init__(
+        self,
+        vault,
+        nonces,
+        fees,
+        window_ms: float = PAYMENT_BATCH_WINDOW_MS,
+        max_items: int = PAYMENT_BATCH_MAX_ITEMS,
+    ):
+        self.vault = vault
+        self.nonces = nonces
+        self.fees = fees
+        self.window_seconds = window_ms / 1000
+        self.max_items = max_items
+        # (agent id, recipient, amount units, future) waiting for the next flush
+        self._pending: list[tuple[bytes, str, int, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._sending: set[asyncio.Task] = set()
+        # tx hash -> [gas shape, gas limit, out-of-gas verdict once its receipt is seen] of recent transactions
+        self._sent: OrderedDict[str, list] = OrderedDict()
+
+        self.batches = 0
+        self.singles = 0
+        self.items = 0
+        self.largest = 0
+        self.errors = 0
+
+    async def submit(self, agent_id: bytes, recipient: str, amount_units: int) -> tuple[str, int]:
+        """Queue a payment. Returns (tx hash, item index) once its transaction is broadcast."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((bytes(agent_id), Web3.to_checksum_address(recipient), int(amount_units), future))
+        if len(self._pending) >= self.max_items:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_seconds, self.flush)
+        return await asyncio.shield(future)
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        items, self._pending = self._pending, []
+        if not items:
+            return
+        task = asyncio.get_running_loop().create_task(self._send(items))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def stop(self):
+        self.flush()
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+
+    async def _send(self, items: list):
+        # Stable sort: items of one agent stay in arrival order and form a single policy read.
+        items = sorted(items, key=lambda item: item[0])
+        try:
+            await self.fees.ready()
+            if len(items) == 1:
+                agent_id, recipient, amount, _ = items[0]
+                name = "executePayment"
+                args = [agent_id, recipient, amount]
+                shape = name
+            else:
+                name = "executeBatchPayment"
+                args = [[i[0] for i in items], [i[1] for i in items], [i[2] for i in items]]
+                # Gas grows with items, policy reads and transfers; memoize one estimate per shape.
+                runs = sum(1 for n, item in enumerate(items) if n == 0 or item[0] != items[n - 1][0])
+                shape = f"{name}:{len(items)}x{runs}x{len({i[1] for i in items})}"
+            call = {
+                "from": self.nonces.address,
+                "to": self.vault.address,
+                "data": self.vault.encodeABI(fn_name=name, args=args),
+            }
+            gas = await self.fees.gas_limit(shape, call)
+            tx_hash = await self.nonces.send(
+                {
+                    **call,
+                    "value": 0,
+                    "gas": gas,
+                    "chainId": self.fees.chain_id,
+                    **self.fees.quote(),
+                }
+            )
+        except Exception as e:
+            self.errors += 1
+            print(f"[aggregator] ERROR: batch of {len(items)} failed to send: {e}")
+            for *_, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        tx_hash_hex = Web3.to_hex(tx_hash)
+        self._sent[tx_hash_hex] = [shape, gas, None]
+        while len(self._sent) > PAYMENT_BATCH_SENT_HISTORY:
+            self._sent.popitem(last=False)
+        if len(items) == 1:
+            self.singles += 1
+        else:
+            self.batches += 1
+        self.items += len(items)
+        self.largest = max(self.largest, len(items))
+        print(f"[aggregator] sent {len(items)} payment(s) in {tx_hash_hex}")
+        for index, (*_, future) in enumerate(items):
+            if not future.done():
+                future.set_result((tx_hash_hex, index))
+
+    def out_of_gas(self, tx_hash_hex: str, receipt) -> bool:
+        """True if transaction ``tx_hash_hex`` reverted by running out of gas; its shape is then re-estimated."""
+        sent = self._sent.get(tx_hash_hex)
+        if sent is None:
+            return False
+        # Every item of the batch asks; the oracle hears about the transaction once.
+        if sent[2] is None:
+            sent[2] = self.fees.out_of_gas(sent[0], sent[1], receipt)
+        return sent[2]
+
+    def item_result(self, receipt, index: int) -> dict:
+        """Outcome of item ``index`` in a mined batch of ``items``: executed (with its log) or blocked (with the reason)."""
+        outcomes = [
+            log
+            for log in receipt.get("logs", [])
+            if Web3.to_checksum_address(log["address"]) == self.vault.address
+            and log["topics"]
+            and bytes(log["topics"][0]) in (_EXECUTED_TOPIC, _BLOCKED_TOPIC)
+        ]
+        if index >= len(outcomes):
+            raise RuntimeError(f"No payment log for batch item {index}")
+        log = outcomes[index]
+        if bytes(log["topics"][0]) == _BLOCKED_TOPIC:
+            event = self.vault.events.PaymentBlocked().process_log(log)
+            return {
+                "status": "blocked",
+                "reason": event["args"]["reason"],
+                "log_index": int(log["logIndex"]),
+                "items": len(outcomes),
+            }
+        event = self.vault.events.PaymentExecuted().process_log(log)
+        return {
+            "status": "executed",
+            "recipient": event["args"]["recipient"],
+            "amount": int(event["args"]["amount"]),
+            "log_index": int(log["logIndex"]),
+            "items": len(outcomes),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window_seconds * 1000,
+            "max_items": self.max_items,
+            "waiting": len(self._pending),
+            "sending": len(self._sending),
+            "batches": self.batches,
+            "single_payments": self.singles,
+            "items": self.items,
+            "largest_batch": self.largest,
+            "errors": self.errors,
+        }
@@ -0,0 +1,336 @@
+"""
+Payment channels: paid calls settled by signed vouchers instead of a
+transaction each.
+
+An agent locks funds for a recipient once with AgentVault.openChannel. Each
+paid call then carries a voucher for the running total it has paid through
+the channel (see chain.vouchers). ChannelBook accepts a voucher with a local
+signature check against its cached copy of the channel:
+
+  * it must be signed by the channel's signer;
+  * it must cover everything already accepted on the channel plus this
+    call. A voucher below the best one seen is still accepted while that
+    best voucher has room left, so concurrent calls may arrive out of order,
+    but no call is accepted beyond a signed amount;
+  * the total may not pass the channel's deposit, and no vouchers are taken
+    within CHANNEL_EXPIRY_MARGIN_SECONDS of the channel's expiry.
+
+The call is charged only once its ledger row is written; if that fails, the
+room it took on the channel is handed back. The channel's accepted total and
+best voucher are saved in the same write as that row, so a crash can never
+restore a channel behind a call that was served.
+
+The chain is read once per channel, on its first voucher, and again on every
+settlement pass. Every CHANNEL_SETTLE_SECONDS the best voucher of each
+channel is redeemed on chain once CHANNEL_SETTLE_MIN_USDC is unredeemed or
+the channel is near expiry.
+"""
+
+import asyncio
+import os
+import secrets
+import time
+
+from fastapi import HTTPException
+from web3 import Web3
+
+from chain.vouchers import domain_separator, parse_voucher, recover_signer, voucher_digest
+
+CHANNEL_SETTLE_SECONDS = float(os.getenv("CHANNEL_SETTLE_SECONDS", "60"))
+CHANNEL_SETTLE_MIN_USDC = float(os.getenv("CHANNEL_SETTLE_MIN_USDC", "1"))
+CHANNEL_EXPIRY_MARGIN_SECONDS = float(os.getenv("CHANNEL_EXPIRY_MARGIN_SECONDS", "600"))
+
+_ZERO_ADDRESS = bytes(20)
+
+
+class Channel:
+    def __init__(self, agent_id: bytes, recipient: str):
+        self.agent_id = agent_id
+        self.recipient = recipient
+        self.id = Web3.to_hex(Web3.keccak(agent_id + Web3.to_bytes(hexstr=recipient)))
+        # On-chain state, refreshed on every settlement pass. signer is None while no channel is open.
+        self.signer: bytes | None = None
+        self.deposited = 0
+        self.redeemed = 0
+        self.expires_at = 0
+        # Units of service accepted, and the highest voucher seen with its signature.
+        self.accepted = 0
+        self.latest = 0
+        self.signature: bytes | None = None
+        self.dirty = False
+
+    def update(self, state):
+        signer, deposited, redeemed, expires_at = state
+        signer = Web3.to_bytes(hexstr=signer)
+        self.signer = None if signer == _ZERO_ADDRESS else signer
+        self.deposited, self.redeemed, self.expires_at = int(deposited), int(redeemed), int(expires_at)
+        # Redeemed elsewhere (another backend, or the recipient directly).
+        if self.redeemed > self.latest:
+            self.latest, self.signature = self.redeemed, None
+        self.accepted = max(self.accepted, self.redeemed)
+
+    def row(self) -> dict:
+        """The channel's saved state, as stored in payment_channels."""
+        return {
+            "agent_id": Web3.to_hex(self.agent_id),
+            "recipient": self.recipient,
+            "accepted": str(self.accepted),
+            "latest": str(self.latest),
+            "signature": Web3.to_hex(self.signature) if self.signature else None,
+            "updated_at": int(time.time()),
+        }
+
+    def detail(self) -> dict:
+        return {
+            "signer": Web3.to_checksum_address(self.signer) if self.signer else None,
+            "deposited_units": self.deposited,
+            "redeemed_units": self.redeemed,
+            "accepted_units": self.accepted,
+            "expires_at": self.expires_at,
+        }
+
+
+class ChannelBook:
+    def __init__(self, w3, vault, store, nonces=None, fees=None, tracker=None):
+        self.w3 = w3
+        self.vault = vault
+        self.store = store
+        # Signing and receipt tracking for redemptions; without them vouchers are only accepted and saved.
+        self.nonces = nonces
+        self.fees = fees
+        self.tracker = tracker
+        self.min_settle_units = int(round(CHANNEL_SETTLE_MIN_USDC * 10**6))
+        self.domain: bytes | None = None
+        # (agent id, recipient) -> channel
+        self._channels: dict[tuple[bytes, str], Channel] = {}
+        self._loading: dict[tuple[bytes, str], asyncio.Task] = {}
+        self._task: asyncio.Task | None = None
+
+        self.accepted_calls = 0
+        self.rejected = 0
+        self.verify_seconds = 0.0
+        self.redemptions = 0
+        self.redeemed_units = 0
+        self.errors = 0
+
+    async def load(self):
+        """Read the signing domain and restore the vouchers saved before a restart."""
+        self.domain = domain_separator(int(await self.w3.eth.chain_id), self.vault.address)
+        rows = await self.store.fetch_payment_channels()
+        for row in rows:
+            channel = self._channel(Web3.to_bytes(hexstr=row["agent_id"]), row["recipient"])
+            channel.accepted = int(row["accepted"])
+            channel.latest = int(row["latest"])
+            channel.signature = Web3.to_bytes(hexstr=row["signature"]) if row["signature"] else None
+        if rows:
+            await self._refresh(list(self._channels.values()))
+        print(f"[channels] restored {len(rows)} channel(s)")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            task, self._task = self._task, None
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self._save()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(CHANNEL_SETTLE_SECONDS)
+            try:
+                await self.settle_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                print(f"[channels] ERROR: {e}")
+
+    def _channel(self, agent_id: bytes, recipient: str) -> Channel:
+        key = (bytes(agent_id), recipient)
+        channel = self._channels.get(key)
+        if channel is None:
+            channel = self._channels[key] = Channel(bytes(agent_id), recipient)
+        return channel
+
+    async def _get(self, agent_id: bytes, recipient: str) -> Channel:
+        key = (bytes(agent_id), recipient)
+        channel = self._channels.get(key)
+        if channel is not None:
+            return channel
+        # Concurrent first vouchers for a channel share one chain read.
+        task = self._loading.get(key)
+        if task is None:
+            task = self._loading[key] = asyncio.get_running_loop().create_task(self._fetch(agent_id, recipient))
+            task.add_done_callback(lambda _: self._loading.pop(key, None))
+        try:
+            return await asyncio.shield(task)
+        except Exception as e:
+            # A failed or timed-out chain read says nothing about the voucher; the caller may retry.
+            self.errors += 1
+            print(f"[channels] reading channel {Web3.to_hex(agent_id)}/{recipient} failed: {e}")
+            raise HTTPException(status_code=503, detail={"error": "Payment channel state is unavailable"})
+
+    async def _fetch(self, agent_id: bytes, recipient: str) -> Channel:
+        state = await self.vault.functions.getChannel(agent_id, recipient).call()
+        channel = self._channel(agent_id, recipient)
+        channel.update(state)
+        return channel
+
+    def _reject(self, status_code: int, error: str, channel: Channel | None = None):
+        self.rejected += 1
+        detail = {"error": error}
+        if channel is not None:
+            detail["channel"] = channel.detail()
+        raise HTTPException(status_code=status_code, detail=detail)
+
+    async def accept(self, agent_id: bytes, recipient: str, price_units: int, header: str, record=None) -> str:
+        """Accept a voucher paying ``price_units`` for one call. Returns an id unique to the call.
+
+        ``record`` is awaited with that id and the channel's row to save alongside it
+        before the call counts as paid.
+        """
+        try:
+            cumulative, signature = parse_voucher(header)
+        except ValueError:
+            self._reject(402, "Malformed payment voucher")
+        channel = self._channels.get((bytes(agent_id), recipient)) or await self._get(agent_id, recipient)
+
+        started = time.perf_counter()
+        if channel.signer is None:
+            self._reject(402, "No open payment channel for this endpoint")
+        if time.time() > channel.expires_at - CHANNEL_EXPIRY_MARGIN_SECONDS:
+            self._reject(402, "Payment channel is expired or about to expire", channel)
+        if cumulative > channel.deposited:
+            self._reject(402, "Voucher exceeds the channel deposit", channel)
+        try:
+            signer = recover_signer(voucher_digest(self.domain, agent_id, recipient, cumulative), signature)
+        except ValueError:
+            signer = None
+        if signer != channel.signer:
+            self._reject(402, "Voucher is not signed by the channel signer", channel)
+        if channel.accepted + price_units > max(channel.latest, cumulative):
+            self._reject(409, "Voucher does not cover this call", channel)
+
+        # Taken before awaiting ``record``, so concurrent calls cannot spend the same room.
+        channel.accepted += price_units
+        previous = (channel.latest, channel.signature)
+        if cumulative > channel.latest:
+            channel.latest, channel.signature = cumulative, signature
+        self.verify_seconds += time.perf_counter() - started
+        # The per-call nonce keeps ids unique even if two backends share a channel.
+        voucher_id = f"voucher:{channel.id}:{cumulative}:{secrets.token_hex(8)}"
+        if record is not None:
+            try:
+                await record(voucher_id, channel.row())
+            except Exception:
+                channel.accepted -= price_units
+                # Keep this voucher if calls accepted meanwhile rely on it.
+                if channel.latest == cumulative and channel.accepted <= previous[0]:
+                    channel.latest, channel.signature = previous
+                raise
+        channel.dirty = True
+        self.accepted_calls += 1
+        return voucher_id
+
+    async def _refresh(self, channels: list[Channel]):
+        states = await asyncio.gather(
+            *(self.vault.functions.getChannel(c.agent_id, c.recipient).call() for c in channels),
+            return_exceptions=True,
+        )
+        for channel, state in zip(channels, states):
+            if isinstance(state, Exception):
+                self.errors += 1
+                continue
+            channel.update(state)
+
+    async def _save(self):
+        dirty = [c for c in self._channels.values() if c.dirty]
+        if not dirty:
+            return
+        for channel in dirty:
+            channel.dirty = False
+        try:
+            await self.store.save_payment_channels([c.row() for c in dirty])
+        except Exception:
+            for channel in dirty:
+                channel.dirty = True
+            raise
+
+    async def settle_once(self) -> int:
+        """Save the best vouchers, refresh channel state and redeem what is due. Returns redemptions sent."""
+        await self._save()
+        channels = list(self._channels.values())
+        if not channels:
+            return 0
+        await self._refresh(channels)
+        if self.nonces is None:
+            return 0
+        now = time.time()
+        due = [
+            c
+            for c in channels
+            if c.signature is not None
+            and c.latest > c.redeemed
+            and (c.latest - c.redeemed >= self.min_settle_units or now > c.expires_at - CHANNEL_EXPIRY_MARGIN_SECONDS)
+        ]
+        results = await asyncio.gather(*(self._redeem(c) for c in due), return_exceptions=True)
+        for channel, result in zip(due, results):
+            if isinstance(result, Exception):
+                self.errors += 1
+                print(f"[channels] redeeming {channel.id} failed: {result}")
+        return len(due)
+
+    async def _redeem(self, channel: Channel):
+        cumulative, signature = channel.latest, channel.signature
+        await self.fees.ready()
+        call = {
+            "from": self.nonces.address,
+            "to": self.vault.address,
+            "data": self.vault.encodeABI(
+                fn_name="redeemVoucher", args=[channel.agent_id, channel.recipient, cumulative, signature]
+            ),
+        }
+        # A second attempt only follows an out-of-gas revert, on a fresh estimate.
+        for attempt in range(2):
+            gas = await self.fees.gas_limit("redeemVoucher", call)
+            tx_hash = await self.nonces.send(
+                {
+                    **call,
+                    "value": 0,
+                    "gas": gas,
+                    "chainId": self.fees.chain_id,
+                    **self.fees.quote(),
+                }
+            )
+            if self.tracker is not None:
+                receipt = await self.tracker.wait(tx_hash)
+            else:
+                receipt = await self.w3.eth.wait_for_transaction_receipt(tx_hash)
+            if attempt or not self.fees.out_of_gas("redeemVoucher", gas, receipt):
+                break
+        if receipt["status"] != 1:
+            raise RuntimeError(f"redeemVoucher {Web3.to_hex(tx_hash)} reverted")
+        paid = cumulative - channel.redeemed
+        channel.redeemed = max(channel.redeemed, cumulative)
+        self.redemptions += 1
+        self.redeemed_units += paid
+        print(f"[channels] redeemed {paid / 10**6:.6f} USDC on {channel.id} in {Web3.to_hex(tx_hash)}")
+
+    def stats(self) -> dict:
+        channels = list(self._channels.values())
+        return {
+            "channels": sum(1 for c in channels if c.signer is not None),
+            "accepted_calls": self.accepted_calls,
+            "rejected": self.rejected,
+            "avg_verify_us": round(self.verify_seconds / self.accepted_calls * 10**6, 1) if self.accepted_calls else None,
+            "unredeemed_usdc": sum(c.latest - c.redeemed for c in channels) / 10**6,
+            "redemptions": self.redemptions,
+            "redeemed_usdc": self.redeemed_units / 10**6,
+            "errors": self.errors,
+        }
@@ -0,0 +1,200 @@
+"""
+Cached EIP-1559 fee quotes for the backend and SDK signers.
+
+The chain id is read once and kept. Base fee and priority fee come from
+``eth_feeHistory`` over the last FEE_HISTORY_BLOCKS blocks and are refreshed
+when the head moves FEE_REFRESH_BLOCKS blocks on (checked every
+FEE_POLL_SECONDS by the background task). A quote is built from the cached
+values and never waits on the RPC:
+
+  maxPriorityFeePerGas = FEE_PRIORITY_PERCENTILE of recent tips,
+                         at least FEE_MIN_PRIORITY_GWEI
+  maxFeePerGas         = FEE_BASE_FEE_MULTIPLIER x next base fee + tip
+
+A process without the background task (the SDK) refreshes in the
+background whenever a quote is older than FEE_MAX_AGE_SECONDS and keeps
+quoting the cached values meanwhile.
+
+Gas estimates are memoized per call shape, a key chosen by the caller that
+covers what changes the cost (the function, and for batches their length),
+with FEE_GAS_MARGIN headroom. An estimate is kept for FEE_GAS_TTL_SECONDS.
+A transaction that reverted after using nearly all of its gas dropped the
+memo through ``out_of_gas``, so the caller's one retry estimates afresh.
+"""
+
+import asyncio
+import os
+import statistics
+import time
+
+FEE_POLL_SECONDS = float(os.getenv("FEE_POLL_SECONDS", "2"))
+FEE_REFRESH_BLOCKS = int(os.getenv("FEE_REFRESH_BLOCKS", "1"))
+FEE_MAX_AGE_SECONDS = float(os.getenv("FEE_MAX_AGE_SECONDS", "30"))
+FEE_HISTORY_BLOCKS = int(os.getenv("FEE_HISTORY_BLOCKS", "10"))
+FEE_PRIORITY_PERCENTILE = float(os.getenv("FEE_PRIORITY_PERCENTILE", "50"))
+# Polygon PoS rejects tips below 25 gwei.
+FEE_MIN_PRIORITY_GWEI = float(os.getenv("FEE_MIN_PRIORITY_GWEI", "25"))
+FEE_BASE_FEE_MULTIPLIER = float(os.getenv("FEE_BASE_FEE_MULTIPLIER", "2"))
+FEE_GAS_MARGIN = float(os.getenv("FEE_GAS_MARGIN", "1.25"))
+FEE_DEFAULT_GAS = int(os.getenv("FEE_DEFAULT_GAS", "300000"))
+FEE_GAS_TTL_SECONDS = float(os.getenv("FEE_GAS_TTL_SECONDS", "600"))
+
+
+class FeeOracle:
+    def __init__(self, w3):
+        self.w3 = w3
+        self.chain_id: int | None = None
+        self.base_fee: int | None = None
+        self.priority_fee: int | None = None
+        # Legacy gasPrice, used only when the node has no eth_feeHistory.
+        self.gas_price: int | None = None
+        self.head: int | None = None
+        self.updated_at = 0.0
+        # call shape -> (gas limit, time estimated)
+        self._gas: dict[str, tuple[int, float]] = {}
+        # call shape -> estimate in progress, shared by concurrent first callers
+        self._estimating: dict[str, asyncio.Task] = {}
+        self._refreshing: asyncio.Task | None = None
+        self._task: asyncio.Task | None = None
+
+        self.refreshes = 0
+        self.quotes = 0
+        self.estimates = 0
+        self.out_of_gas_reverts = 0
+        self.errors = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self):
+        while True:
+            try:
+                head = int(await self.w3.eth.block_number)
+                if self.head is None or head - self.head >= FEE_REFRESH_BLOCKS:
+                    await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                print(f"[fees] ERROR: {e}")
+            await asyncio.sleep(FEE_POLL_SECONDS)
+
+    async def ready(self):
+        """Load the chain id and fees if nothing has been fetched yet."""
+        if self.chain_id is None or (self.base_fee is None and self.gas_price is None):
+            if self._refreshing is None or self._refreshing.done():
+                self._refreshing = asyncio.get_running_loop().create_task(self.refresh())
+            await asyncio.shield(self._refreshing)
+
+    async def refresh(self):
+        if self.chain_id is None:
+            self.chain_id = int(await self.w3.eth.chain_id)
+        try:
+            history = await self.w3.eth.fee_history(FEE_HISTORY_BLOCKS, "latest", [FEE_PRIORITY_PERCENTILE])
+        except Exception as e:
+            if self.base_fee is not None:
+                raise
+            # Pre-London node: fall back to legacy pricing.
+            print(f"[fees] eth_feeHistory unavailable ({e}); using eth_gasPrice")
+            self.gas_price = int(await self.w3.eth.gas_price)
+        else:
+            # The last entry is the base fee of the next block.
+            self.base_fee = int(history["baseFeePerGas"][-1])
+            tips = [int(reward[0]) for reward in history.get("reward") or [] if reward and int(reward[0]) > 0]
+            self.priority_fee = int(statistics.median(tips)) if tips else 0
+            self.head = int(history["oldestBlock"]) + len(history["baseFeePerGas"]) - 2
+        self.updated_at = time.time()
+        self.refreshes += 1
+
+    def _refresh_if_stale(self):
+        if self._task is not None or time.time() - self.updated_at < FEE_MAX_AGE_SECONDS:
+            return
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.get_running_loop().create_task(self.refresh())
+            self._refreshing.add_done_callback(self._refresh_done)
+
+    def _refresh_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+            print(f"[fees] ERROR: {task.exception()}")
+
+    def quote(self, bump: float = 1.0) -> dict:
+        """Fee fields for a transaction, from cached values. Call ready() once first."""
+        self._refresh_if_stale()
+        self.quotes += 1
+        return self._fields(bump)
+
+    def _fields(self, bump: float = 1.0) -> dict:
+        if self.base_fee is None:
+            return {"gasPrice": int(self.gas_price * bump)}
+        tip = max(self.priority_fee, int(FEE_MIN_PRIORITY_GWEI * 10**9))
+        return {
+            "maxFeePerGas": int((FEE_BASE_FEE_MULTIPLIER * self.base_fee + tip) * bump),
+            "maxPriorityFeePerGas": int(tip * bump),
+        }
+
+    async def gas_limit(self, name: str, tx: dict) -> int:
+        """Memoized gas limit for calls of shape ``name``, estimated from ``tx`` when missing or expired."""
+        memo = self._gas.get(name)
+        if memo is not None and time.time() - memo[1] < FEE_GAS_TTL_SECONDS:
+            return memo[0]
+        task = self._estimating.get(name)
+        if task is None:
+            task = self._estimating[name] = asyncio.get_running_loop().create_task(self._estimate(name, tx))
+            task.add_done_callback(lambda _: self._estimating.pop(name, None))
+        return await asyncio.shield(task)
+
+    async def _estimate(self, name: str, tx: dict) -> int:
+        try:
+            estimate = int(await self.w3.eth.estimate_gas(tx))
+        except Exception as e:
+            # A call that would revert cannot be estimated; don't memoize the fallback.
+            print(f"[fees] gas estimate for {name} failed ({e}); using {FEE_DEFAULT_GAS}")
+            return FEE_DEFAULT_GAS
+        self.estimates += 1
+        gas = int(estimate * FEE_GAS_MARGIN)
+        self._gas[name] = (gas, time.time())
+        return gas
+
+    def out_of_gas(self, name: str, gas: int, receipt) -> bool:
+        """True if a transaction sent with ``gas`` for shape ``name`` reverted by running out of it.
+
+        The memoized estimate for ``name`` is dropped, so the next gas_limit call estimates again.
+        """
+        if receipt.get("status") == 1:
+            return False
+        # Out of gas in a nested call leaves the caller 1/64 of its gas to revert with.
+        if int(receipt.get("gasUsed", 0) or 0) * 64 < gas * 63:
+            return False
+        self._gas.pop(name, None)
+        self.out_of_gas_reverts += 1
+        print(f"[fees] {name} ran out of its {gas} gas; re-estimating")
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "chain_id": self.chain_id,
+            "head": self.head,
+            "base_fee_gwei": self.base_fee / 10**9 if self.base_fee is not None else None,
+            "priority_fee_gwei": self.priority_fee / 10**9 if self.priority_fee is not None else None,
+            "gas_price_gwei": self.gas_price / 10**9 if self.gas_price is not None else None,
+            "quote": self._fields() if self.base_fee is not None or self.gas_price is not None else None,
+            "gas_limits": {name: gas for name, (gas, _) in self._gas.items()},
+            "age_seconds": round(time.time() - self.updated_at, 1) if self.updated_at else None,
+            "refreshes": self.refreshes,
+            "quotes": self.quotes,
+            "estimates": self.estimates,
+            "out_of_gas_reverts": self.out_of_gas_reverts,
+            "errors": self.errors,
+        }
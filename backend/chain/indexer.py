@@ -0,0 +1,193 @@
+"""
+Background indexer of AgentVault ``PaymentExecuted`` logs.
+
+Follows the chain from INDEXER_START_BLOCK (the vault's deployment block by
+default) with ``eth_getLogs`` and stores one row per event, together with the
+receipt's target and gas used, so payment verification becomes a local
+lookup. Only hashes the indexer has not reached yet still need the RPC.
+
+The indexer stays INDEXER_CONFIRMATIONS blocks behind the head, so a
+payment in the newest blocks is verified from its receipt instead. Each step
+stores its events and the new checkpoint (block number and hash)
+atomically. Before every step the checkpoint hash is compared with the
+chain; on a mismatch the indexer deletes everything above
+``checkpoint - INDEXER_REORG_DEPTH`` and re-indexes from there.
+"""
+
+import asyncio
+import os
+import time
+
+from web3 import AsyncWeb3, Web3
+
+INDEXER_START_BLOCK = os.getenv("INDEXER_START_BLOCK")
+INDEXER_CONFIRMATIONS = int(os.getenv("INDEXER_CONFIRMATIONS", "12"))
+INDEXER_MAX_BLOCK_RANGE = int(os.getenv("INDEXER_MAX_BLOCK_RANGE", "2000"))
+INDEXER_POLL_SECONDS = float(os.getenv("INDEXER_POLL_SECONDS", "2"))
+INDEXER_REORG_DEPTH = int(os.getenv("INDEXER_REORG_DEPTH", "64"))
+
+CHECKPOINT_NAME = "payment_executed"
+
+
+class PaymentLogIndexer:
+    def __init__(self, w3: AsyncWeb3, vault, store, start_block: int):
+        self.w3 = w3
+        self.vault = vault
+        self.store = store
+        self.start_block = int(INDEXER_START_BLOCK) if INDEXER_START_BLOCK else start_block
+        # Blocks a log must be buried under before it is indexed, and before a lookup is trusted.
+        self.confirmations = INDEXER_CONFIRMATIONS
+        self.event = vault.events.PaymentExecuted()
+        self.topic = Web3.to_hex(Web3.keccak(text="PaymentExecuted(bytes32,address,uint256,uint256)"))
+        self._task: asyncio.Task | None = None
+
+        self.head: int | None = None
+        self.head_hash: str | None = None
+        self.chain_head = 0
+        self.caught_up = False
+        self.events_indexed = 0
+        self.rollbacks = 0
+        self.errors = 0
+        self.hits = 0
+        self.misses = 0
+        self.last_poll_at = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self):
+        checkpoint = await self.store.get_indexer_checkpoint(CHECKPOINT_NAME)
+        if checkpoint is not None:
+            self.head, self.head_hash = checkpoint
+        print(f"[indexer] starting from block {self.head if self.head is not None else self.start_block}")
+        while True:
+            try:
+                caught_up = await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                caught_up = True
+                print(f"[indexer] ERROR: {e}")
+            if caught_up:
+                await asyncio.sleep(INDEXER_POLL_SECONDS)
+
+    async def _block_hash(self, number: int) -> str:
+        block = await self.w3.eth.get_block(number)
+        return Web3.to_hex(block["hash"])
+
+    async def _check_reorg(self) -> bool:
+        if self.head is None or self.head_hash is None:
+            return False
+        if await self._block_hash(self.head) == self.head_hash:
+            return False
+
+        target = max(self.start_block - 1, self.head - INDEXER_REORG_DEPTH)
+        target_hash = await self._block_hash(target) if target >= 0 else ""
+        await self.store.rollback_payment_events(CHECKPOINT_NAME, target, target_hash)
+        print(f"[indexer] reorg at block {self.head}, rolled back to {target}")
+        self.head, self.head_hash = target, target_hash
+        self.rollbacks += 1
+        return True
+
+    async def poll_once(self) -> bool:
+        """Index the next range of blocks. Returns True once the indexer has reached the chain head."""
+        self.last_poll_at = time.time()
+        self.chain_head = int(await self.w3.eth.block_number) - self.confirmations
+        await self._check_reorg()
+
+        from_block = self.start_block if self.head is None else self.head + 1
+        if from_block > self.chain_head:
+            self.caught_up = True
+            return True
+        to_block = min(self.chain_head, from_block + INDEXER_MAX_BLOCK_RANGE - 1)
+
+        logs, to_block_hash = await asyncio.gather(
+            self.w3.eth.get_logs(
+                {
+                    "address": self.vault.address,
+                    "topics": [self.topic],
+                    "fromBlock": from_block,
+                    "toBlock": to_block,
+                }
+            ),
+            self._block_hash(to_block),
+        )
+
+        tx_hashes = sorted({Web3.to_hex(log["transactionHash"]) for log in logs})
+        # Fetched together, so the batching provider sends them as one request.
+        receipts = await asyncio.gather(*(self.w3.eth.get_transaction_receipt(h) for h in tx_hashes))
+        receipt_by_hash = {h: r for h, r in zip(tx_hashes, receipts)}
+
+        rows = []
+        for log in logs:
+            event = self.event.process_log(log)
+            tx_hash = Web3.to_hex(log["transactionHash"])
+            receipt = receipt_by_hash[tx_hash]
+            rows.append(
+                {
+                    "tx_hash": tx_hash.lower(),
+                    "log_index": int(log["logIndex"]),
+                    "agent_id": Web3.to_hex(event["args"]["agentId"]),
+                    "recipient": event["args"]["recipient"],
+                    "amount": str(int(event["args"]["amount"])),
+                    "block_number": int(log["blockNumber"]),
+                    "block_hash": Web3.to_hex(log["blockHash"]),
+                    "tx_to": receipt.get("to"),
+                    "gas_used": int(receipt.get("gasUsed", 0) or 0),
+                }
+            )
+
+        await self.store.save_payment_events(CHECKPOINT_NAME, rows, to_block, to_block_hash)
+        self.head, self.head_hash = to_block, to_block_hash
+        self.events_indexed += len(rows)
+        self.caught_up = to_block >= self.chain_head
+        return self.caught_up
+
+    async def lookup(self, tx_hash: str) -> dict | None:
+        """Indexed payment in PaymentVerifier.get_payment's shape, or None if the indexer has not seen it."""
+        rows = await self.store.fetch_payment_events(tx_hash.lower())
+        if not rows:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return {
+            "status": 1,
+            "to": rows[0]["tx_to"],
+            "block_number": int(rows[0]["block_number"]),
+            "gas_used": int(rows[0]["gas_used"]),
+            "payments": [
+                {
+                    "agentId": bytes.fromhex(row["agent_id"][2:]),
+                    "recipient": row["recipient"],
+                    "amount": int(row["amount"]),
+                }
+                for row in rows
+            ],
+        }
+
+    def stats(self) -> dict:
+        return {
+            "head": self.head,
+            "chain_head": self.chain_head,
+            "lag_blocks": max(0, self.chain_head - (self.head or 0)) if self.head is not None else None,
+            "caught_up": self.caught_up,
+            "start_block": self.start_block,
+            "events_indexed": self.events_indexed,
+            "rollbacks": self.rollbacks,
+            "errors": self.errors,
+            "lookup_hits": self.hits,
+            "lookup_misses": self.misses,
+            "last_poll_at": int(self.last_poll_at),
+        }
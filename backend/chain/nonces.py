@@ -0,0 +1,234 @@
+"""
+Local nonce allocation for a signing account.
+
+Reading ``eth_getTransactionCount`` right before every send hands two
+concurrent payments the same nonce, so one of them is rejected or replaces
+the other. NonceManager reads the node's ``pending`` count once and then
+hands out nonces itself under a lock, so any number of payments from one key
+can be in flight at the same time:
+
+  * a send the node rejects gives its nonce back, and the next allocation
+    reuses it, so no gap is left behind;
+  * "nonce too low" means the key was used somewhere else; the manager
+    resyncs from the node and retries with a fresh nonce;
+  * every NONCE_CHECK_SECONDS the lowest unmined nonce is checked. If the
+    transaction holding it was dropped from the mempool, or a returned nonce
+    sat unused for NONCE_STUCK_SECONDS while later nonces wait behind it,
+    the gap is filled with a zero-value self-transfer so the queue can move.
+"""
+
+import asyncio
+import os
+import time
+
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+NONCE_CHECK_SECONDS = float(os.getenv("NONCE_CHECK_SECONDS", "5"))
+NONCE_STUCK_SECONDS = float(os.getenv("NONCE_STUCK_SECONDS", "60"))
+NONCE_SEND_RETRIES = int(os.getenv("NONCE_SEND_RETRIES", "3"))
+
+GAS_TRANSFER = 21000
+# A dropped transaction may still sit in another node's mempool; outbid it so the filler replaces it there too.
+FILL_FEE_BUMP = 1.25
+
+
+class NonceManager:
+    def __init__(self, w3, account, fees=None):
+        self.w3 = w3
+        self.account = account
+        # Optional FeeOracle; gap fillers are priced from it instead of eth_gasPrice.
+        self.fees = fees
+        self.address = account.address
+        self._lock = asyncio.Lock()
+        self._next: int | None = None
+        # Nonces handed back by failed sends -> when they were returned.
+        self._free: dict[int, float] = {}
+        # nonce -> (tx hash, sent at) for transactions sent but not yet seen mined.
+        self._inflight: dict[int, tuple[str, float]] = {}
+        self._chain_id: int | None = None
+        self._task: asyncio.Task | None = None
+
+        self.mined = 0
+        self.sent = 0
+        self.reused = 0
+        self.resyncs = 0
+        self.dropped = 0
+        self.gaps_filled = 0
+        self.errors = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(NONCE_CHECK_SECONDS)
+            try:
+                await self.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                print(f"[nonces] ERROR: {e}")
+
+    async def sync(self):
+        async with self._lock:
+            await self._sync()
+
+    async def _sync(self):
+        pending = int(await self.w3.eth.get_transaction_count(self.address, "pending"))
+        # Never move backwards past nonces this process already handed out.
+        self._next = pending if self._next is None else max(self._next, pending)
+        # Returned nonces below the node's count were taken by another sender of this key.
+        for nonce in [n for n in self._free if n < pending]:
+            del self._free[nonce]
+        print(f"[nonces] synced {self.address}: next nonce {self._next}")
+
+    async def allocate(self) -> int:
+        async with self._lock:
+            if self._next is None:
+                await self._sync()
+            if self._free:
+                nonce = min(self._free)
+                del self._free[nonce]
+                self.reused += 1
+                return nonce
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    def release(self, nonce: int):
+        """Give back a nonce whose transaction never reached the node."""
+        if self._next is None or nonce >= self._next or nonce in self._inflight or nonce in self._free:
+            return
+        self._free[nonce] = time.monotonic()
+        # Returned nonces at the top of the range are not gaps; just hand them out again next.
+        while self._next - 1 in self._free:
+            self._next -= 1
+            del self._free[self._next]
+
+    async def send(self, tx: dict) -> HexBytes:
+        """Assign a nonce to ``tx``, sign it and send it. Returns the transaction hash."""
+        for attempt in range(NONCE_SEND_RETRIES):
+            nonce = await self.allocate()
+            signed = self.account.sign_transaction({**tx, "nonce": nonce})
+            try:
+                await self.w3.eth.send_raw_transaction(signed.rawTransaction)
+            except ValueError as e:
+                message = str(e).lower()
+                if "already known" in message:
+                    break
+                if "nonce too low" in message:
+                    self.resyncs += 1
+                    await self.sync()
+                    if attempt + 1 < NONCE_SEND_RETRIES:
+                        continue
+                    raise
+                self.release(nonce)
+                raise
+            except (Exception, asyncio.CancelledError):
+                # The node may have the transaction anyway; track it and let check() settle the nonce.
+                self._inflight[nonce] = (Web3.to_hex(signed.hash), time.monotonic())
+                raise
+            break
+        self._inflight[nonce] = (Web3.to_hex(signed.hash), time.monotonic())
+        self.sent += 1
+        return HexBytes(signed.hash)
+
+    async def check(self) -> int:
+        """Forget mined nonces and fill the gap at the lowest unmined nonce. Returns fillers sent."""
+        if self._next is None:
+            return 0
+        latest = int(await self.w3.eth.get_transaction_count(self.address, "latest"))
+        async with self._lock:
+            for nonce in [n for n in self._inflight if n < latest]:
+                del self._inflight[nonce]
+                self.mined += 1
+            for nonce in [n for n in self._free if n < latest]:
+                del self._free[nonce]
+            if latest >= self._next:
+                self._next = latest
+                return 0
+
+            now = time.monotonic()
+            if latest in self._inflight:
+                tx_hash, sent_at = self._inflight[latest]
+                if now - sent_at < NONCE_STUCK_SECONDS:
+                    return 0
+                try:
+                    await self.w3.eth.get_transaction(tx_hash)
+                    return 0
+                except TransactionNotFound:
+                    pass
+                del self._inflight[latest]
+                self.dropped += 1
+                print(f"[nonces] nonce {latest} ({tx_hash}) was dropped from the mempool")
+                if not any(n > latest for n in self._inflight):
+                    # Nothing queued behind it; the next payment can take the nonce.
+                    self.release(latest)
+                    return 0
+            elif latest in self._free:
+                if now - self._free[latest] < NONCE_STUCK_SECONDS:
+                    return 0
+                del self._free[latest]
+            else:
+                # Allocated and still being sent.
+                return 0
+
+            await self._fill(latest)
+            return 1
+
+    async def _fill(self, nonce: int):
+        if self.fees is not None:
+            await self.fees.ready()
+            fees, self._chain_id = self.fees.quote(bump=FILL_FEE_BUMP), self.fees.chain_id
+        else:
+            if self._chain_id is None:
+                self._chain_id = int(await self.w3.eth.chain_id)
+            fees = {"gasPrice": int(int(await self.w3.eth.gas_price) * FILL_FEE_BUMP)}
+        signed = self.account.sign_transaction(
+            {
+                "to": self.address,
+                "value": 0,
+                "gas": GAS_TRANSFER,
+                "nonce": nonce,
+                "chainId": self._chain_id,
+                **fees,
+            }
+        )
+        try:
+            await self.w3.eth.send_raw_transaction(signed.rawTransaction)
+        except Exception:
+            # Try again on the next check.
+            self._free[nonce] = 0.0
+            raise
+        self._inflight[nonce] = (Web3.to_hex(signed.hash), time.monotonic())
+        self.gaps_filled += 1
+        print(f"[nonces] filled nonce gap {nonce} with {Web3.to_hex(signed.hash)}")
+
+    def stats(self) -> dict:
+        return {
+            "address": self.address,
+            "next_nonce": self._next,
+            "in_flight": len(self._inflight),
+            "free": sorted(self._free),
+            "sent": self.sent,
+            "mined": self.mined,
+            "reused": self.reused,
+            "resyncs": self.resyncs,
+            "dropped": self.dropped,
+            "gaps_filled": self.gaps_filled,
+            "errors": self.errors,
+        }
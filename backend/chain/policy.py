@@ -0,0 +1,379 @@
+"""
+Local mirror of the PolicyRegistry and AgentVault state that decides whether
+a payment would go through: each agent's policy, whitelist, vault balance
+and daily spend.
+
+The mirror is built from events and followed with ``eth_getLogs`` from
+POLICY_MIRROR_START_BLOCK (the vault's deployment block by default):
+
+  * AgentRegistered, PolicyUpdated, WhitelistUpdated, AgentPaused and
+    AgentUnpaused from the registry. registerAgent does not log the initial
+    whitelist, so it is read once with getPolicy when the agent appears;
+  * Deposited, PaymentExecuted, ChannelOpened and ChannelClosed from the
+    vault, for the balance and the day's spend.
+
+reserve() runs the checks of AgentVault.executePayment, in the same order,
+against the mirror and raises PolicyViolation with the contract's error
+name for a payment that would revert. A reservation counts against the
+agent's balance and daily cap until it is released, so concurrent payments
+cannot overspend together; a payment that made it on chain is released once
+the mirror has applied its block. Until the mirror has caught up with the
+chain, or when its last poll is older than POLICY_MIRROR_STALE_SECONDS,
+payments are reserved but not checked and the chain decides.
+
+The day is taken from the local clock, so in the seconds around midnight
+UTC the mirror can still count yesterday's spend and reject a payment the
+contract would have taken.
+"""
+
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+
+from web3 import Web3
+
+POLICY_MIRROR_START_BLOCK = os.getenv("POLICY_MIRROR_START_BLOCK")
+POLICY_MIRROR_MAX_BLOCK_RANGE = int(os.getenv("POLICY_MIRROR_MAX_BLOCK_RANGE", "2000"))
+POLICY_MIRROR_POLL_SECONDS = float(os.getenv("POLICY_MIRROR_POLL_SECONDS", "2"))
+POLICY_MIRROR_STALE_SECONDS = float(os.getenv("POLICY_MIRROR_STALE_SECONDS", "30"))
+# A reservation whose payment was never reported back is dropped after this long.
+POLICY_MIRROR_HOLD_SECONDS = float(os.getenv("POLICY_MIRROR_HOLD_SECONDS", "300"))
+
+REGISTRY_ABI_PATH = Path(__file__).resolve().parent.parent / "sdk" / "abi" / "PolicyRegistry.json"
+
+_REGISTRY_EVENTS = {
+    "AgentRegistered": "AgentRegistered(bytes32,uint256,uint256)",
+    "PolicyUpdated": "PolicyUpdated(bytes32,uint256,uint256)",
+    "WhitelistUpdated": "WhitelistUpdated(bytes32,address)",
+    "AgentPaused": "AgentPaused(bytes32)",
+    "AgentUnpaused": "AgentUnpaused(bytes32)",
+}
+_VAULT_EVENTS = {
+    "Deposited": "Deposited(bytes32,uint256)",
+    "PaymentExecuted": "PaymentExecuted(bytes32,address,uint256,uint256)",
+    "ChannelOpened": "ChannelOpened(bytes32,address,address,uint256,uint64)",
+    "ChannelClosed": "ChannelClosed(bytes32,address,uint256)",
+}
+
+
+class PolicyViolation(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        # AgentVault custom error name, e.g. "ExceedsDailyCap".
+        self.reason = reason
+
+
+class AgentPolicy:
+    def __init__(self):
+        self.registered = False
+        self.active = False
+        self.max_per_tx = 0
+        self.daily_cap = 0
+        # Lowercase addresses, so a check needs no checksumming.
+        self.whitelist: set[str] = set()
+        self.balance = 0
+        # Spend on spent_day (days since the epoch), as the vault's dailySpent and lastResetDay.
+        self.spent = 0
+        self.spent_day = 0
+
+    def spend(self, amount: int, day: int):
+        if day > self.spent_day:
+            self.spent, self.spent_day = 0, day
+        self.spent += amount
+
+    def spent_on(self, day: int) -> int:
+        return self.spent if day <= self.spent_day else 0
+
+
+class Hold:
+    def __init__(self, agent_id: bytes, amount: int):
+        self.agent_id = agent_id
+        self.amount = amount
+        self.created_at = time.monotonic()
+        self.released = False
+
+
+class PolicyMirror:
+    def __init__(self, w3, vault, start_block: int):
+        self.w3 = w3
+        self.vault = vault
+        self.registry = None
+        self.start_block = int(POLICY_MIRROR_START_BLOCK) if POLICY_MIRROR_START_BLOCK else start_block
+        self._registry_abi = json.loads(REGISTRY_ABI_PATH.read_text())["abi"]
+        self._agents: dict[bytes, AgentPolicy] = {}
+        # agent id -> units reserved by payments not yet applied from the chain
+        self._reserved: dict[bytes, int] = {}
+        self._holds: set[Hold] = set()
+        # (block number, hold) released once the mirror has applied that block
+        self._settling: list[tuple[int, Hold]] = []
+        self._events: dict[str, object] = {}
+        self._task: asyncio.Task | None = None
+        self._polling: asyncio.Task | None = None
+        # One poll at a time, so a block range is never applied twice.
+        self._lock = asyncio.Lock()
+
+        self.head: int | None = None
+        self.head_hash: str | None = None
+        self.chain_head = 0
+        self.caught_up = False
+        self.last_synced_at = 0.0
+        self.events_applied = 0
+        self.rebuilds = 0
+        self.errors = 0
+        self.checks = 0
+        self.unchecked = 0
+        self.check_seconds = 0.0
+        self.rejected: dict[str, int] = {}
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self):
+        while True:
+            try:
+                caught_up = await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                caught_up = True
+                print(f"[policy] ERROR: {e}")
+            if caught_up:
+                await asyncio.sleep(POLICY_MIRROR_POLL_SECONDS)
+
+    async def _resolve(self):
+        address = await self.vault.functions.policyRegistry().call()
+        self.registry = self.w3.eth.contract(address=Web3.to_checksum_address(address), abi=self._registry_abi)
+        for name, signature in _REGISTRY_EVENTS.items():
+            self._events[Web3.to_hex(Web3.keccak(text=signature))] = self.registry.events[name]()
+        for name, signature in _VAULT_EVENTS.items():
+            self._events[Web3.to_hex(Web3.keccak(text=signature))] = self.vault.events[name]()
+        print(f"[policy] following PolicyRegistry {self.registry.address} from block {self.start_block}")
+
+    async def _block_hash(self, number: int) -> str:
+        block = await self.w3.eth.get_block(number)
+        return Web3.to_hex(block["hash"])
+
+    def _rebuild(self):
+        self._agents.clear()
+        self.head = self.head_hash = None
+        self.caught_up = False
+        self.rebuilds += 1
+
+    async def poll_once(self) -> bool:
+        """Apply the next range of blocks. Returns True once the mirror has reached the chain head."""
+        async with self._lock:
+            return await self._poll()
+
+    async def _poll(self) -> bool:
+        if self.registry is None:
+            await self._resolve()
+        self.chain_head = int(await self.w3.eth.block_number)
+        if self.head is not None and await self._block_hash(self.head) != self.head_hash:
+            # Reorged below the mirror's head: replay from the start rather than unwinding balances.
+            print(f"[policy] reorg at block {self.head}, rebuilding")
+            self._rebuild()
+
+        from_block = self.start_block if self.head is None else self.head + 1
+        if from_block > self.chain_head:
+            self._synced()
+            return True
+        to_block = min(self.chain_head, from_block + POLICY_MIRROR_MAX_BLOCK_RANGE - 1)
+
+        logs, to_block_hash = await asyncio.gather(
+            self.w3.eth.get_logs(
+                {
+                    "address": [self.registry.address, self.vault.address],
+                    "topics": [list(self._events)],
+                    "fromBlock": from_block,
+                    "toBlock": to_block,
+                }
+            ),
+            self._block_hash(to_block),
+        )
+        events = [self._events[Web3.to_hex(log["topics"][0])].process_log(log) for log in logs]
+
+        # Read together, so the batching provider sends them as one request.
+        registered = sorted({bytes(e["args"]["agentId"]) for e in events if e["event"] == "AgentRegistered"})
+        opened_blocks = sorted({int(e["blockNumber"]) for e in events if e["event"] == "ChannelOpened"})
+        policies, blocks = await asyncio.gather(
+            asyncio.gather(*(self.registry.functions.getPolicy(agent_id).call() for agent_id in registered)),
+            asyncio.gather(*(self.w3.eth.get_block(number) for number in opened_blocks)),
+        )
+        whitelists = {agent_id: policy[2] for agent_id, policy in zip(registered, policies)}
+        day_of_block = {number: int(block["timestamp"]) // 86400 for number, block in zip(opened_blocks, blocks)}
+
+        for event in events:
+            self._apply(event, whitelists, day_of_block)
+        self.head, self.head_hash = to_block, to_block_hash
+        self.events_applied += len(events)
+        self.caught_up = to_block >= self.chain_head
+        self._synced()
+        return self.caught_up
+
+    def _apply(self, event, whitelists: dict, day_of_block: dict):
+        args = event["args"]
+        agent_id = bytes(args["agentId"])
+        agent = self._agents.get(agent_id)
+        if agent is None:
+            agent = self._agents[agent_id] = AgentPolicy()
+        name = event["event"]
+        if name == "AgentRegistered":
+            agent.registered = agent.active = True
+            agent.max_per_tx, agent.daily_cap = int(args["maxPerTx"]), int(args["dailyCap"])
+            agent.whitelist.update(a.lower() for a in whitelists.get(agent_id, []))
+        elif name == "PolicyUpdated":
+            agent.max_per_tx, agent.daily_cap = int(args["maxPerTx"]), int(args["dailyCap"])
+        elif name == "WhitelistUpdated":
+            agent.whitelist.add(args["recipient"].lower())
+        elif name == "AgentPaused":
+            agent.active = False
+        elif name == "AgentUnpaused":
+            agent.active = True
+        elif name == "Deposited":
+            agent.balance += int(args["amount"])
+        elif name == "PaymentExecuted":
+            agent.balance -= int(args["amount"])
+            agent.spend(int(args["amount"]), int(args["timestamp"]) // 86400)
+        elif name == "ChannelOpened":
+            agent.balance -= int(args["amount"])
+            agent.spend(int(args["amount"]), day_of_block[int(event["blockNumber"])])
+        elif name == "ChannelClosed":
+            agent.balance += int(args["refund"])
+
+    def _synced(self):
+        self.last_synced_at = time.time()
+        now = time.monotonic()
+        settling = []
+        for block_number, hold in self._settling:
+            if self.head is not None and block_number <= self.head:
+                self._drop(hold)
+            elif not hold.released:
+                settling.append((block_number, hold))
+        self._settling = settling
+        for hold in [h for h in self._holds if now - h.created_at > POLICY_MIRROR_HOLD_SECONDS]:
+            self._drop(hold)
+
+    def _poll_if_stale(self):
+        # A process without the background task (the SDK) catches up on demand.
+        if self._task is not None or time.time() - self.last_synced_at < POLICY_MIRROR_POLL_SECONDS:
+            return
+        if self._polling is None or self._polling.done():
+            self._polling = asyncio.get_running_loop().create_task(self._catch_up())
+
+    async def _catch_up(self):
+        try:
+            while not await self.poll_once():
+                pass
+        except Exception as e:
+            self.errors += 1
+            print(f"[policy] ERROR: {e}")
+
+    @property
+    def ready(self) -> bool:
+        return self.caught_up and time.time() - self.last_synced_at < POLICY_MIRROR_STALE_SECONDS
+
+    def _violation(self, agent_id: bytes, recipient: str, amount: int) -> str | None:
+        agent = self._agents.get(agent_id)
+        if agent is None or not agent.active:
+            return "AgentNotActive"
+        if recipient.lower() not in agent.whitelist:
+            return "RecipientNotWhitelisted"
+        if amount > agent.max_per_tx:
+            return "ExceedsPerTxLimit"
+        reserved = self._reserved.get(agent_id, 0)
+        if agent.spent_on(int(time.time()) // 86400) + reserved + amount > agent.daily_cap:
+            return "ExceedsDailyCap"
+        if agent.balance - reserved < amount:
+            return "InsufficientBalance"
+        return None
+
+    def reserve(self, agent_id: bytes, recipient: str, amount: int) -> Hold:
+        """Check a payment of ``amount`` units and hold it against the agent's limits. Raises PolicyViolation."""
+        self._poll_if_stale()
+        agent_id = bytes(agent_id)
+        if self.ready:
+            started = time.perf_counter()
+            reason = self._violation(agent_id, recipient, amount)
+            self.checks += 1
+            self.check_seconds += time.perf_counter() - started
+            if reason is not None:
+                self.rejected[reason] = self.rejected.get(reason, 0) + 1
+                raise PolicyViolation(reason)
+        else:
+            self.unchecked += 1
+        hold = Hold(agent_id, amount)
+        self._holds.add(hold)
+        self._reserved[agent_id] = self._reserved.get(agent_id, 0) + amount
+        return hold
+
+    def release(self, hold: Hold, block_number: int | None = None):
+        """Drop a reservation. Given the block that paid it, keep it until the mirror has applied that block."""
+        if hold.released:
+            return
+        if block_number is not None and (self.head is None or self.head < block_number):
+            self._settling.append((block_number, hold))
+            return
+        self._drop(hold)
+
+    def _drop(self, hold: Hold):
+        if hold.released:
+            return
+        hold.released = True
+        self._holds.discard(hold)
+        left = self._reserved.get(hold.agent_id, 0) - hold.amount
+        if left > 0:
+            self._reserved[hold.agent_id] = left
+        else:
+            self._reserved.pop(hold.agent_id, None)
+
+    def describe(self, agent_id: bytes) -> dict | None:
+        agent = self._agents.get(bytes(agent_id))
+        if agent is None:
+            return None
+        reserved = self._reserved.get(bytes(agent_id), 0)
+        return {
+            "registered": agent.registered,
+            "active": agent.active,
+            "max_per_tx_usdc": agent.max_per_tx / 10**6,
+            "daily_cap_usdc": agent.daily_cap / 10**6,
+            "spent_today_usdc": agent.spent_on(int(time.time()) // 86400) / 10**6,
+            "reserved_usdc": reserved / 10**6,
+            "balance_usdc": agent.balance / 10**6,
+            "whitelist": sorted(Web3.to_checksum_address(a) for a in agent.whitelist),
+            "as_of_block": self.head,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "registry": self.registry.address if self.registry is not None else None,
+            "head": self.head,
+            "chain_head": self.chain_head,
+            "caught_up": self.caught_up,
+            "checking": self.ready,
+            "start_block": self.start_block,
+            "agents": len(self._agents),
+            "events_applied": self.events_applied,
+            "rebuilds": self.rebuilds,
+            "holds": len(self._holds),
+            "reserved_usdc": sum(self._reserved.values()) / 10**6,
+            "checks": self.checks,
+            "unchecked": self.unchecked,
+            "avg_check_us": round(self.check_seconds / self.checks * 10**6, 2) if self.checks else None,
+            "rejected": dict(self.rejected),
+            "errors": self.errors,
+            "last_synced_at": int(self.last_synced_at),
+        }
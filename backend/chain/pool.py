@@ -0,0 +1,123 @@
+"""
+Health-scored pool of JSON-RPC endpoints.
+
+ALCHEMY_RPC may list several endpoints, comma-separated. Each endpoint keeps
+an EWMA of its latency, a window of recent latencies (for p95) and its
+consecutive failures. Requests go to the endpoint with the best score; after
+RPC_BREAKER_FAILURES consecutive failures an endpoint's circuit opens and it
+is skipped for RPC_BREAKER_COOLDOWN_SECONDS, after which a single trial
+request decides whether it closes again.
+"""
+
+import os
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+RPC_BREAKER_FAILURES = int(os.getenv("RPC_BREAKER_FAILURES", "3"))
+RPC_BREAKER_COOLDOWN_SECONDS = float(os.getenv("RPC_BREAKER_COOLDOWN_SECONDS", "15"))
+RPC_HEDGE_ENABLED = os.getenv("RPC_HEDGE_ENABLED", "true").lower() == "true"
+RPC_HEDGE_METHODS = frozenset(
+    m.strip() for m in os.getenv("RPC_HEDGE_METHODS", "eth_getTransactionReceipt").split(",") if m.strip()
+)
+RPC_HEDGE_MIN_DELAY_MS = float(os.getenv("RPC_HEDGE_MIN_DELAY_MS", "50"))
+
+_LATENCY_SAMPLES = 200
+_EWMA_ALPHA = 0.2
+# Score added per consecutive failure, so a flaky endpoint ranks behind a slow one.
+_FAILURE_PENALTY_SECONDS = 1.0
+
+
+def parse_endpoints(value: str | list[str] | None) -> list[str]:
+    if isinstance(value, (list, tuple)):
+        return [url.strip() for url in value if url and url.strip()]
+    return [url.strip() for url in (value or "").split(",") if url.strip()]
+
+
+def redact(url: str) -> str:
+    # Provider URLs usually carry the API key in the path.
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}" if parsed.netloc else url
+
+
+class RpcEndpoint:
+    def __init__(self, url: str):
+        self.url = url
+        self.name = redact(url)
+        self.ewma: float | None = None
+        self._latencies: deque = deque(maxlen=_LATENCY_SAMPLES)
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.opened_at: float | None = None
+        self.hedged = 0
+
+    @property
+    def open(self) -> bool:
+        return self.opened_at is not None
+
+    def available(self, now: float) -> bool:
+        # Once the cooldown has passed the breaker is half-open and lets requests through.
+        return self.opened_at is None or now - self.opened_at >= RPC_BREAKER_COOLDOWN_SECONDS
+
+    def score(self) -> float:
+        return (self.ewma or 0.0) + self.consecutive_failures * _FAILURE_PENALTY_SECONDS
+
+    def p95(self) -> float | None:
+        if len(self._latencies) < 5:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    def record_success(self, seconds: float):
+        self.requests += 1
+        self._latencies.append(seconds)
+        self.ewma = seconds if self.ewma is None else _EWMA_ALPHA * seconds + (1 - _EWMA_ALPHA) * self.ewma
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.requests += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= RPC_BREAKER_FAILURES:
+            # Re-arms the cooldown, including after a failed half-open trial.
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        p95 = self.p95()
+        return {
+            "endpoint": self.name,
+            "ewma_ms": round(self.ewma * 1000, 2) if self.ewma is not None else None,
+            "p95_ms": round(p95 * 1000, 2) if p95 is not None else None,
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "circuit": "open" if self.open else "closed",
+            "hedged": self.hedged,
+        }
+
+
+class RpcEndpointPool:
+    def __init__(self, urls: list[str]):
+        if not urls:
+            raise ValueError("At least one RPC endpoint is required")
+        self.endpoints = [RpcEndpoint(url) for url in urls]
+
+    def ranked(self) -> list[RpcEndpoint]:
+        """Endpoints to try in order: available ones by score, then open circuits as a last resort."""
+        now = time.monotonic()
+        available = sorted((e for e in self.endpoints if e.available(now)), key=RpcEndpoint.score)
+        tripped = sorted((e for e in self.endpoints if not e.available(now)), key=lambda e: e.opened_at)
+        return available + tripped
+
+    def hedge_delay(self, endpoint: RpcEndpoint) -> float:
+        p95 = endpoint.p95()
+        floor = RPC_HEDGE_MIN_DELAY_MS / 1000
+        return max(floor, p95) if p95 is not None else max(floor, (endpoint.ewma or 0.0) * 2)
+
+    def should_hedge(self, methods: list[str]) -> bool:
+        return RPC_HEDGE_ENABLED and len(self.endpoints) > 1 and all(m in RPC_HEDGE_METHODS for m in methods)
+
+    def stats(self) -> list[dict]:
+        return [endpoint.stats() for endpoint in self.endpoints]
@@ -0,0 +1,91 @@
+"""
+Bounded cache of verified receipts and their decoded PaymentExecuted events.
+
+A receipt buried at least RECEIPT_FINALITY_DEPTH blocks deep can no longer
+change, so its entry never expires and only leaves through LRU eviction.
+Receipts in shallower blocks could still be reorged out; those expire after
+RECEIPT_CACHE_TTL_SECONDS and are fetched again.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+RECEIPT_CACHE_SIZE = int(os.getenv("RECEIPT_CACHE_SIZE", "10000"))
+RECEIPT_CACHE_TTL_SECONDS = float(os.getenv("RECEIPT_CACHE_TTL_SECONDS", "15"))
+RECEIPT_FINALITY_DEPTH = int(os.getenv("RECEIPT_FINALITY_DEPTH", "64"))
+
+
+class ReceiptCache:
+    def __init__(
+        self,
+        max_entries: int = RECEIPT_CACHE_SIZE,
+        ttl_seconds: float = RECEIPT_CACHE_TTL_SECONDS,
+        finality_depth: int = RECEIPT_FINALITY_DEPTH,
+    ):
+        self.max_entries = max(0, max_entries)
+        self.ttl_seconds = max(0.0, ttl_seconds)
+        self.finality_depth = max(0, finality_depth)
+        # tx_hash -> (record, expires_at); expires_at is None once finalized
+        self._entries: "OrderedDict[str, tuple[dict, float | None]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(tx_hash: str) -> str:
+        return tx_hash.lower()
+
+    def is_final(self, block_number: int, head: int) -> bool:
+        return block_number > 0 and head - block_number >= self.finality_depth
+
+    def get(self, tx_hash: str) -> dict | None:
+        key = self._key(tx_hash)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            record, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return record
+
+    def put(self, tx_hash: str, record: dict, final: bool):
+        if not self.max_entries:
+            return
+        key = self._key(tx_hash)
+        expires_at = None if final else time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries[key] = (record, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            final = sum(1 for _, expires_at in self._entries.values() if expires_at is None)
+            entries = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "final_entries": final,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "finality_depth": self.finality_depth,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+        }
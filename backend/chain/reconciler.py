@@ -0,0 +1,177 @@
+"""
+Background reconciliation of optimistically accepted payments.
+
+A paid route with an optimistic risk limit accepts a proof whose transaction
+is still in the mempool, or mined fewer than RECONCILE_CONFIRMATIONS blocks
+deep. The ledger row is written as ``pending``. This task re-checks pending
+rows every RECONCILE_POLL_SECONDS and moves each one on:
+
+  * ``success``  - mined with status 1, the expected PaymentExecuted event,
+    at least RECONCILE_CONFIRMATIONS deep;
+  * ``reverted`` - mined with status 0, or the event does not match;
+  * ``reorged``  - it had been seen in a block, and the chain no longer knows it;
+  * ``dropped``  - never mined within RECONCILE_DROP_SECONDS.
+
+Each resolved row is passed to ``on_resolved``, so the paywall can release
+the row's share of the route's risk limit and claw back access on failure.
+"""
+
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable
+
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+RECONCILE_CONFIRMATIONS = int(os.getenv("RECONCILE_CONFIRMATIONS", "12"))
+RECONCILE_POLL_SECONDS = float(os.getenv("RECONCILE_POLL_SECONDS", "2"))
+RECONCILE_DROP_SECONDS = int(os.getenv("RECONCILE_DROP_SECONDS", "300"))
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "500"))
+
+OnResolved = Callable[[dict, str, str | None], Awaitable[None]]
+Expected = Callable[[dict], tuple[bytes, str, int] | None]
+
+
+class PaymentReconciler:
+    def __init__(self, verifier, store):
+        self.verifier = verifier
+        self.w3 = verifier.w3
+        self.store = store
+        # Maps a ledger row to the (agent id hash, recipient, amount units) its proof must pay.
+        self.expected: Expected | None = None
+        self.on_resolved: OnResolved | None = None
+        self._task: asyncio.Task | None = None
+        # tx_hash -> last block the transaction was seen in, so a disappearance reads as a reorg.
+        self._seen_in_block: dict[str, int] = {}
+
+        self.pending = 0
+        self.confirmed = 0
+        self.failed = {"reverted": 0, "reorged": 0, "dropped": 0}
+        self.errors = 0
+        self.last_run_at = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self):
+        while True:
+            try:
+                await self.reconcile_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                print(f"[reconciler] ERROR: {e}")
+            await asyncio.sleep(RECONCILE_POLL_SECONDS)
+
+    async def reconcile_once(self) -> int:
+        """Check every pending row once. Returns how many rows left the pending state."""
+        self.last_run_at = time.time()
+        rows = await self.store.fetch_pending_transactions(RECONCILE_BATCH_SIZE)
+        self.pending = len(rows)
+        if not rows:
+            return 0
+
+        head = int(await self.w3.eth.block_number)
+        # Issued together, so the batching provider sends the receipt lookups as one request.
+        outcomes = await asyncio.gather(*(self._check(row, head) for row in rows), return_exceptions=True)
+        resolved = 0
+        for row, outcome in zip(rows, outcomes):
+            if isinstance(outcome, Exception):
+                self.errors += 1
+                print(f"[reconciler] ERROR checking {row['tx_hash']}: {outcome}")
+                continue
+            if outcome is None:
+                continue
+            status, reason, block_number, gas_used = outcome
+            updated = await self.store.update_transaction_status(
+                row["tx_hash"],
+                int(row["timestamp"]),
+                status=status,
+                block_reason=reason,
+                block_number=block_number,
+                gas_used=gas_used,
+            )
+            if not updated:
+                continue
+            resolved += 1
+            self._seen_in_block.pop(row["tx_hash"], None)
+            if status == "success":
+                self.confirmed += 1
+            else:
+                self.failed[status] += 1
+                print(f"[reconciler] {row['tx_hash']} {status}: {reason}")
+            if self.on_resolved is not None:
+                await self.on_resolved(row, status, reason)
+        self.pending -= resolved
+        return resolved
+
+    async def _check(self, row: dict, head: int) -> tuple[str, str | None, int, int] | None:
+        tx_hash = row["tx_hash"]
+        try:
+            receipt = await self.w3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            receipt = None
+
+        if receipt is None:
+            if tx_hash in self._seen_in_block or int(row.get("block_number") or 0):
+                try:
+                    await self.w3.eth.get_transaction(tx_hash)
+                except TransactionNotFound:
+                    return "reorged", "Transaction was reorged out of the chain", 0, 0
+                # Back in the mempool after a reorg; wait for it to be mined again.
+                self._seen_in_block.pop(tx_hash, None)
+                return None
+            if time.time() - int(row["timestamp"]) > RECONCILE_DROP_SECONDS:
+                return "dropped", f"Transaction not mined within {RECONCILE_DROP_SECONDS}s", 0, 0
+            return None
+
+        block_number = int(receipt.get("blockNumber", 0) or 0)
+        gas_used = int(receipt.get("gasUsed", 0) or 0)
+        self._seen_in_block[tx_hash] = block_number
+        if receipt.get("status") != 1:
+            return "reverted", "Payment transaction reverted on chain", block_number, gas_used
+
+        expected = self.expected(row) if self.expected is not None else None
+        if expected is not None and not self._matches(receipt, *expected):
+            return "reverted", "Mined transaction does not carry the expected payment", block_number, gas_used
+
+        if head - block_number + 1 >= RECONCILE_CONFIRMATIONS:
+            return "success", None, block_number, gas_used
+        return None
+
+    def _matches(self, receipt, agent_id_bytes: bytes, recipient: str, amount_units: int) -> bool:
+        if not receipt.get("to") or receipt["to"].lower() != self.verifier.vault_address.lower():
+            return False
+        try:
+            payments = [dict(event["args"]) for event in self.verifier.decode_payments(receipt)]
+        except Exception:
+            return False
+        return any(
+            args["agentId"] == agent_id_bytes
+            and Web3.to_checksum_address(args["recipient"]) == recipient
+            and int(args["amount"]) == amount_units
+            for args in payments
+        )
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "confirmed": self.confirmed,
+            **self.failed,
+            "errors": self.errors,
+            "confirmations": RECONCILE_CONFIRMATIONS,
+            "last_run_at": int(self.last_run_at),
+        }
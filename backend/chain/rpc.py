@@ -0,0 +1,246 @@
+"""
+Coalescing, batching JSON-RPC provider for AsyncWeb3.
+
+Two behaviours sit under every chain read the backend makes:
+  * single-flight — a call identical (same method and params) to one that is
+    already in flight waits for that call's response instead of being sent
+    again, e.g. two verifications of the same tx_hash;
+  * batching — distinct calls issued within RPC_BATCH_WINDOW_MS of each other
+    go out as one JSON-RPC batch (up to RPC_MAX_BATCH_SIZE calls) over a
+    shared keep-alive session.
+
+Each batch is sent to the healthiest endpoint of an RpcEndpointPool and
+fails over to the next one on a transport error. Batches made only of
+latency-critical reads (RPC_HEDGE_METHODS) are hedged: if the first
+endpoint has not answered within its p95 latency, the same batch also goes
+to the next endpoint and the first answer wins.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any
+
+import aiohttp
+from web3._utils.encoding import FriendlyJsonSerde, Web3JsonEncoder
+from web3.exceptions import ProviderConnectionError
+from web3.providers.async_base import AsyncJSONBaseProvider
+
+from chain.pool import RpcEndpoint, RpcEndpointPool, parse_endpoints
+
+RPC_MAX_CONNECTIONS = int(os.getenv("RPC_MAX_CONNECTIONS", "64"))
+RPC_TIMEOUT_SECONDS = float(os.getenv("RPC_TIMEOUT_SECONDS", "10"))
+RPC_KEEPALIVE_SECONDS = float(os.getenv("RPC_KEEPALIVE_SECONDS", "30"))
+RPC_BATCH_WINDOW_MS = float(os.getenv("RPC_BATCH_WINDOW_MS", "2"))
+RPC_MAX_BATCH_SIZE = int(os.getenv("RPC_MAX_BATCH_SIZE", "50"))
+
+_JSON = FriendlyJsonSerde()
+
+
+def _encode(value: Any) -> str:
+    return _JSON.json_encode(value, cls=Web3JsonEncoder)
+
+
+def _retrieve(future: asyncio.Future):
+    # Keeps asyncio quiet when every waiter on a failed call was cancelled.
+    if not future.cancelled():
+        future.exception()
+
+
+class BatchingRpcProvider(AsyncJSONBaseProvider):
+    def __init__(
+        self,
+        endpoints: str | list[str],
+        batch_window_ms: float = RPC_BATCH_WINDOW_MS,
+        max_batch_size: int = RPC_MAX_BATCH_SIZE,
+    ):
+        super().__init__()
+        self.pool = RpcEndpointPool(parse_endpoints(endpoints))
+        self.batch_window = max(0.0, batch_window_ms) / 1000
+        self.max_batch_size = max(1, max_batch_size)
+        self.session: aiohttp.ClientSession | None = None
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._pending: list[tuple[str, str, Any, asyncio.Future]] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._sending: set[asyncio.Task] = set()
+
+        self.calls = 0
+        self.coalesced = 0
+        self.http_requests = 0
+        self.batched_calls = 0
+        self.max_batch_seen = 0
+        self.errors = 0
+        self.failovers = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def __str__(self) -> str:
+        return f"Batching RPC connection {', '.join(e.name for e in self.pool.endpoints)}"
+
+    async def start(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=RPC_MAX_CONNECTIONS, keepalive_timeout=RPC_KEEPALIVE_SECONDS),
+                timeout=aiohttp.ClientTimeout(total=RPC_TIMEOUT_SECONDS),
+            )
+
+    async def close(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._flush()
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def make_request(self, method: str, params: Any) -> dict:
+        self.calls += 1
+        key = f"{method}:{_encode(params or [])}"
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            future.add_done_callback(_retrieve)
+            self._inflight[key] = future
+            self._pending.append((key, method, params or [], future))
+            if len(self._pending) >= self.max_batch_size:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self._flush)
+
+        # Shielded so one cancelled caller does not cancel the shared call.
+        response = await asyncio.shield(future)
+        return dict(response)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.create_task(self._send(batch))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch: list[tuple[str, str, Any, asyncio.Future]]):
+        requests = [
+            {"jsonrpc": "2.0", "method": method, "params": params, "id": next(self.request_counter)}
+            for _, method, params, _ in batch
+        ]
+        body = requests[0] if len(requests) == 1 else requests
+        self.http_requests += 1
+        if len(requests) > 1:
+            self.batched_calls += len(requests)
+        self.max_batch_seen = max(self.max_batch_seen, len(requests))
+
+        try:
+            if self.session is None:
+                raise ProviderConnectionError("RPC provider is not started")
+            decoded = await self._post_with_failover(_encode(body), [method for _, method, _, _ in batch])
+
+            if isinstance(decoded, dict):
+                # Either a single call's response, or one error for the whole batch.
+                responses = {request["id"]: {**decoded, "id": request["id"]} for request in requests}
+            else:
+                responses = {response.get("id"): response for response in decoded}
+
+            for request, (_, _, _, future) in zip(requests, batch):
+                response = responses.get(request["id"])
+                if future.done():
+                    continue
+                if response is None:
+                    self.errors += 1
+                    future.set_exception(ProviderConnectionError(f"No response for RPC id {request['id']}"))
+                else:
+                    if "error" in response:
+                        self.errors += 1
+                    future.set_result(response)
+        except Exception as e:
+            self.errors += 1
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            for key, _, _, future in batch:
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+
+    async def _post(self, endpoint: RpcEndpoint, data: str):
+        started = time.perf_counter()
+        try:
+            async with self.session.post(endpoint.url, data=data, headers={"Content-Type": "application/json"}) as resp:
+                resp.raise_for_status()
+                decoded = _JSON.json_decode(await resp.text())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            endpoint.record_failure()
+            raise
+        endpoint.record_success(time.perf_counter() - started)
+        return decoded
+
+    async def _post_with_failover(self, data: str, methods: list[str]):
+        endpoints = self.pool.ranked()
+        hedge = self.pool.should_hedge(methods)
+        last_error: Exception | None = None
+        i = 0
+        while i < len(endpoints):
+            if i:
+                self.failovers += 1
+            try:
+                if hedge and i + 1 < len(endpoints):
+                    i += 2
+                    return await self._post_hedged(data, endpoints[i - 2], endpoints[i - 1])
+                i += 1
+                return await self._post(endpoints[i - 1], data)
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    async def _post_hedged(self, data: str, primary: RpcEndpoint, backup: RpcEndpoint):
+        """Send to primary; bring in backup after primary's hedge delay or as soon as primary fails."""
+        first = asyncio.create_task(self._post(primary, data))
+        done, _ = await asyncio.wait({first}, timeout=self.pool.hedge_delay(primary))
+        if done and first.exception() is None:
+            return first.result()
+        if done:
+            return await self._post(backup, data)
+
+        self.hedges += 1
+        backup.hedged += 1
+        second = asyncio.create_task(self._post(backup, data))
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+            # Both failed; surface the primary's error so failover moves on.
+            return first.result()
+        finally:
+            for task in (first, second):
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "endpoints": self.pool.stats(),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "http_requests": self.http_requests,
+            "batched_calls": self.batched_calls,
+            "max_batch_size": self.max_batch_size,
+            "max_batch_seen": self.max_batch_seen,
+            "inflight": len(self._inflight),
+            "errors": self.errors,
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
@@ -0,0 +1,262 @@
+"""
+A pool of signing keys for vault payments.
+
+A key's transactions are mined in nonce order, and nodes keep only a few
+pending transactions per sender (SIGNER_MAX_PENDING, 16 slots on geth and
+Bor by default), so one key caps how many payments can be in flight.
+SignerPool holds a NonceManager per key and sends each payment from the
+active signer with the fewest payments pending; a payment waits for a slot
+when every signer is full. Each key must be the vault owner or an operator
+(AgentVault.setOperator); a key the vault does not accept stays out of
+rotation and is checked again on every reload.
+
+Extra keys come from SIGNER_KEYS (comma-separated) and SIGNER_KEYS_FILE (one
+per line), next to the owner's PRIVATE_KEY. Every SIGNER_RELOAD_SECONDS the
+file is read again: a new key joins once the vault accepts it, and a key no
+longer listed is drained, taking no new payments and leaving the pool once
+its pending payments are mined. To rotate a key without downtime, add the
+new key to the file, wait for it to turn active, then remove the old one.
+
+A payment stops counting as pending when the receipt tracker sees it mined,
+or, in a process without a tracker (the SDK), when the caller reports it
+with ``done``.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from pathlib import Path
+
+from eth_account import Account
+from hexbytes import HexBytes
+from web3 import Web3
+
+from chain.nonces import NonceManager
+
+SIGNER_KEYS = [key.strip() for key in os.getenv("SIGNER_KEYS", "").split(",") if key.strip()]
+SIGNER_KEYS_FILE = os.getenv("SIGNER_KEYS_FILE")
+SIGNER_RELOAD_SECONDS = float(os.getenv("SIGNER_RELOAD_SECONDS", "30"))
+SIGNER_MAX_PENDING = int(os.getenv("SIGNER_MAX_PENDING", "16"))
+SIGNER_RATE_WINDOW_SECONDS = float(os.getenv("SIGNER_RATE_WINDOW_SECONDS", "60"))
+
+
+class Signer:
+    def __init__(self, nonces: NonceManager, primary: bool = False):
+        self.nonces = nonces
+        self.address = nonces.address
+        # The PRIVATE_KEY signer; its NonceManager is started and stopped by its owner.
+        self.primary = primary
+        # "new" until the vault's answer is known, then "active", "unauthorized" or "draining".
+        self.state = "new"
+        # Transaction hashes sent and not yet seen mined.
+        self.pending: set[str] = set()
+        self.sending = 0
+        self.sent = 0
+        self.mined = 0
+        self.failed = 0
+        self._sent_at: deque[float] = deque()
+
+    @property
+    def load(self) -> int:
+        return len(self.pending) + self.sending
+
+    def rate(self, now: float) -> float:
+        while self._sent_at and now - self._sent_at[0] > SIGNER_RATE_WINDOW_SECONDS:
+            self._sent_at.popleft()
+        return len(self._sent_at) / SIGNER_RATE_WINDOW_SECONDS
+
+
+class SignerPool:
+    def __init__(self, w3, vault, primary: NonceManager, fees=None, tracker=None, keys: list[str] | None = None,
+                 keys_file: str | None = SIGNER_KEYS_FILE, max_pending: int = SIGNER_MAX_PENDING):
+        self.w3 = w3
+        self.vault = vault
+        self.fees = fees
+        self.tracker = tracker
+        self.keys = SIGNER_KEYS if keys is None else keys
+        self.keys_file = keys_file
+        self.max_pending = max_pending
+        # Gas estimates are made from the owner's address; every signer is charged the same.
+        self.address = primary.address
+        self._signers: dict[str, Signer] = {primary.address: Signer(primary, primary=True)}
+        # tx hash -> signer it was sent from
+        self._by_hash: dict[str, Signer] = {}
+        self._slot_freed = asyncio.Condition()
+        self._loading: asyncio.Task | None = None
+        self._task: asyncio.Task | None = None
+
+        self.waits = 0
+        self.reloads = 0
+        self.errors = 0
+
+    def start(self):
+        if self._task is None:
+            for signer in self._signers.values():
+                if not signer.primary:
+                    signer.nonces.start()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            task, self._task = self._task, None
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        for signer in self._signers.values():
+            if not signer.primary:
+                await signer.nonces.stop()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(SIGNER_RELOAD_SECONDS)
+            try:
+                await self.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                print(f"[signers] ERROR: {e}")
+
+    async def ready(self):
+        """Load the configured keys if that has not happened yet."""
+        if self.reloads == 0:
+            if self._loading is None or self._loading.done():
+                self._loading = asyncio.get_running_loop().create_task(self.reload())
+            await asyncio.shield(self._loading)
+
+    def _configured_keys(self) -> list[str]:
+        keys = list(self.keys)
+        if self.keys_file:
+            path = Path(self.keys_file)
+            if path.exists():
+                keys += [line.strip() for line in path.read_text().splitlines() if line.strip() and not line.startswith("#")]
+        return keys
+
+    async def reload(self):
+        """Add new keys, drain removed ones and ask the vault about keys not yet active."""
+        wanted = {}
+        for key in self._configured_keys():
+            account = Account.from_key(key)
+            wanted[account.address] = account
+        for address, account in wanted.items():
+            signer = self._signers.get(address)
+            if signer is None:
+                signer = self._signers[address] = Signer(NonceManager(self.w3, account, self.fees))
+                if self._task is not None:
+                    signer.nonces.start()
+            elif signer.state == "draining":
+                signer.state = "new"
+        for signer in self._signers.values():
+            if not signer.primary and signer.address not in wanted and signer.state != "draining":
+                signer.state = "draining"
+                print(f"[signers] draining {signer.address} ({signer.load} pending)")
+
+        unknown = [s for s in self._signers.values() if s.state in ("new", "unauthorized")]
+        answers = await asyncio.gather(*(self._authorized(s) for s in unknown), return_exceptions=True)
+        for signer, authorized in zip(unknown, answers):
+            if isinstance(authorized, Exception):
+                self.errors += 1
+                print(f"[signers] authorization check for {signer.address} failed: {authorized}")
+                continue
+            if authorized and signer.state != "active":
+                print(f"[signers] {signer.address} is active")
+            elif not authorized and signer.state == "new":
+                print(f"[signers] {signer.address} is not an operator of the vault; kept out of rotation")
+            signer.state = "active" if authorized else "unauthorized"
+        self.reloads += 1
+        await self._sweep()
+
+    async def _authorized(self, signer: Signer) -> bool:
+        if signer.primary:
+            return True
+        return bool(await self.vault.functions.isOperator(signer.address).call())
+
+    async def _sweep(self):
+        for signer in [s for s in self._signers.values() if s.state == "draining" and s.load == 0]:
+            del self._signers[signer.address]
+            await signer.nonces.stop()
+            print(f"[signers] {signer.address} left the pool after {signer.sent} payment(s)")
+
+    def _pick(self) -> Signer | None:
+        active = [s for s in self._signers.values() if s.state == "active" and s.load < self.max_pending]
+        # Fewest pending first; ties go to the signer that has sent least, so idle keys take turns.
+        return min(active, key=lambda s: (s.load, s.sent), default=None)
+
+    async def send(self, tx: dict) -> HexBytes:
+        """Sign and send ``tx`` from the least-loaded signer. Returns the transaction hash."""
+        await self.ready()
+        signer = self._pick()
+        if signer is None:
+            if not any(s.state == "active" for s in self._signers.values()):
+                raise RuntimeError("No active signer in the pool")
+            self.waits += 1
+            async with self._slot_freed:
+                while (signer := self._pick()) is None:
+                    await self._slot_freed.wait()
+        signer.sending += 1
+        try:
+            tx_hash = await signer.nonces.send({**tx, "from": signer.address})
+        except Exception:
+            signer.failed += 1
+            raise
+        finally:
+            signer.sending -= 1
+        key = Web3.to_hex(tx_hash).lower()
+        signer.pending.add(key)
+        self._by_hash[key] = signer
+        signer.sent += 1
+        signer._sent_at.append(time.monotonic())
+        if self.tracker is not None:
+            self.tracker.track(tx_hash).add_done_callback(lambda future: self._tracked(key, future))
+        return tx_hash
+
+    def _tracked(self, key: str, future: asyncio.Future):
+        if not future.cancelled():
+            # Retrieved here so an unmined transaction's timeout is not reported as unhandled.
+            future.exception()
+        self.done(key)
+
+    def done(self, tx_hash):
+        """Stop counting ``tx_hash`` as pending: it was mined, or will not be waited on any more."""
+        key = (tx_hash if isinstance(tx_hash, str) else Web3.to_hex(tx_hash)).lower()
+        signer = self._by_hash.pop(key, None)
+        if signer is None:
+            return
+        signer.pending.discard(key)
+        signer.mined += 1
+        asyncio.get_running_loop().create_task(self._free_slot(signer))
+
+    async def _free_slot(self, signer: Signer):
+        async with self._slot_freed:
+            self._slot_freed.notify()
+        if signer.state == "draining" and signer.load == 0:
+            await self._sweep()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        signers = list(self._signers.values())
+        return {
+            "signers": [
+                {
+                    "address": s.address,
+                    "state": s.state,
+                    "primary": s.primary,
+                    "pending": s.load,
+                    "sent": s.sent,
+                    "mined": s.mined,
+                    "failed": s.failed,
+                    "sent_per_second": round(s.rate(now), 3),
+                    "next_nonce": s.nonces._next,
+                }
+                for s in signers
+            ],
+            "active": sum(1 for s in signers if s.state == "active"),
+            "pending": sum(s.load for s in signers),
+            "max_pending_per_signer": self.max_pending,
+            "waits": self.waits,
+            "reloads": self.reloads,
+            "errors": self.errors,
+        }
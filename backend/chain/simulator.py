@@ -0,0 +1,914 @@
+"""
+Local AgentVault chain simulator.
+
+A JSON-RPC stand-in for Polygon Amoy that implements the subset of methods
+the backend and SDK use, so the real verification, indexing and signing
+paths can be load tested on one machine:
+
+  * signed raw transactions are decoded, nonce-checked and mined into blocks,
+    either one block per transaction (SIM_BLOCK_TIME_SECONDS=0) or on a
+    fixed block time;
+  * calls to the vault are executed against in-memory state with the same
+    rules as AgentVault.executePayment (owner or operator only, agent active,
+    recipient whitelisted, per-tx limit, daily cap, balance) and revert with the
+    contract's custom errors; executeBatchPayment skips failing items with
+    PaymentBlocked, as the contract does; payment channels are opened,
+    redeemed against EIP-712 vouchers and closed as on chain;
+  * a PolicyRegistry at its own address holds the agents' policies:
+    add_agent registers an agent and funds it in a new block, and the
+    owner can update, whitelist, pause and unpause agents with transactions;
+  * receipts and eth_getLogs return correctly ABI-encoded vault and registry
+    logs;
+  * with SIM_SENDER_SLOTS set, a sender with that many transactions
+    pending is refused more, as a node's per-account txpool slots do;
+  * every HTTP request is delayed by SIM_LATENCY_MS (+ up to
+    SIM_LATENCY_JITTER_MS) to model a remote provider.
+
+There is no EVM and no token or native-gas accounting: deposits credit the
+agent directly and every account has an ample native balance.
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+from pathlib import Path
+from typing import Any
+
+import rlp
+from aiohttp import web
+from eth_abi import encode
+from eth_account import Account
+from eth_account._utils.legacy_transactions import Transaction as LegacyTransaction
+from eth_account._utils.typed_transactions import TypedTransaction
+from hexbytes import HexBytes
+from web3 import Web3
+
+from chain.vouchers import domain_separator, recover_signer, voucher_digest
+
+SIM_CHAIN_ID = int(os.getenv("SIM_CHAIN_ID", "80002"))
+SIM_BLOCK_TIME_SECONDS = float(os.getenv("SIM_BLOCK_TIME_SECONDS", "0"))
+SIM_LATENCY_MS = float(os.getenv("SIM_LATENCY_MS", "0"))
+SIM_LATENCY_JITTER_MS = float(os.getenv("SIM_LATENCY_JITTER_MS", "0"))
+SIM_BASE_FEE_GWEI = float(os.getenv("SIM_BASE_FEE_GWEI", "1"))
+SIM_PRIORITY_FEE_GWEI = float(os.getenv("SIM_PRIORITY_FEE_GWEI", "1"))
+# Matches sdk.agentpay_client.DEPLOYMENT_BLOCK so the indexer starts at the chain's genesis.
+SIM_START_BLOCK = int(os.getenv("SIM_START_BLOCK", "33980000"))
+# Pending transactions a node keeps per sender; 0 is unlimited.
+SIM_SENDER_SLOTS = int(os.getenv("SIM_SENDER_SLOTS", "0"))
+
+ABI_PATH = Path(__file__).resolve().parent.parent / "sdk" / "abi" / "AgentVault.json"
+REGISTRY_ABI_PATH = Path(__file__).resolve().parent.parent / "sdk" / "abi" / "PolicyRegistry.json"
+
+GAS_TRANSFER = 21_000
+GAS_DEPOSIT = 52_000
+GAS_PAYMENT = 64_000
+GAS_REVERT = 29_000
+# executeBatchPayment: fixed cost, plus per item, per policy read and per token transfer.
+GAS_BATCH_BASE = 30_000
+GAS_BATCH_ITEM = 9_000
+GAS_BATCH_AGENT = 14_000
+GAS_BATCH_PAYEE = 17_000
+GAS_OPEN_CHANNEL = 98_000
+GAS_REDEEM_VOUCHER = 66_000
+GAS_CLOSE_CHANNEL = 38_000
+GAS_REGISTER_AGENT = 140_000
+GAS_UPDATE_POLICY = 32_000
+BLOCK_GAS_LIMIT = 30_000_000
+NATIVE_BALANCE = 10**21
+
+_ZERO_HASH = "0x" + "00" * 32
+_EMPTY_BLOOM = "0x" + "00" * 256
+
+
+class RpcError(Exception):
+    def __init__(self, code: int, message: str, data: str | None = None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.data = data
+
+    def as_json(self) -> dict:
+        error = {"code": self.code, "message": self.message}
+        if self.data is not None:
+            error["data"] = self.data
+        return error
+
+
+class Revert(Exception):
+    def __init__(self, data: str):
+        super().__init__(data)
+        self.data = data
+
+
+def _hex(value: int) -> str:
+    return hex(value)
+
+
+def _selector(signature: str) -> str:
+    return Web3.to_hex(Web3.keccak(text=signature)[:4])
+
+
+def _topic(signature: str) -> str:
+    return Web3.to_hex(Web3.keccak(text=signature))
+
+
+def _address_topic(address: str) -> str:
+    return "0x" + "00" * 12 + address[2:].lower()
+
+
+class SimulatedAgent:
+    def __init__(self, *, balance: int, max_per_tx: int, daily_cap: int, whitelist: list[str], active: bool = True):
+        self.balance = balance
+        self.max_per_tx = max_per_tx
+        self.daily_cap = daily_cap
+        self.whitelist = {Web3.to_checksum_address(a) for a in whitelist}
+        self.active = active
+        # Zero for an agent the registry has never seen.
+        self.registered_at = 0
+        self.daily_spent = 0
+        self.last_reset_day = 0
+
+
+class SimulatedChannel:
+    def __init__(self):
+        self.signer = "0x" + "00" * 20
+        self.deposited = 0
+        self.redeemed = 0
+        self.expires_at = 0
+
+
+class ChainSimulator:
+    def __init__(
+        self,
+        *,
+        vault_address: str,
+        owner: str,
+        chain_id: int = SIM_CHAIN_ID,
+        block_time: float = SIM_BLOCK_TIME_SECONDS,
+        latency_ms: float = SIM_LATENCY_MS,
+        jitter_ms: float = SIM_LATENCY_JITTER_MS,
+        base_fee_gwei: float = SIM_BASE_FEE_GWEI,
+        start_block: int = SIM_START_BLOCK,
+        registry_address: str | None = None,
+        sender_slots: int = SIM_SENDER_SLOTS,
+    ):
+        artifact = json.loads(ABI_PATH.read_text())
+        self.vault_address = Web3.to_checksum_address(vault_address)
+        self.vault = Web3().eth.contract(address=self.vault_address, abi=artifact["abi"])
+        self.registry_address = Web3.to_checksum_address(
+            registry_address or Web3.keccak(text=f"PolicyRegistry:{self.vault_address}")[-20:]
+        )
+        self.registry = Web3().eth.contract(
+            address=self.registry_address, abi=json.loads(REGISTRY_ABI_PATH.read_text())["abi"]
+        )
+        self.vault_code = artifact.get("deployedBytecode") or "0x"
+        self.owner = Web3.to_checksum_address(owner)
+        self.chain_id = chain_id
+        self.block_time = block_time
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.base_fee = int(base_fee_gwei * 10**9)
+        self.priority_fee = int(SIM_PRIORITY_FEE_GWEI * 10**9)
+        self.sender_slots = sender_slots
+
+        self.agents: dict[bytes, SimulatedAgent] = {}
+        # Keys besides the owner allowed to execute payments (AgentVault.setOperator).
+        self.operators: set[str] = set()
+        # (agent id, recipient) -> channel
+        self.channels: dict[tuple[bytes, str], SimulatedChannel] = {}
+        self.blocks: list[dict] = []
+        self.block_by_hash: dict[str, dict] = {}
+        self.transactions: dict[str, dict] = {}
+        self.receipts: dict[str, dict] = {}
+        self.nonces: dict[str, int] = {}
+        # sender -> nonce -> tx; only the run of nonces starting at the account nonce is mineable.
+        self.mempool: dict[str, dict[int, dict]] = {}
+
+        self.requests = 0
+        self.calls = 0
+        self.reverts = 0
+        self._runner: web.AppRunner | None = None
+        self._miner: asyncio.Task | None = None
+        self.url = ""
+
+        self._mine_block([], timestamp=int(time.time()), number=start_block)
+
+    # ----- setup -----
+
+    def add_agent(
+        self,
+        agent_id: str,
+        *,
+        balance_usdc: float,
+        max_per_tx_usdc: float,
+        daily_cap_usdc: float,
+        whitelist: list[str],
+        active: bool = True,
+    ):
+        """Register and fund an agent in a new block, with the logs registerAgent, deposit and pauseAgent emit."""
+        agent_id_bytes = bytes(Web3.keccak(text=agent_id))
+        agent = self.agents[agent_id_bytes] = SimulatedAgent(
+            balance=int(round(balance_usdc * 10**6)),
+            max_per_tx=int(round(max_per_tx_usdc * 10**6)),
+            daily_cap=int(round(daily_cap_usdc * 10**6)),
+            whitelist=whitelist,
+            active=active,
+        )
+        timestamp = max(int(time.time()), self.head["timestamp"] + 1)
+        agent.registered_at = timestamp
+        logs = [self._registry_log("AgentRegistered(bytes32,uint256,uint256)", agent_id_bytes, ["uint256", "uint256"], [agent.max_per_tx, agent.daily_cap])]
+        if agent.balance:
+            logs.append((self.vault_address, [_topic("Deposited(bytes32,uint256)"), Web3.to_hex(agent_id_bytes)], Web3.to_hex(encode(["uint256"], [agent.balance]))))
+        if not active:
+            logs.append(self._registry_log("AgentPaused(bytes32)", agent_id_bytes))
+        self._mine_block([], timestamp=timestamp, number=self.head["number"] + 1, setup_logs=logs)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        app = web.Application()
+        app.router.add_post("/", self._handle_http)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.url = f"http://{host}:{site._server.sockets[0].getsockname()[1]}/"
+        if self.block_time > 0:
+            self._miner = asyncio.create_task(self._mine_forever())
+        print(f"[simulator] listening on {self.url} chain_id={self.chain_id} block_time={self.block_time}s")
+
+    async def stop(self):
+        if self._miner is not None:
+            self._miner.cancel()
+            try:
+                await self._miner
+            except asyncio.CancelledError:
+                pass
+            self._miner = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    # ----- JSON-RPC -----
+
+    async def _handle_http(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        body = await request.json()
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        if isinstance(body, list):
+            return web.json_response([self.handle(item) for item in body])
+        return web.json_response(self.handle(body))
+
+    def handle(self, request: dict) -> dict:
+        self.calls += 1
+        reply = {"jsonrpc": "2.0", "id": request.get("id")}
+        handler = getattr(self, "rpc_" + str(request.get("method")), None)
+        try:
+            if handler is None:
+                raise RpcError(-32601, f"the method {request.get('method')} does not exist/is not available")
+            reply["result"] = handler(*(request.get("params") or []))
+        except RpcError as e:
+            reply["error"] = e.as_json()
+        except (TypeError, ValueError) as e:
+            reply["error"] = {"code": -32602, "message": f"invalid params: {e}"}
+        return reply
+
+    def rpc_web3_clientVersion(self):
+        return "AgentPay/chain-simulator"
+
+    def rpc_net_version(self):
+        return str(self.chain_id)
+
+    def rpc_eth_chainId(self):
+        return _hex(self.chain_id)
+
+    def rpc_eth_syncing(self):
+        return False
+
+    def rpc_eth_accounts(self):
+        return []
+
+    def rpc_eth_blockNumber(self):
+        return _hex(self.head["number"])
+
+    def rpc_eth_gasPrice(self):
+        return _hex(self.base_fee + self.priority_fee)
+
+    def rpc_eth_maxPriorityFeePerGas(self):
+        return _hex(self.priority_fee)
+
+    def rpc_eth_feeHistory(self, block_count, newest, percentiles=None):
+        count = max(1, min(int(block_count, 16) if isinstance(block_count, str) else int(block_count), 1024))
+        newest_block = self._block(newest)
+        oldest = max(self.blocks[0]["number"], newest_block["number"] - count + 1)
+        blocks = [self._block(n) for n in range(oldest, newest_block["number"] + 1)]
+        history = {
+            "oldestBlock": _hex(oldest),
+            "baseFeePerGas": [_hex(b["baseFeePerGas"]) for b in blocks] + [_hex(self.base_fee)],
+            "gasUsedRatio": [b["gasUsed"] / BLOCK_GAS_LIMIT for b in blocks],
+        }
+        if percentiles:
+            history["reward"] = [self._rewards(b, percentiles) for b in blocks]
+        return history
+
+    def rpc_eth_getBalance(self, address, block="latest"):
+        return _hex(NATIVE_BALANCE)
+
+    def rpc_eth_getCode(self, address, block="latest"):
+        return self.vault_code if Web3.to_checksum_address(address) == self.vault_address else "0x"
+
+    def rpc_eth_getTransactionCount(self, address, block="latest"):
+        sender = Web3.to_checksum_address(address)
+        nonce = self.nonces.get(sender, 0)
+        if block == "pending":
+            queued = self.mempool.get(sender, {})
+            while nonce in queued:
+                nonce += 1
+        return _hex(nonce)
+
+    def rpc_eth_getBlockByNumber(self, block, full=False):
+        if block == "pending":
+            block = "latest"
+        try:
+            return self._block_json(self._block(block), full)
+        except RpcError:
+            return None
+
+    def rpc_eth_getBlockByHash(self, block_hash, full=False):
+        block = self.block_by_hash.get(block_hash.lower())
+        return self._block_json(block, full) if block else None
+
+    def rpc_eth_getTransactionByHash(self, tx_hash):
+        tx = self.transactions.get(tx_hash.lower())
+        return {k: v for k, v in tx.items() if not k.startswith("_")} if tx else None
+
+    def rpc_eth_getTransactionReceipt(self, tx_hash):
+        return self.receipts.get(tx_hash.lower())
+
+    def rpc_eth_getLogs(self, log_filter):
+        if log_filter.get("blockHash"):
+            block = self.block_by_hash.get(log_filter["blockHash"].lower())
+            blocks = [block] if block else []
+        else:
+            lo = max(self._number(log_filter.get("fromBlock", "latest")), self.blocks[0]["number"])
+            hi = min(self._number(log_filter.get("toBlock", "latest")), self.head["number"])
+            blocks = [self._block(n) for n in range(lo, hi + 1)]
+
+        addresses = log_filter.get("address")
+        if isinstance(addresses, str):
+            addresses = [addresses]
+        addresses = {a.lower() for a in addresses} if addresses else None
+        topics = log_filter.get("topics") or []
+
+        return [
+            log
+            for block in blocks
+            for log in block["logs"]
+            if (addresses is None or log["address"].lower() in addresses) and self._topics_match(log["topics"], topics)
+        ]
+
+    def rpc_eth_call(self, call, block="latest"):
+        sender = Web3.to_checksum_address(call.get("from") or "0x" + "00" * 20)
+        try:
+            _, output, _ = self._execute(sender, call.get("to"), call.get("data") or call.get("input") or "0x", self.head["timestamp"], commit=False)
+        except Revert as r:
+            raise RpcError(3, "execution reverted", r.data)
+        return output
+
+    def rpc_eth_estimateGas(self, call, block="latest"):
+        sender = Web3.to_checksum_address(call.get("from") or "0x" + "00" * 20)
+        try:
+            gas, _, _ = self._execute(sender, call.get("to"), call.get("data") or call.get("input") or "0x", self.head["timestamp"], commit=False)
+        except Revert as r:
+            raise RpcError(3, "execution reverted", r.data)
+        return _hex(gas)
+
+    def rpc_eth_sendRawTransaction(self, raw_hex):
+        raw = bytes.fromhex(raw_hex[2:] if raw_hex.startswith("0x") else raw_hex)
+        tx = self._decode_raw(raw)
+        sender, nonce = tx["from"], int(tx["nonce"], 16)
+
+        if tx["hash"] in self.transactions:
+            raise RpcError(-32000, "already known")
+        if tx.get("chainId") is not None and int(tx["chainId"], 16) != self.chain_id:
+            raise RpcError(-32000, f"invalid chain id: have {int(tx['chainId'], 16)} want {self.chain_id}")
+        if nonce < self.nonces.get(sender, 0):
+            raise RpcError(-32000, "nonce too low")
+        if int(tx["gas"], 16) < GAS_TRANSFER:
+            raise RpcError(-32000, "intrinsic gas too low")
+        if self._max_fee(tx) < self.base_fee:
+            raise RpcError(-32000, "transaction underpriced: max fee below base fee")
+
+        queued = self.mempool.setdefault(sender, {})
+        replaced = queued.get(nonce)
+        if replaced is not None:
+            # Same rule as geth: a replacement must bump the fee by at least 10%.
+            if self._max_fee(tx) * 10 < self._max_fee(replaced) * 11:
+                raise RpcError(-32000, "replacement transaction underpriced")
+            del self.transactions[replaced["hash"]]
+        elif self.sender_slots and len(queued) >= self.sender_slots:
+            raise RpcError(-32000, "txpool is full")
+        queued[nonce] = tx
+        self.transactions[tx["hash"]] = tx
+
+        if self.block_time <= 0:
+            self.mine()
+        return tx["hash"]
+
+    def rpc_evm_mine(self, *args):
+        self.mine()
+        return "0x0"
+
+    # ----- chain -----
+
+    @property
+    def head(self) -> dict:
+        return self.blocks[-1]
+
+    def _number(self, tag) -> int:
+        if tag in (None, "latest", "pending", "safe", "finalized"):
+            return self.head["number"]
+        if tag == "earliest":
+            return self.blocks[0]["number"]
+        return int(tag, 16) if isinstance(tag, str) else int(tag)
+
+    def _block(self, tag) -> dict:
+        number = self._number(tag)
+        index = number - self.blocks[0]["number"]
+        if index < 0 or index >= len(self.blocks):
+            raise RpcError(-32000, f"block {number} not found")
+        return self.blocks[index]
+
+    async def _mine_forever(self):
+        while True:
+            await asyncio.sleep(self.block_time)
+            self.mine()
+
+    def mine(self) -> dict:
+        """Mine every transaction whose nonce is next in line for its sender into one new block."""
+        ready = []
+        for sender, queued in self.mempool.items():
+            nonce = self.nonces.get(sender, 0)
+            while nonce in queued:
+                ready.append(queued.pop(nonce))
+                nonce += 1
+        self.mempool = {sender: queued for sender, queued in self.mempool.items() if queued}
+        ready.sort(key=lambda tx: tx["_received"])
+        # Arrival order across senders, but each sender's transactions still run in nonce order.
+        by_sender: dict[str, list[dict]] = {}
+        for tx in sorted(ready, key=lambda tx: int(tx["nonce"], 16)):
+            by_sender.setdefault(tx["from"], []).append(tx)
+        ready = [by_sender[tx["from"]].pop(0) for tx in ready]
+        return self._mine_block(ready, timestamp=max(int(time.time()), self.head["timestamp"] + 1), number=self.head["number"] + 1)
+
+    def drop(self, tx_hash: str) -> bool:
+        """Evict a pending transaction, as a node does when its mempool is full."""
+        tx = self.transactions.get(tx_hash.lower())
+        if tx is None or tx["hash"] in self.receipts:
+            return False
+        queued = self.mempool.get(tx["from"], {})
+        queued.pop(int(tx["nonce"], 16), None)
+        del self.transactions[tx["hash"]]
+        return True
+
+    def _mine_block(self, txs: list[dict], *, timestamp: int, number: int, setup_logs: list = ()) -> dict:
+        parent_hash = self.blocks[-1]["hash"] if self.blocks else _ZERO_HASH
+        block_hash = Web3.to_hex(Web3.keccak(text=f"{self.chain_id}:{number}:{parent_hash}:{timestamp}"))
+        block = {
+            "number": number,
+            "hash": block_hash,
+            "parentHash": parent_hash,
+            "timestamp": timestamp,
+            "baseFeePerGas": self.base_fee,
+            "gasUsed": 0,
+            "transactions": [],
+            "logs": [],
+        }
+
+        for index, tx in enumerate(txs):
+            sender = tx["from"]
+            self.nonces[sender] = int(tx["nonce"], 16) + 1
+            try:
+                gas_used, _, logs = self._execute(sender, tx["to"], tx["input"], timestamp, commit=False)
+                if gas_used > int(tx["gas"], 16):
+                    # Out of gas: nothing is applied and the whole limit is charged.
+                    gas_used, logs, status = int(tx["gas"], 16), [], 0
+                else:
+                    self._execute(sender, tx["to"], tx["input"], timestamp, commit=True)
+                    status = 1
+            except Revert:
+                gas_used, logs, status = GAS_REVERT, [], 0
+            if not status:
+                self.reverts += 1
+            block["gasUsed"] += gas_used
+
+            position = {"blockHash": block_hash, "blockNumber": _hex(number), "transactionHash": tx["hash"], "transactionIndex": _hex(index)}
+            tx.update(position)
+            tx.pop("_received", None)
+            receipt_logs = []
+            for address, topics, data in logs:
+                receipt_logs.append({**position, "address": address, "topics": topics, "data": data, "logIndex": _hex(len(block["logs"])), "removed": False})
+                block["logs"].append(receipt_logs[-1])
+            self.receipts[tx["hash"]] = {
+                **position,
+                "from": sender,
+                "to": tx["to"],
+                "contractAddress": None,
+                "cumulativeGasUsed": _hex(block["gasUsed"]),
+                "gasUsed": _hex(gas_used),
+                "effectiveGasPrice": _hex(self._effective_gas_price(tx)),
+                "logs": receipt_logs,
+                "logsBloom": _EMPTY_BLOOM,
+                "status": _hex(status),
+                "type": tx["type"],
+            }
+            block["transactions"].append(tx["hash"])
+
+        # State set up outside any transaction (add_agent) is logged under a placeholder transaction hash.
+        position = {"blockHash": block_hash, "blockNumber": _hex(number), "transactionHash": _ZERO_HASH, "transactionIndex": "0x0"}
+        for address, topics, data in setup_logs:
+            block["logs"].append({**position, "address": address, "topics": topics, "data": data, "logIndex": _hex(len(block["logs"])), "removed": False})
+
+        self.blocks.append(block)
+        self.block_by_hash[block_hash] = block
+        return block
+
+    def _block_json(self, block: dict, full: bool) -> dict:
+        return {
+            "number": _hex(block["number"]),
+            "hash": block["hash"],
+            "parentHash": block["parentHash"],
+            "timestamp": _hex(block["timestamp"]),
+            "baseFeePerGas": _hex(block["baseFeePerGas"]),
+            "gasLimit": _hex(BLOCK_GAS_LIMIT),
+            "gasUsed": _hex(block["gasUsed"]),
+            "transactions": [self.transactions[h] for h in block["transactions"]] if full else list(block["transactions"]),
+            "miner": "0x" + "00" * 20,
+            "difficulty": "0x0",
+            "totalDifficulty": "0x0",
+            "extraData": "0x",
+            "logsBloom": _EMPTY_BLOOM,
+            "mixHash": _ZERO_HASH,
+            "nonce": "0x0000000000000000",
+            "receiptsRoot": _ZERO_HASH,
+            "sha3Uncles": _ZERO_HASH,
+            "stateRoot": _ZERO_HASH,
+            "transactionsRoot": _ZERO_HASH,
+            "size": "0x220",
+            "uncles": [],
+        }
+
+    def _rewards(self, block: dict, percentiles: list[float]) -> list[str]:
+        tips = sorted(self._effective_gas_price(self.transactions[h]) - block["baseFeePerGas"] for h in block["transactions"])
+        if not tips:
+            return [_hex(self.priority_fee) for _ in percentiles]
+        return [_hex(tips[min(len(tips) - 1, int(len(tips) * p / 100))]) for p in percentiles]
+
+    @staticmethod
+    def _topics_match(log_topics: list[str], wanted: list) -> bool:
+        for position, option in enumerate(wanted):
+            if option is None:
+                continue
+            if position >= len(log_topics):
+                return False
+            options = option if isinstance(option, list) else [option]
+            if log_topics[position].lower() not in {o.lower() for o in options}:
+                return False
+        return True
+
+    # ----- transactions -----
+
+    def _decode_raw(self, raw: bytes) -> dict:
+        try:
+            if raw[0] <= 0x7F:
+                fields = TypedTransaction.from_bytes(HexBytes(raw)).as_dict()
+            else:
+                fields = rlp.decode(raw, LegacyTransaction).as_dict()
+            sender = Account.recover_transaction(raw)
+        except Exception as e:
+            raise RpcError(-32000, f"invalid transaction: {e}")
+
+        chain_id = fields.get("chainId")
+        if chain_id is None and fields["v"] >= 35:
+            chain_id = (fields["v"] - 35) // 2
+        tx_type = fields.get("type", 0)
+        tx = {
+            "hash": Web3.to_hex(Web3.keccak(raw)),
+            "from": sender,
+            "to": Web3.to_checksum_address(fields["to"]) if fields.get("to") else None,
+            "nonce": _hex(fields["nonce"]),
+            "gas": _hex(fields["gas"]),
+            "value": _hex(fields.get("value", 0)),
+            "input": Web3.to_hex(fields.get("data", b"")),
+            "type": _hex(tx_type),
+            "chainId": _hex(chain_id) if chain_id is not None else None,
+            "v": _hex(fields["v"]),
+            "r": _hex(fields["r"]),
+            "s": _hex(fields["s"]),
+            "blockHash": None,
+            "blockNumber": None,
+            "transactionIndex": None,
+            "_received": time.monotonic(),
+        }
+        if tx_type == 2:
+            tx["maxFeePerGas"] = _hex(fields["maxFeePerGas"])
+            tx["maxPriorityFeePerGas"] = _hex(fields["maxPriorityFeePerGas"])
+            tx["gasPrice"] = tx["maxFeePerGas"]
+        else:
+            tx["gasPrice"] = _hex(fields["gasPrice"])
+        return tx
+
+    @staticmethod
+    def _max_fee(tx: dict) -> int:
+        return int(tx.get("maxFeePerGas") or tx["gasPrice"], 16)
+
+    def _effective_gas_price(self, tx: dict) -> int:
+        if tx.get("maxFeePerGas"):
+            return min(int(tx["maxFeePerGas"], 16), self.base_fee + int(tx["maxPriorityFeePerGas"], 16))
+        return int(tx["gasPrice"], 16)
+
+    def _execute(self, sender: str, to: str | None, data: str, timestamp: int, *, commit: bool) -> tuple[int, str, list]:
+        """Run a call against the vault or the registry. Returns (gas_used, return_data, logs) or raises Revert."""
+        if to and Web3.to_checksum_address(to) == self.registry_address:
+            return self._execute_registry(sender, data, timestamp, commit)
+        if not to or Web3.to_checksum_address(to) != self.vault_address:
+            return GAS_TRANSFER, "0x", []
+        if data in ("0x", ""):
+            raise Revert("0x")
+        try:
+            function, args = self.vault.decode_function_input(data)
+        except ValueError:
+            raise Revert("0x")
+
+        name = function.fn_name
+        if name == "executePayment":
+            return self._execute_payment(sender, args["agentId"], args["recipient"], args["amount"], timestamp, commit)
+        if name == "executeBatchPayment":
+            return self._execute_batch(sender, args["agentIds"], args["recipients"], args["amounts"], timestamp, commit)
+        if name in ("openChannel", "redeemVoucher", "closeChannel"):
+            return self._execute_channel(name, sender, args, timestamp, commit)
+        if name == "getChannel":
+            channel = self.channels.get((bytes(args["agentId"]), Web3.to_checksum_address(args["recipient"]))) or SimulatedChannel()
+            state = (channel.signer, channel.deposited, channel.redeemed, channel.expires_at)
+            return GAS_TRANSFER, Web3.to_hex(encode(["(address,uint256,uint256,uint64)"], [state])), []
+        if name == "deposit":
+            agent = self._agent(args["agentId"], create=commit)
+            if commit:
+                agent.balance += args["amount"]
+            return GAS_DEPOSIT, "0x", [(self.vault_address, [_topic("Deposited(bytes32,uint256)"), Web3.to_hex(args["agentId"])], Web3.to_hex(encode(["uint256"], [args["amount"]])))]
+        if name == "getBalance":
+            return GAS_TRANSFER, self._uint(self._agent(args["agentId"]).balance), []
+        if name == "getDailySpent":
+            agent = self._agent(args["agentId"])
+            return GAS_TRANSFER, self._uint(0 if timestamp // 86400 > agent.last_reset_day else agent.daily_spent), []
+        if name == "getRemainingDailyBudget":
+            agent = self._agent(args["agentId"])
+            spent = 0 if timestamp // 86400 > agent.last_reset_day else agent.daily_spent
+            return GAS_TRANSFER, self._uint(agent.daily_cap - spent), []
+        if name == "owner":
+            return GAS_TRANSFER, Web3.to_hex(encode(["address"], [self.owner])), []
+        if name == "policyRegistry":
+            return GAS_TRANSFER, Web3.to_hex(encode(["address"], [self.registry_address])), []
+        if name == "isOperator":
+            account = Web3.to_checksum_address(args["account"])
+            return GAS_TRANSFER, Web3.to_hex(encode(["bool"], [account == self.owner or account in self.operators])), []
+        if name == "setOperator":
+            if sender != self.owner:
+                raise Revert(_selector("OwnableUnauthorizedAccount(address)") + encode(["address"], [sender]).hex())
+            operator = Web3.to_checksum_address(args["operator"])
+            if commit:
+                if args["allowed"]:
+                    self.operators.add(operator)
+                else:
+                    self.operators.discard(operator)
+            topics = [_topic("OperatorUpdated(address,bool)"), _address_topic(operator)]
+            return GAS_UPDATE_POLICY, "0x", [(self.vault_address, topics, Web3.to_hex(encode(["bool"], [args["allowed"]])))]
+        raise Revert("0x")
+
+    def _execute_registry(self, sender: str, data: str, timestamp: int, commit: bool):
+        try:
+            function, args = self.registry.decode_function_input(data)
+        except ValueError:
+            raise Revert("0x")
+        name = function.fn_name
+        agent_id = bytes(args["agentId"]) if "agentId" in args else b""
+        agent = self.agents.get(agent_id)
+        registered = agent is not None and agent.registered_at != 0
+
+        if name == "getPolicy":
+            agent = agent or self._agent(agent_id)
+            policy = (agent.max_per_tx, agent.daily_cap, sorted(agent.whitelist), agent.active, agent.registered_at)
+            return GAS_TRANSFER, Web3.to_hex(encode(["(uint256,uint256,address[],bool,uint256)"], [policy])), []
+        if name == "isAgentActive":
+            return GAS_TRANSFER, Web3.to_hex(encode(["bool"], [registered and agent.active])), []
+        if name == "isWhitelisted":
+            whitelisted = registered and Web3.to_checksum_address(args["recipient"]) in agent.whitelist
+            return GAS_TRANSFER, Web3.to_hex(encode(["bool"], [whitelisted])), []
+        if name == "owner":
+            return GAS_TRANSFER, Web3.to_hex(encode(["address"], [self.owner])), []
+
+        if name not in ("registerAgent", "updatePolicy", "addToWhitelist", "pauseAgent", "unpauseAgent"):
+            raise Revert("0x")
+        if sender != self.owner:
+            raise Revert(_selector("OwnableUnauthorizedAccount(address)") + encode(["address"], [sender]).hex())
+        if name == "registerAgent":
+            if registered:
+                raise Revert(_selector("AgentAlreadyRegistered()"))
+            if commit:
+                # A deposit may have come first: keep the balance.
+                agent = self._agent(agent_id, create=True)
+                agent.max_per_tx, agent.daily_cap = args["maxPerTx"], args["dailyCap"]
+                agent.whitelist = {Web3.to_checksum_address(a) for a in args["whitelist"]}
+                agent.active, agent.registered_at = True, timestamp
+            log = self._registry_log("AgentRegistered(bytes32,uint256,uint256)", agent_id, ["uint256", "uint256"], [args["maxPerTx"], args["dailyCap"]])
+            return GAS_REGISTER_AGENT, "0x", [log]
+        if not registered:
+            raise Revert(_selector("AgentNotFound()"))
+        if name == "updatePolicy":
+            if commit:
+                agent.max_per_tx, agent.daily_cap = args["maxPerTx"], args["dailyCap"]
+            log = self._registry_log("PolicyUpdated(bytes32,uint256,uint256)", agent_id, ["uint256", "uint256"], [args["maxPerTx"], args["dailyCap"]])
+        elif name == "addToWhitelist":
+            if commit:
+                agent.whitelist.add(Web3.to_checksum_address(args["recipient"]))
+            log = self._registry_log("WhitelistUpdated(bytes32,address)", agent_id, ["address"], [args["recipient"]])
+        else:
+            if commit:
+                agent.active = name == "unpauseAgent"
+            log = self._registry_log("AgentPaused(bytes32)" if name == "pauseAgent" else "AgentUnpaused(bytes32)", agent_id)
+        return GAS_UPDATE_POLICY, "0x", [log]
+
+    def _registry_log(self, signature: str, agent_id: bytes, types: list[str] = (), values: list = ()) -> tuple:
+        return (self.registry_address, [_topic(signature), Web3.to_hex(agent_id)], Web3.to_hex(encode(list(types), list(values))))
+
+    def _check_operator(self, sender: str):
+        if sender != self.owner and sender not in self.operators:
+            raise Revert(_selector("NotOperator(address)") + encode(["address"], [sender]).hex())
+
+    def _execute_payment(self, sender: str, agent_id: bytes, recipient: str, amount: int, timestamp: int, commit: bool):
+        self._check_operator(sender)
+        agent = self._agent(agent_id)
+        day = timestamp // 86400
+        spent = 0 if day > agent.last_reset_day else agent.daily_spent
+        error = self._payment_error(agent, recipient, amount, agent.balance, spent)
+        if error:
+            raise Revert(_selector(f"{error}()"))
+
+        if commit:
+            agent.last_reset_day = max(agent.last_reset_day, day)
+            agent.daily_spent = spent + amount
+            agent.balance -= amount
+        return GAS_PAYMENT, "0x", [self._payment_log(agent_id, recipient, amount, timestamp)]
+
+    def _execute_batch(self, sender: str, agent_ids: list, recipients: list, amounts: list, timestamp: int, commit: bool):
+        self._check_operator(sender)
+        if not len(agent_ids) == len(recipients) == len(amounts):
+            raise Revert(_selector("BatchLengthMismatch()"))
+
+        day = timestamp // 86400
+        # agent id -> [balance, spent] as the batch moves through it; applied only on commit.
+        state: dict[bytes, list[int]] = {}
+        runs = 0
+        payees = set()
+        logs = []
+        previous = None
+        for agent_id, recipient, amount in zip(agent_ids, recipients, amounts):
+            agent = self._agent(agent_id)
+            if agent_id != previous:
+                # The contract reads the policy once per run of consecutive items for an agent.
+                runs += 1
+                previous = agent_id
+            if agent_id not in state:
+                state[agent_id] = [agent.balance, 0 if day > agent.last_reset_day else agent.daily_spent]
+            balance, spent = state[agent_id]
+            error = self._payment_error(agent, recipient, amount, balance, spent)
+            if error:
+                logs.append((self.vault_address, [_topic("PaymentBlocked(bytes32,string)"), Web3.to_hex(agent_id)], Web3.to_hex(encode(["string"], [error]))))
+                continue
+            state[agent_id] = [balance - amount, spent + amount]
+            payees.add(Web3.to_checksum_address(recipient))
+            logs.append(self._payment_log(agent_id, recipient, amount, timestamp))
+
+        if commit:
+            for agent_id, (balance, spent) in state.items():
+                agent = self._agent(agent_id)
+                agent.last_reset_day = max(agent.last_reset_day, day)
+                agent.balance, agent.daily_spent = balance, spent
+        gas = GAS_BATCH_BASE + GAS_BATCH_ITEM * len(agent_ids) + GAS_BATCH_AGENT * runs + GAS_BATCH_PAYEE * len(payees)
+        return gas, "0x", logs
+
+    def _execute_channel(self, name: str, sender: str, args: dict, timestamp: int, commit: bool):
+        agent_id = bytes(args["agentId"])
+        recipient = Web3.to_checksum_address(args["recipient"])
+        key = (agent_id, recipient)
+        channel = self.channels.get(key) or SimulatedChannel()
+        opened = channel.signer != "0x" + "00" * 20
+
+        if name == "openChannel":
+            if sender != self.owner:
+                raise Revert(_selector("OwnableUnauthorizedAccount(address)") + encode(["address"], [sender]).hex())
+            agent = self._agent(agent_id)
+            amount = args["amount"]
+            day = timestamp // 86400
+            spent = 0 if day > agent.last_reset_day else agent.daily_spent
+            if not agent.active:
+                raise Revert(_selector("AgentNotActive()"))
+            if recipient not in agent.whitelist:
+                raise Revert(_selector("RecipientNotWhitelisted()"))
+            if spent + amount > agent.daily_cap:
+                raise Revert(_selector("ExceedsDailyCap()"))
+            if agent.balance < amount:
+                raise Revert(_selector("InsufficientBalance()"))
+            signer = Web3.to_checksum_address(args["signer"])
+            if opened and channel.signer != signer and channel.deposited != channel.redeemed:
+                raise Revert(_selector("ChannelSignerMismatch()"))
+            if commit:
+                agent.last_reset_day = max(agent.last_reset_day, day)
+                agent.daily_spent = spent + amount
+                agent.balance -= amount
+                channel.signer = signer
+                channel.deposited += amount
+                channel.expires_at = max(channel.expires_at, args["expiresAt"])
+                self.channels[key] = channel
+            data = encode(["address", "uint256", "uint64"], [signer, amount, max(channel.expires_at, args["expiresAt"])])
+            topics = [_topic("ChannelOpened(bytes32,address,address,uint256,uint64)"), Web3.to_hex(agent_id), _address_topic(recipient)]
+            return GAS_OPEN_CHANNEL, "0x", [(self.vault_address, topics, Web3.to_hex(data))]
+
+        if not opened:
+            raise Revert(_selector("ChannelNotOpen()"))
+        if name == "redeemVoucher":
+            cumulative = args["cumulativeAmount"]
+            if cumulative <= channel.redeemed:
+                raise Revert(_selector("VoucherAlreadyRedeemed()"))
+            if cumulative > channel.deposited:
+                raise Revert(_selector("VoucherExceedsDeposit()"))
+            digest = voucher_digest(domain_separator(self.chain_id, self.vault_address), agent_id, recipient, cumulative)
+            try:
+                signer = Web3.to_checksum_address(recover_signer(digest, bytes(args["signature"])))
+            except ValueError:
+                raise Revert(_selector("ECDSAInvalidSignature()"))
+            if signer != channel.signer:
+                raise Revert(_selector("InvalidVoucherSignature()"))
+            paid = cumulative - channel.redeemed
+            if commit:
+                channel.redeemed = cumulative
+            data = encode(["uint256", "uint256"], [cumulative, paid])
+            topics = [_topic("VoucherRedeemed(bytes32,address,uint256,uint256)"), Web3.to_hex(agent_id), _address_topic(recipient)]
+            return GAS_REDEEM_VOUCHER, "0x", [(self.vault_address, topics, Web3.to_hex(data))]
+
+        if sender != self.owner:
+            raise Revert(_selector("OwnableUnauthorizedAccount(address)") + encode(["address"], [sender]).hex())
+        if timestamp < channel.expires_at:
+            raise Revert(_selector("ChannelNotExpired()"))
+        refund = channel.deposited - channel.redeemed
+        if commit:
+            channel.deposited = channel.redeemed
+            self._agent(agent_id).balance += refund
+        topics = [_topic("ChannelClosed(bytes32,address,uint256)"), Web3.to_hex(agent_id), _address_topic(recipient)]
+        return GAS_CLOSE_CHANNEL, "0x", [(self.vault_address, topics, Web3.to_hex(encode(["uint256"], [refund])))]
+
+    @staticmethod
+    def _payment_error(agent: SimulatedAgent, recipient: str, amount: int, balance: int, spent: int) -> str | None:
+        if not agent.active:
+            return "AgentNotActive"
+        if Web3.to_checksum_address(recipient) not in agent.whitelist:
+            return "RecipientNotWhitelisted"
+        if amount > agent.max_per_tx:
+            return "ExceedsPerTxLimit"
+        if spent + amount > agent.daily_cap:
+            return "ExceedsDailyCap"
+        if balance < amount:
+            return "InsufficientBalance"
+        return None
+
+    def _payment_log(self, agent_id: bytes, recipient: str, amount: int, timestamp: int) -> tuple:
+        return (
+            self.vault_address,
+            [_topic("PaymentExecuted(bytes32,address,uint256,uint256)"), Web3.to_hex(agent_id), _address_topic(recipient)],
+            Web3.to_hex(encode(["uint256", "uint256"], [amount, timestamp])),
+        )
+
+    def _agent(self, agent_id: bytes, create: bool = False) -> SimulatedAgent:
+        agent = self.agents.get(bytes(agent_id))
+        if agent is None:
+            # Unregistered agents behave like the registry's zero-value policy: inactive, no limits, no balance.
+            agent = SimulatedAgent(balance=0, max_per_tx=0, daily_cap=0, whitelist=[], active=False)
+            if create:
+                self.agents[bytes(agent_id)] = agent
+        return agent
+
+    @staticmethod
+    def _uint(value: int) -> str:
+        return Web3.to_hex(encode(["uint256"], [value]))
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "head": self.head["number"],
+            "blocks": len(self.blocks),
+            "transactions": len(self.receipts),
+            "pending": sum(len(q) for q in self.mempool.values()),
+            "reverts": self.reverts,
+            "http_requests": self.requests,
+            "rpc_calls": self.calls,
+        }
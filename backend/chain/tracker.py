@@ -0,0 +1,142 @@
+"""
+One shared receipt poller for every transaction the backend is waiting on.
+
+``wait_for_transaction_receipt`` polls each hash on its own, so N payments
+in flight cost N receipt lookups every poll interval. ReceiptTracker polls
+``eth_blockNumber`` every TRACKER_POLL_SECONDS and only when a new block
+arrives looks up the receipts of all tracked hashes, issued together so the
+batching provider sends them as one JSON-RPC batch. A hash tracked between
+blocks is looked up on the next poll, in case it was already mined.
+Waiters that see no receipt within TRACKER_TIMEOUT_SECONDS get a TimeoutError.
+"""
+
+import asyncio
+import os
+import time
+
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+TRACKER_POLL_SECONDS = float(os.getenv("TRACKER_POLL_SECONDS", "1"))
+TRACKER_TIMEOUT_SECONDS = float(os.getenv("TRACKER_TIMEOUT_SECONDS", "180"))
+
+
+class ReceiptTracker:
+    def __init__(self, w3, timeout_seconds: float = TRACKER_TIMEOUT_SECONDS):
+        self.w3 = w3
+        self.timeout_seconds = timeout_seconds
+        # tx_hash -> (future resolved with the receipt, tracked at)
+        self._waiters: dict[str, tuple[asyncio.Future, float]] = {}
+        # Hashes tracked since the last lookup; checked even if no new block arrived.
+        self._fresh: set[str] = set()
+        self._head: int | None = None
+        self._task: asyncio.Task | None = None
+
+        self.tracked = 0
+        self.mined = 0
+        self.timeouts = 0
+        self.polls = 0
+        self.lookups = 0
+        self.errors = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        for future, _ in self._waiters.values():
+            future.cancel()
+        self._waiters.clear()
+        self._fresh.clear()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                print(f"[tracker] ERROR: {e}")
+            await asyncio.sleep(TRACKER_POLL_SECONDS)
+
+    @staticmethod
+    def _key(tx_hash) -> str:
+        return (tx_hash if isinstance(tx_hash, str) else Web3.to_hex(tx_hash)).lower()
+
+    def track(self, tx_hash) -> asyncio.Future:
+        """Future resolved with the receipt once ``tx_hash`` is mined."""
+        key = self._key(tx_hash)
+        entry = self._waiters.get(key)
+        if entry is not None:
+            return entry[0]
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[key] = (future, time.monotonic())
+        self._fresh.add(key)
+        self.tracked += 1
+        return future
+
+    async def wait(self, tx_hash):
+        # Shielded, so a cancelled waiter does not cancel the receipt for everyone else.
+        return await asyncio.shield(self.track(tx_hash))
+
+    async def poll_once(self) -> int:
+        """Look up receipts if a block arrived or a hash is new. Returns receipts delivered."""
+        self._expire()
+        if not self._waiters:
+            return 0
+        self.polls += 1
+        head = int(await self.w3.eth.block_number)
+        keys = list(self._waiters) if head != self._head else [k for k in self._fresh if k in self._waiters]
+        self._head = head
+        self._fresh.clear()
+        if not keys:
+            return 0
+
+        self.lookups += len(keys)
+        receipts = await asyncio.gather(*(self.w3.eth.get_transaction_receipt(k) for k in keys), return_exceptions=True)
+        delivered = 0
+        for key, receipt in zip(keys, receipts):
+            if isinstance(receipt, TransactionNotFound) or receipt is None:
+                continue
+            if isinstance(receipt, Exception):
+                self.errors += 1
+                # Retried on the next poll even without a new block.
+                self._fresh.add(key)
+                continue
+            entry = self._waiters.pop(key, None)
+            if entry is not None and not entry[0].done():
+                entry[0].set_result(receipt)
+                delivered += 1
+        self.mined += delivered
+        return delivered
+
+    def _expire(self):
+        now = time.monotonic()
+        for key, (future, tracked_at) in list(self._waiters.items()):
+            if future.done():
+                del self._waiters[key]
+            elif now - tracked_at > self.timeout_seconds:
+                del self._waiters[key]
+                future.set_exception(TimeoutError(f"Transaction {key} not mined within {self.timeout_seconds:.0f}s"))
+                self.timeouts += 1
+
+    def stats(self) -> dict:
+        return {
+            "waiting": len(self._waiters),
+            "tracked": self.tracked,
+            "mined": self.mined,
+            "timeouts": self.timeouts,
+            "polls": self.polls,
+            "receipt_lookups": self.lookups,
+            "errors": self.errors,
+            "head": self._head,
+        }
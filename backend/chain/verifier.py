@@ -0,0 +1,175 @@
+"""
+Non-blocking payment proof verification on AsyncWeb3.
+
+Receipts are fetched through AsyncWeb3 on the batching RPC provider, so
+concurrent paid requests overlap their RPC round trips instead of blocking
+the event loop one at a time. Decoded receipts are kept in a ReceiptCache,
+so re-checking a proof does not fetch or decode it again.
+
+``verify_optimistic`` also accepts a payment that is still in the mempool
+(checked by decoding its calldata and simulating it with eth_call) and
+reports whether the receipt is deep enough to be final.
+"""
+
+import os
+import time
+
+from fastapi import HTTPException
+from web3 import AsyncWeb3, Web3
+from web3.exceptions import ContractLogicError, TransactionNotFound
+
+from chain.receipts import ReceiptCache
+
+RPC_HEAD_REFRESH_SECONDS = float(os.getenv("RPC_HEAD_REFRESH_SECONDS", "2"))
+
+
+class PaymentVerifier:
+    def __init__(self, w3: AsyncWeb3, vault):
+        self.w3 = w3
+        self.vault = vault
+        self.vault_address = vault.address
+        self.receipts = ReceiptCache()
+        # Optional local index (chain.indexer.PaymentLogIndexer) consulted before the RPC.
+        self.index = None
+        self._head = 0
+        self._head_checked_at = 0.0
+
+    async def head_block(self) -> int:
+        if time.monotonic() - self._head_checked_at > RPC_HEAD_REFRESH_SECONDS:
+            self._head = int(await self.w3.eth.block_number)
+            self._head_checked_at = time.monotonic()
+        return self._head
+
+    async def _deep_enough(self, block_number: int, confirmations: int) -> bool:
+        try:
+            return await self.head_block() - block_number >= confirmations
+        except Exception:
+            return False
+
+    def decode_payments(self, receipt) -> list:
+        return self.vault.events.PaymentExecuted().process_receipt(receipt)
+
+    async def get_payment(self, tx_hash: str) -> dict:
+        """Receipt summary plus decoded PaymentExecuted args, served from the cache when possible.
+
+        ``payments`` is None when the vault's logs could not be decoded.
+        """
+        if self.index is not None:
+            record = await self.index.lookup(tx_hash)
+            # Trusted only at the indexer's confirmation depth under the current head; a hit left
+            # shallower by a reorg to a shorter chain is checked against its receipt instead.
+            if record is not None and await self._deep_enough(record["block_number"], self.index.confirmations):
+                return record
+
+        record = self.receipts.get(tx_hash)
+        if record is not None:
+            return record
+
+        receipt = await self.w3.eth.get_transaction_receipt(tx_hash)
+        record = {
+            "status": receipt.get("status"),
+            "to": receipt.get("to"),
+            "block_number": int(receipt.get("blockNumber", 0) or 0),
+            "gas_used": int(receipt.get("gasUsed", 0) or 0),
+            "payments": [],
+        }
+        if record["to"] and record["to"].lower() == self.vault_address.lower():
+            try:
+                record["payments"] = [dict(event["args"]) for event in self.decode_payments(receipt)]
+            except Exception:
+                record["payments"] = None
+
+        try:
+            final = self.receipts.is_final(record["block_number"], await self.head_block())
+        except Exception:
+            final = False
+        self.receipts.put(tx_hash, record, final)
+        return record
+
+    async def verify(self, tx_hash: str, *, agent_id_bytes: bytes, recipient: str, amount_units: int) -> dict:
+        """Check a proof against a route's precomputed agent id hash, checksummed recipient and amount in units."""
+        try:
+            record = await self.get_payment(tx_hash)
+        except Exception:
+            raise HTTPException(status_code=402, detail={"error": "Payment transaction not found"})
+        return self._check_record(tx_hash, record, agent_id_bytes=agent_id_bytes, recipient=recipient, amount_units=amount_units)
+
+    def _check_record(self, tx_hash: str, record: dict, *, agent_id_bytes: bytes, recipient: str, amount_units: int) -> dict:
+        if record["status"] != 1:
+            raise HTTPException(status_code=402, detail={"error": "Payment transaction failed"})
+
+        to_address = record["to"]
+        if not to_address or to_address.lower() != self.vault_address.lower():
+            raise HTTPException(status_code=402, detail={"error": "Payment tx did not target AgentVault"})
+
+        if record["payments"] is None:
+            raise HTTPException(status_code=402, detail={"error": "Unable to decode payment event"})
+
+        recipient = recipient.lower()
+        valid = False
+        for args in record["payments"]:
+            if (
+                args["agentId"] == agent_id_bytes
+                and args["recipient"].lower() == recipient
+                and int(args["amount"]) == amount_units
+            ):
+                valid = True
+                break
+
+        if not valid:
+            raise HTTPException(status_code=402, detail={"error": "Payment proof does not match endpoint requirements"})
+
+        return {
+            "tx_hash": tx_hash,
+            "block_number": record["block_number"],
+            "gas_used": record["gas_used"],
+        }
+
+    async def verify_optimistic(
+        self,
+        tx_hash: str,
+        *,
+        agent_id_bytes: bytes,
+        recipient: str,
+        amount_units: int,
+        confirmations: int,
+    ) -> dict:
+        """Like verify, but also accepts a pending transaction. ``final`` is True once the receipt is ``confirmations`` deep."""
+        try:
+            record = await self.get_payment(tx_hash)
+        except TransactionNotFound:
+            record = None
+        except Exception:
+            raise HTTPException(status_code=402, detail={"error": "Payment transaction not found"})
+
+        if record is not None:
+            verification = self._check_record(tx_hash, record, agent_id_bytes=agent_id_bytes, recipient=recipient, amount_units=amount_units)
+            depth = await self.head_block() - record["block_number"] + 1
+            return {**verification, "final": depth >= confirmations}
+
+        try:
+            tx = await self.w3.eth.get_transaction(tx_hash)
+        except Exception:
+            raise HTTPException(status_code=402, detail={"error": "Payment transaction not found"})
+
+        if not tx.get("to") or tx["to"].lower() != self.vault_address.lower():
+            raise HTTPException(status_code=402, detail={"error": "Payment tx did not target AgentVault"})
+        try:
+            function, args = self.vault.decode_function_input(tx["input"])
+        except Exception:
+            raise HTTPException(status_code=402, detail={"error": "Unable to decode payment call"})
+        if (
+            function.fn_name != "executePayment"
+            or args["agentId"] != agent_id_bytes
+            or args["recipient"].lower() != recipient.lower()
+            or int(args["amount"]) != amount_units
+        ):
+            raise HTTPException(status_code=402, detail={"error": "Payment proof does not match endpoint requirements"})
+
+        # The vault's policy checks run against the latest state, so a payment that would revert is refused now.
+        try:
+            await self.vault.functions.executePayment(agent_id_bytes, args["recipient"], amount_units).call({"from": tx["from"]})
+        except ContractLogicError:
+            raise HTTPException(status_code=402, detail={"error": "Pending payment would revert"})
+
+        return {"tx_hash": tx_hash, "block_number": 0, "gas_used": 0, "final": False}
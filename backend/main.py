@@ -1,20 +1,54 @@
-from fastapi import FastAPI, HTTPException, Header
+from fastapi import FastAPI, HTTPException, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
 import os
 import time
 import hashlib
+import base64
+import csv
+import io
+import json
 import sqlite3
 import asyncio
-from datetime import datetime
+from datetime import date, datetime
 from dotenv import load_dotenv
 from urllib.parse import urlparse
-from web3 import Web3
+from web3 import AsyncWeb3, Web3
 import traceback
+import uuid
+from collections import OrderedDict
 
 # Agent demo integration
 from agent.demo_agent import DemoAgent
+from chain.aggregator import PaymentAggregator
+from chain.channels import ChannelBook
+from chain.fees import FeeOracle
+from chain.indexer import PaymentLogIndexer
+from chain.nonces import NonceManager
+from chain.policy import PolicyMirror, PolicyViolation
+from chain.reconciler import RECONCILE_CONFIRMATIONS, PaymentReconciler
+from chain.rpc import BatchingRpcProvider
+from chain.signers import SignerPool
+from chain.tracker import ReceiptTracker
+from chain.verifier import PaymentVerifier
+from paywall.registry import PaidRoute, PaidRouteRegistry
+from storage.sqlite_engine import SQLiteEngine
+from storage.ingest import LedgerWriteQueue
+from storage.replay import ConsumedProofIndex
+from storage.archive import LedgerArchive, month_key, month_start, next_month_start
+from storage.partitions import (
+    PG_PARTITIONING,
+    PG_PARTITION_EXISTING,
+    convert_to_partitioned,
+    create_partitioned_ledger,
+    ensure_partitions,
+    list_month_partitions,
+    pg_add_log_index,
+    split_default_partition,
+    table_kind,
+)
 
 # Import contract instance from SDK
 from sdk.agentpay_client import (
@@ -24,6 +58,8 @@ from sdk.agentpay_client import (
     AGENT_VAULT_ADDRESS,
     account,
     ALCHEMY_RPC,
+    ALCHEMY_RPC_URLS,
+    DEPLOYMENT_BLOCK,
     PRIVATE_KEY,
     USDC_ADDRESS,
 )
@@ -36,6 +72,17 @@ print(f"[startup] PRIVATE_KEY configured: {bool(PRIVATE_KEY)}")
 
 app = FastAPI(title="AgentPay API")
 
+DEMO_RECIPIENT = "0x61254AEcF84eEdb890f07dD29f7F3cd3b8Eb2CBe"
+
+# Registered before CORS so that CORS stays the outermost middleware and the
+# cached 402 responses still carry its headers.
+paywall = PaidRouteRegistry(
+    app,
+    token="USDC",
+    token_address="0x41E94Eb019C0762f9Bfcf9Fb1E58725BfB0e7582",
+    network="Polygon Amoy Testnet",
+)
+
 # CORS configuration
 cors_origins = ["*"]
 app.add_middleware(
@@ -47,21 +94,397 @@ app.add_middleware(
 )
 
 
+LEDGER_COLUMNS = (
+    "agent_id",
+    "recipient",
+    "amount_usdc",
+    "tx_hash",
+    "status",
+    "block_reason",
+    "timestamp",
+    "created_at",
+    "block_number",
+    "gas_used",
+    "log_index",
+)
+
+TRANSACTION_COLUMNS = """id, agent_id, recipient, amount_usdc, tx_hash, status, block_reason,
+                   timestamp, created_at, block_number, gas_used, log_index"""
+
+# A ledger row books one PaymentExecuted log, unique on (tx_hash, log_index).
+# Payment proofs and plain executePayment calls book the whole transaction;
+# each item of an executeBatchPayment books its own log.
+WHOLE_TX_LOG_INDEX = -1
+
+SQLITE_TRANSACTIONS_SQL = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        agent_id TEXT NOT NULL,
+        recipient TEXT NOT NULL,
+        amount_usdc REAL NOT NULL,
+        tx_hash TEXT NOT NULL,
+        status TEXT NOT NULL,
+        block_reason TEXT,
+        timestamp INTEGER NOT NULL,
+        created_at TEXT NOT NULL,
+        block_number INTEGER NOT NULL DEFAULT 0,
+        gas_used INTEGER NOT NULL DEFAULT 0,
+        log_index INTEGER NOT NULL DEFAULT -1,
+        UNIQUE (tx_hash, log_index)
+    )
+"""
+
+# Every listing is ordered by (timestamp, id) DESC and paginated with a keyset
+# cursor on the same pair, so each filter gets a composite index ending in it.
+TRANSACTION_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_transactions_ts_id ON transactions (timestamp DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_agent_ts ON transactions (agent_id, timestamp DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_recipient_ts ON transactions (recipient, timestamp DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_status_ts ON transactions (status, timestamp DESC, id DESC)",
+]
+
+
+# Spend rollups are maintained by AFTER INSERT and AFTER UPDATE triggers, so they
+# commit in the same transaction as the ledger rows no matter which path wrote
+# them; a status change (pending -> success/reverted) moves the row between groups.
+ROLLUP_DAY_SECONDS = 86400
+
+SQLITE_ROLLUP_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS transaction_rollups (
+        day INTEGER NOT NULL,
+        agent_id TEXT NOT NULL,
+        recipient TEXT NOT NULL,
+        status TEXT NOT NULL,
+        tx_count INTEGER NOT NULL DEFAULT 0,
+        total_usdc REAL NOT NULL DEFAULT 0,
+        total_gas INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, agent_id, recipient, status)
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_transactions_rollup
+    AFTER INSERT ON transactions
+    BEGIN
+        INSERT INTO transaction_rollups (day, agent_id, recipient, status, tx_count, total_usdc, total_gas)
+        VALUES (NEW.timestamp / {ROLLUP_DAY_SECONDS}, NEW.agent_id, NEW.recipient, NEW.status, 1, NEW.amount_usdc, NEW.gas_used)
+        ON CONFLICT (day, agent_id, recipient, status) DO UPDATE SET
+            tx_count = tx_count + 1,
+            total_usdc = total_usdc + excluded.total_usdc,
+            total_gas = total_gas + excluded.total_gas;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_transactions_rollup_update
+    AFTER UPDATE OF agent_id, recipient, amount_usdc, status, timestamp, gas_used ON transactions
+    BEGIN
+        UPDATE transaction_rollups SET
+            tx_count = tx_count - 1,
+            total_usdc = total_usdc - OLD.amount_usdc,
+            total_gas = total_gas - OLD.gas_used
+        WHERE day = OLD.timestamp / {ROLLUP_DAY_SECONDS} AND agent_id = OLD.agent_id
+          AND recipient = OLD.recipient AND status = OLD.status;
+        DELETE FROM transaction_rollups
+        WHERE day = OLD.timestamp / {ROLLUP_DAY_SECONDS} AND agent_id = OLD.agent_id
+          AND recipient = OLD.recipient AND status = OLD.status AND tx_count <= 0;
+        INSERT INTO transaction_rollups (day, agent_id, recipient, status, tx_count, total_usdc, total_gas)
+        VALUES (NEW.timestamp / {ROLLUP_DAY_SECONDS}, NEW.agent_id, NEW.recipient, NEW.status, 1, NEW.amount_usdc, NEW.gas_used)
+        ON CONFLICT (day, agent_id, recipient, status) DO UPDATE SET
+            tx_count = tx_count + 1,
+            total_usdc = total_usdc + excluded.total_usdc,
+            total_gas = total_gas + excluded.total_gas;
+    END
+    """,
+]
+
+POSTGRES_ROLLUP_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS transaction_rollups (
+        day BIGINT NOT NULL,
+        agent_id TEXT NOT NULL,
+        recipient TEXT NOT NULL,
+        status TEXT NOT NULL,
+        tx_count BIGINT NOT NULL DEFAULT 0,
+        total_usdc DOUBLE PRECISION NOT NULL DEFAULT 0,
+        total_gas BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, agent_id, recipient, status)
+    )
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION transactions_rollup() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO transaction_rollups (day, agent_id, recipient, status, tx_count, total_usdc, total_gas)
+        SELECT timestamp / {ROLLUP_DAY_SECONDS}, agent_id, recipient, status,
+               COUNT(*), SUM(amount_usdc), SUM(gas_used)
+        FROM new_rows
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT (day, agent_id, recipient, status) DO UPDATE SET
+            tx_count = transaction_rollups.tx_count + EXCLUDED.tx_count,
+            total_usdc = transaction_rollups.total_usdc + EXCLUDED.total_usdc,
+            total_gas = transaction_rollups.total_gas + EXCLUDED.total_gas;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_transactions_rollup ON transactions",
+    """
+    CREATE TRIGGER trg_transactions_rollup
+    AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION transactions_rollup()
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION transactions_rollup_update() RETURNS trigger AS $$
+    BEGIN
+        WITH removed AS (
+            SELECT timestamp / {ROLLUP_DAY_SECONDS} AS day, agent_id, recipient, status,
+                   COUNT(*) AS tx_count, SUM(amount_usdc) AS total_usdc, SUM(gas_used) AS total_gas
+            FROM old_rows
+            GROUP BY 1, 2, 3, 4
+        )
+        UPDATE transaction_rollups r SET
+            tx_count = r.tx_count - removed.tx_count,
+            total_usdc = r.total_usdc - removed.total_usdc,
+            total_gas = r.total_gas - removed.total_gas
+        FROM removed
+        WHERE r.day = removed.day AND r.agent_id = removed.agent_id
+          AND r.recipient = removed.recipient AND r.status = removed.status;
+
+        DELETE FROM transaction_rollups r
+        USING (SELECT DISTINCT timestamp / {ROLLUP_DAY_SECONDS} AS day, agent_id, recipient, status FROM old_rows) o
+        WHERE r.day = o.day AND r.agent_id = o.agent_id AND r.recipient = o.recipient
+          AND r.status = o.status AND r.tx_count <= 0;
+
+        INSERT INTO transaction_rollups (day, agent_id, recipient, status, tx_count, total_usdc, total_gas)
+        SELECT timestamp / {ROLLUP_DAY_SECONDS}, agent_id, recipient, status,
+               COUNT(*), SUM(amount_usdc), SUM(gas_used)
+        FROM new_rows
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT (day, agent_id, recipient, status) DO UPDATE SET
+            tx_count = transaction_rollups.tx_count + EXCLUDED.tx_count,
+            total_usdc = transaction_rollups.total_usdc + EXCLUDED.total_usdc,
+            total_gas = transaction_rollups.total_gas + EXCLUDED.total_gas;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_transactions_rollup_update ON transactions",
+    """
+    CREATE TRIGGER trg_transactions_rollup_update
+    AFTER UPDATE ON transactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION transactions_rollup_update()
+    """,
+]
+
+# Populates rollups for ledgers that predate them; only runs while the rollup table is empty.
+ROLLUP_BACKFILL_SQL = f"""
+    INSERT INTO transaction_rollups (day, agent_id, recipient, status, tx_count, total_usdc, total_gas)
+    SELECT timestamp / {ROLLUP_DAY_SECONDS}, agent_id, recipient, status,
+           COUNT(*), SUM(amount_usdc), SUM(gas_used)
+    FROM transactions
+    WHERE NOT EXISTS (SELECT 1 FROM transaction_rollups)
+    GROUP BY 1, 2, 3, 4
+"""
+
+PG_INSERT_ONE_SQL = """
+    INSERT INTO transactions (
+        agent_id, recipient, amount_usdc, tx_hash, status, block_reason,
+        timestamp, created_at, block_number, gas_used, log_index
+    )
+    SELECT $1::text, $2::text, $3::float8, $4::text, $5::text, $6::text,
+           $7::bigint, $8::text, $9::bigint, $10::bigint, $11::int
+    WHERE NOT EXISTS (
+        SELECT 1 FROM transactions t WHERE t.tx_hash = $4::text AND ($11::int = -1 OR t.log_index = -1)
+    )
+    ON CONFLICT (tx_hash, log_index) DO NOTHING
+    RETURNING id
+"""
+
+PG_INSERT_BATCH_SQL = """
+    INSERT INTO transactions (
+        agent_id, recipient, amount_usdc, tx_hash, status, block_reason,
+        timestamp, created_at, block_number, gas_used, log_index
+    )
+    SELECT * FROM unnest(
+        $1::text[], $2::text[], $3::float8[], $4::text[], $5::text[],
+        $6::text[], $7::bigint[], $8::text[], $9::bigint[], $10::bigint[], $11::int[]
+    ) AS b(agent_id, recipient, amount_usdc, tx_hash, status, block_reason,
+           timestamp, created_at, block_number, gas_used, log_index)
+    WHERE NOT EXISTS (
+        SELECT 1 FROM transactions t WHERE t.tx_hash = b.tx_hash AND (b.log_index = -1 OR t.log_index = -1)
+    )
+    ON CONFLICT (tx_hash, log_index) DO NOTHING
+    RETURNING id, tx_hash, log_index
+"""
+
+PG_EXISTS_SQL = "SELECT 1 FROM transactions WHERE tx_hash = $1 LIMIT 1"
+
+# Partitioned ledgers claim the tx_hash in transaction_hashes first; only rows
+# whose hash was newly claimed are inserted, all in one statement.
+PG_PARTITIONED_INSERT_ONE_SQL = """
+    WITH claimed AS (
+        INSERT INTO transaction_hashes (tx_hash, log_index, timestamp)
+        SELECT $4::text, $11::int, $7::bigint
+        WHERE NOT EXISTS (
+            SELECT 1 FROM transaction_hashes h WHERE h.tx_hash = $4::text AND ($11::int = -1 OR h.log_index = -1)
+        )
+        ON CONFLICT (tx_hash, log_index) DO NOTHING
+        RETURNING tx_hash
+    )
+    INSERT INTO transactions (
+        agent_id, recipient, amount_usdc, tx_hash, status, block_reason,
+        timestamp, created_at, block_number, gas_used, log_index
+    )
+    SELECT $1::text, $2::text, $3::float8, $4::text, $5::text, $6::text,
+           $7::bigint, $8::text, $9::bigint, $10::bigint, $11::int
+    FROM claimed
+    RETURNING id
+"""
+
+PG_PARTITIONED_INSERT_BATCH_SQL = """
+    WITH batch AS (
+        SELECT * FROM unnest(
+            $1::text[], $2::text[], $3::float8[], $4::text[], $5::text[],
+            $6::text[], $7::bigint[], $8::text[], $9::bigint[], $10::bigint[], $11::int[]
+        ) AS b(agent_id, recipient, amount_usdc, tx_hash, status, block_reason,
+               timestamp, created_at, block_number, gas_used, log_index)
+    ), claimed AS (
+        INSERT INTO transaction_hashes (tx_hash, log_index, timestamp)
+        SELECT tx_hash, log_index, timestamp FROM batch b
+        WHERE NOT EXISTS (
+            SELECT 1 FROM transaction_hashes h WHERE h.tx_hash = b.tx_hash AND (b.log_index = -1 OR h.log_index = -1)
+        )
+        ON CONFLICT (tx_hash, log_index) DO NOTHING
+        RETURNING tx_hash, log_index
+    )
+    INSERT INTO transactions (
+        agent_id, recipient, amount_usdc, tx_hash, status, block_reason,
+        timestamp, created_at, block_number, gas_used, log_index
+    )
+    SELECT b.agent_id, b.recipient, b.amount_usdc, b.tx_hash, b.status, b.block_reason,
+           b.timestamp, b.created_at, b.block_number, b.gas_used, b.log_index
+    FROM batch b
+    JOIN claimed c ON c.tx_hash = b.tx_hash AND c.log_index = b.log_index
+    RETURNING id, tx_hash, log_index
+"""
+
+PG_PARTITIONED_EXISTS_SQL = "SELECT 1 FROM transaction_hashes WHERE tx_hash = $1 LIMIT 1"
+
+# A hash is booked either whole, as one payment proof (log_index -1), or as the
+# logs of a batch, never both; the inserts above skip a row that would mix them.
+# The NOT EXISTS checks only hold against concurrent writers under these
+# per-hash locks, taken in one order for the whole batch.
+PG_LOCK_HASHES_SQL = """
+    SELECT pg_advisory_xact_lock(k)
+    FROM (SELECT DISTINCT hashtext(h) AS k FROM unnest($1::text[]) AS h ORDER BY k) AS locks
+"""
+
+# A batch item is already booked if its own log is, or if its transaction was
+# presented whole as a payment proof.
+PG_LOG_BOOKED_SQL = "SELECT 1 FROM transactions WHERE tx_hash = $1 AND log_index IN ($2, -1) LIMIT 1"
+PG_PARTITIONED_LOG_BOOKED_SQL = "SELECT 1 FROM transaction_hashes WHERE tx_hash = $1 AND log_index IN ($2, -1) LIMIT 1"
+
+LEDGER_HOT_WINDOW_DAYS = int(os.getenv("LEDGER_HOT_WINDOW_DAYS", "31"))
+
+ROLLUP_GROUPS = {"day", "agent_id", "recipient", "status"}
+
+# Local copy of the vault's PaymentExecuted logs, written by chain.indexer.
+# amount is the raw uint256 as a decimal string.
+PAYMENT_EVENT_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS payment_events (
+        tx_hash TEXT NOT NULL,
+        log_index INTEGER NOT NULL,
+        agent_id TEXT NOT NULL,
+        recipient TEXT NOT NULL,
+        amount TEXT NOT NULL,
+        block_number BIGINT NOT NULL,
+        block_hash TEXT NOT NULL,
+        tx_to TEXT,
+        gas_used BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (tx_hash, log_index)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_payment_events_block ON payment_events (block_number)",
+    """
+    CREATE TABLE IF NOT EXISTS indexer_checkpoints (
+        name TEXT PRIMARY KEY,
+        block_number BIGINT NOT NULL,
+        block_hash TEXT NOT NULL
+    )
+    """,
+]
+
+PAYMENT_EVENT_COLUMNS = "tx_hash, log_index, agent_id, recipient, amount, block_number, block_hash, tx_to, gas_used"
+
+# Best voucher per payment channel, saved by chain.channels so a restart can still redeem it.
+# Amounts are token units as decimal strings.
+PAYMENT_CHANNEL_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS payment_channels (
+        agent_id TEXT NOT NULL,
+        recipient TEXT NOT NULL,
+        accepted TEXT NOT NULL,
+        latest TEXT NOT NULL,
+        signature TEXT,
+        updated_at BIGINT NOT NULL,
+        PRIMARY KEY (agent_id, recipient)
+    )
+"""
+
+PAYMENT_CHANNEL_COLUMNS = "agent_id, recipient, accepted, latest, signature, updated_at"
+
+# Saves only ever move a channel forward: concurrent calls may save their rows out of order.
+PAYMENT_CHANNEL_UPSERT_SQL = f"""
+    INSERT INTO payment_channels ({PAYMENT_CHANNEL_COLUMNS}) VALUES ({{}})
+    ON CONFLICT (agent_id, recipient) DO UPDATE SET
+        accepted = CASE WHEN CAST(excluded.accepted AS NUMERIC) > CAST(payment_channels.accepted AS NUMERIC)
+            THEN excluded.accepted ELSE payment_channels.accepted END,
+        latest = CASE WHEN CAST(excluded.latest AS NUMERIC) > CAST(payment_channels.latest AS NUMERIC)
+            THEN excluded.latest ELSE payment_channels.latest END,
+        signature = CASE WHEN CAST(excluded.latest AS NUMERIC) > CAST(payment_channels.latest AS NUMERIC)
+            THEN excluded.signature ELSE payment_channels.signature END,
+        updated_at = excluded.updated_at
+"""
+SQLITE_PAYMENT_CHANNEL_UPSERT_SQL = PAYMENT_CHANNEL_UPSERT_SQL.format("?, ?, ?, ?, ?, ?")
+PG_PAYMENT_CHANNEL_UPSERT_SQL = PAYMENT_CHANNEL_UPSERT_SQL.format("$1, $2, $3, $4, $5, $6")
+
+
+def _payment_channel_values(rows: list[dict]) -> list[tuple]:
+    return [tuple(row[c.strip()] for c in PAYMENT_CHANNEL_COLUMNS.split(",")) for row in rows]
+
+
+def _inserted_channels(payloads: list[dict], inserted: dict) -> list[dict]:
+    return [p["channel"] for p in payloads if p.get("channel") and (p["tx_hash"], p["log_index"]) in inserted]
+
+
 class Database:
     def __init__(self, database_url: str):
         self.database_url = database_url
         self.backend = "postgres" if database_url.startswith(("postgres://", "postgresql://", "postgresql+asyncpg://")) else "sqlite"
         self.sqlite_path = "db/transactions.db"
+        self.sqlite = SQLiteEngine(self.sqlite_path)
+        self.pg = None
         self.pg_pool = None
+        self.partitioned = False
+        self.archive = LedgerArchive()
+
+    async def close(self):
+        if self.backend == "sqlite":
+            await asyncio.to_thread(self.sqlite.close)
+            return
+
+        if self.pg is not None:
+            await self.pg.close()
 
     async def init(self):
         if self.backend == "sqlite":
             os.makedirs("db", exist_ok=True)
-            await asyncio.to_thread(self._sqlite_init)
+            await asyncio.to_thread(self.sqlite.start, self._sqlite_init)
             return
 
         try:
-            import asyncpg
+            from storage.postgres import LedgerPool
         except ImportError:
             raise RuntimeError(
                 "DATABASE_URL points to Postgres but asyncpg is not installed. "
@@ -74,8 +497,24 @@ class Database:
         elif pg_url.startswith("postgres://"):
             pg_url = pg_url.replace("postgres://", "postgresql://", 1)
 
-        self.pg_pool = await asyncpg.create_pool(pg_url)
-        async with self.pg_pool.acquire() as conn:
+        self.pg = LedgerPool(pg_url)
+        self.pg_pool = await self.pg.open()
+        async with self.pg.acquire() as conn:
+            kind = await table_kind(conn, "transactions")
+            if kind is not None:
+                await pg_add_log_index(conn, kind)
+            if kind is None and PG_PARTITIONING:
+                await create_partitioned_ledger(conn)
+            elif kind == "r" and PG_PARTITIONING and PG_PARTITION_EXISTING:
+                print("[db] converting transactions to a monthly partitioned table")
+                await convert_to_partitioned(conn)
+            elif kind == "r" and PG_PARTITIONING:
+                print("[db] transactions is not partitioned; set PG_PARTITION_EXISTING=true to convert it")
+
+            self.partitioned = await table_kind(conn, "transactions") == "p"
+            if self.partitioned:
+                await ensure_partitions(conn)
+
             await conn.execute(
                 """
                 CREATE TABLE IF NOT EXISTS transactions (
@@ -83,80 +522,98 @@ class Database:
                     agent_id TEXT NOT NULL,
                     recipient TEXT NOT NULL,
                     amount_usdc DOUBLE PRECISION NOT NULL,
-                    tx_hash TEXT NOT NULL UNIQUE,
+                    tx_hash TEXT NOT NULL,
                     status TEXT NOT NULL,
                     block_reason TEXT,
                     timestamp BIGINT NOT NULL,
                     created_at TEXT NOT NULL,
                     block_number BIGINT NOT NULL DEFAULT 0,
-                    gas_used BIGINT NOT NULL DEFAULT 0
+                    gas_used BIGINT NOT NULL DEFAULT 0,
+                    log_index INTEGER NOT NULL DEFAULT -1,
+                    CONSTRAINT transactions_tx_hash_log_index_key UNIQUE (tx_hash, log_index)
                 )
                 """
             )
-
-    def _sqlite_init(self):
-        conn = sqlite3.connect(self.sqlite_path)
-        cur = conn.cursor()
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS transactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                agent_id TEXT NOT NULL,
-                recipient TEXT NOT NULL,
-                amount_usdc REAL NOT NULL,
-                tx_hash TEXT NOT NULL UNIQUE,
-                status TEXT NOT NULL,
-                block_reason TEXT,
-                timestamp INTEGER NOT NULL,
-                created_at TEXT NOT NULL,
-                block_number INTEGER NOT NULL DEFAULT 0,
-                gas_used INTEGER NOT NULL DEFAULT 0
+            for statement in TRANSACTION_INDEXES:
+                await conn.execute(statement)
+            async with conn.transaction():
+                await conn.execute("LOCK TABLE transactions IN SHARE ROW EXCLUSIVE MODE")
+                for statement in POSTGRES_ROLLUP_SCHEMA:
+                    await conn.execute(statement)
+                await conn.execute(ROLLUP_BACKFILL_SQL)
+            for statement in PAYMENT_EVENT_SCHEMA:
+                await conn.execute(statement)
+            await conn.execute(PAYMENT_CHANNEL_SCHEMA)
+
+    def _sqlite_init(self, conn: sqlite3.Connection):
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(transactions)").fetchall()]
+        conn.execute(SQLITE_TRANSACTIONS_SQL.format(name="transactions"))
+        if columns and "log_index" not in columns:
+            # SQLite cannot swap a UNIQUE constraint in place; rebuild the table.
+            # Batch rows were stored as "<tx hash>:<log index>" before the column existed.
+            print("[db] adding log_index to transactions")
+            conn.execute(SQLITE_TRANSACTIONS_SQL.format(name="transactions_rebuilt"))
+            conn.execute(
+                """
+                INSERT INTO transactions_rebuilt
+                SELECT id, agent_id, recipient, amount_usdc,
+                       CASE WHEN instr(tx_hash, ':') > 0 AND tx_hash LIKE '0x%'
+                            THEN substr(tx_hash, 1, instr(tx_hash, ':') - 1) ELSE tx_hash END,
+                       status, block_reason, timestamp, created_at, block_number, gas_used,
+                       CASE WHEN instr(tx_hash, ':') > 0 AND tx_hash LIKE '0x%'
+                            THEN CAST(substr(tx_hash, instr(tx_hash, ':') + 1) AS INTEGER) ELSE -1 END
+                FROM transactions
+                """
             )
-            """
-        )
-        conn.commit()
-        conn.close()
+            conn.execute("DROP TABLE transactions")
+            conn.execute("ALTER TABLE transactions_rebuilt RENAME TO transactions")
+        for statement in TRANSACTION_INDEXES:
+            conn.execute(statement)
+        for statement in SQLITE_ROLLUP_SCHEMA:
+            conn.execute(statement)
+        conn.execute(ROLLUP_BACKFILL_SQL)
+        # Hashes of archived rows, so archived proofs still count as consumed.
+        conn.execute("CREATE TABLE IF NOT EXISTS archived_tx_hashes (tx_hash TEXT PRIMARY KEY)")
+        for statement in PAYMENT_EVENT_SCHEMA:
+            conn.execute(statement)
+        conn.execute(PAYMENT_CHANNEL_SCHEMA)
 
     async def insert_transaction(self, payload: dict) -> int:
         if self.backend == "sqlite":
-            return await asyncio.to_thread(self._sqlite_insert, payload)
+            return await self.sqlite.write(lambda conn: self._sqlite_insert(conn, payload))
 
-        async with self.pg_pool.acquire() as conn:
-            row = await conn.fetchrow(
-                """
-                INSERT INTO transactions (
-                    agent_id, recipient, amount_usdc, tx_hash, status, block_reason,
-                    timestamp, created_at, block_number, gas_used
-                ) VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9,$10)
-                ON CONFLICT (tx_hash) DO NOTHING
-                RETURNING id
-                """,
-                payload["agent_id"],
-                payload["recipient"],
-                payload["amount_usdc"],
-                payload["tx_hash"],
-                payload["status"],
-                payload["block_reason"],
-                payload["timestamp"],
-                payload["created_at"],
-                payload["block_number"],
-                payload["gas_used"],
-            )
+        async with self.pg.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(PG_LOCK_HASHES_SQL, [payload["tx_hash"]])
+                row = await conn.fetchrow(
+                    PG_PARTITIONED_INSERT_ONE_SQL if self.partitioned else PG_INSERT_ONE_SQL,
+                    payload["agent_id"],
+                    payload["recipient"],
+                    payload["amount_usdc"],
+                    payload["tx_hash"],
+                    payload["status"],
+                    payload["block_reason"],
+                    payload["timestamp"],
+                    payload["created_at"],
+                    payload["block_number"],
+                    payload["gas_used"],
+                    payload["log_index"],
+                )
 
             if not row:
                 raise HTTPException(status_code=409, detail={"error": "Duplicate transaction hash"})
             return int(row["id"])
 
-    def _sqlite_insert(self, payload: dict) -> int:
-        conn = sqlite3.connect(self.sqlite_path)
-        cur = conn.cursor()
+    def _sqlite_insert(self, conn: sqlite3.Connection, payload: dict) -> int:
+        if self._sqlite_claimed(conn, payload):
+            raise HTTPException(status_code=409, detail={"error": "Duplicate transaction hash"})
         try:
-            cur.execute(
+            cur = conn.execute(
                 """
                 INSERT INTO transactions (
                     agent_id, recipient, amount_usdc, tx_hash, status, block_reason,
-                    timestamp, created_at, block_number, gas_used
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    timestamp, created_at, block_number, gas_used, log_index
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """,
                 (
                     payload["agent_id"],
@@ -169,68 +626,593 @@ class Database:
                     payload["created_at"],
                     payload["block_number"],
                     payload["gas_used"],
+                    payload["log_index"],
                 ),
             )
-            conn.commit()
             return int(cur.lastrowid)
         except sqlite3.IntegrityError:
             raise HTTPException(status_code=409, detail={"error": "Duplicate transaction hash"})
+
+    async def insert_transactions(self, payloads: list[dict]) -> list[int | None]:
+        # One transaction per batch. Returns the new id for each payload, or
+        # None where its (tx_hash, log_index) already existed (or repeats within the batch).
+        # A payload's "channel" row, if any, is saved in the same transaction once its row is in.
+        unique = {}
+        # Within the batch too, a hash is booked whole or by its logs, whichever came first.
+        whole = {}
+        for payload in payloads:
+            is_whole = payload["log_index"] == WHOLE_TX_LOG_INDEX
+            if whole.setdefault(payload["tx_hash"], is_whole) != is_whole:
+                continue
+            unique.setdefault((payload["tx_hash"], payload["log_index"]), payload)
+
+        if self.backend == "sqlite":
+            inserted = await self.sqlite.write(lambda conn: self._sqlite_insert_many(conn, list(unique.values())))
+        else:
+            rows = list(unique.values())
+            async with self.pg.acquire() as conn:
+                async with conn.transaction():
+                    await conn.execute(PG_LOCK_HASHES_SQL, [row["tx_hash"] for row in rows])
+                    records = await conn.fetch(
+                        PG_PARTITIONED_INSERT_BATCH_SQL if self.partitioned else PG_INSERT_BATCH_SQL,
+                        *[[row[column] for row in rows] for column in LEDGER_COLUMNS],
+                    )
+                    inserted = {(r["tx_hash"], r["log_index"]): int(r["id"]) for r in records}
+                    channels = _inserted_channels(rows, inserted)
+                    if channels:
+                        await conn.executemany(PG_PAYMENT_CHANNEL_UPSERT_SQL, _payment_channel_values(channels))
+
+        results = []
+        for payload in payloads:
+            key = (payload["tx_hash"], payload["log_index"])
+            if unique.get(key) is payload:
+                results.append(inserted.get(key))
+            else:
+                results.append(None)
+        return results
+
+    def _sqlite_insert_many(self, conn: sqlite3.Connection, payloads: list[dict]) -> dict:
+        # The writer thread is the only writer, so every id above the current
+        # maximum after the insert belongs to this batch.
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM transactions").fetchone()[0]
+        payloads = [payload for payload in payloads if not self._sqlite_claimed(conn, payload)]
+        conn.executemany(
+            """
+            INSERT OR IGNORE INTO transactions (
+                agent_id, recipient, amount_usdc, tx_hash, status, block_reason,
+                timestamp, created_at, block_number, gas_used, log_index
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [tuple(payload[column] for column in LEDGER_COLUMNS) for payload in payloads],
+        )
+        cur = conn.execute("SELECT id, tx_hash, log_index FROM transactions WHERE id > ?", (max_id,))
+        inserted = {(tx_hash, log_index): int(row_id) for row_id, tx_hash, log_index in cur.fetchall()}
+        channels = _inserted_channels(payloads, inserted)
+        if channels:
+            conn.executemany(SQLITE_PAYMENT_CHANNEL_UPSERT_SQL, _payment_channel_values(channels))
+        return inserted
+
+    def _transaction_where(
+        self,
+        filters: dict,
+        cursor: tuple[int, int] | None,
+        descending: bool = True,
+    ) -> tuple[str, list]:
+        clauses = []
+        params = []
+        for column in ("agent_id", "recipient", "status"):
+            if filters.get(column) is not None:
+                clauses.append(f"{column} = {{}}")
+                params.append(filters[column])
+        if filters.get("since") is not None:
+            clauses.append("timestamp >= {}")
+            params.append(int(filters["since"]))
+        if filters.get("until") is not None:
+            clauses.append("timestamp < {}")
+            params.append(int(filters["until"]))
+        if cursor is not None:
+            clauses.append(f"(timestamp, id) {'<' if descending else '>'} ({{}}, {{}})")
+            params.extend(cursor)
+
+        if not clauses:
+            return "", params
+
+        where = " WHERE " + " AND ".join(clauses)
+        if self.backend == "sqlite":
+            placeholders = ["?"] * len(params)
+        else:
+            placeholders = [f"${i}" for i in range(1, len(params) + 1)]
+        return where.format(*placeholders), params
+
+    async def fetch_transactions(
+        self,
+        limit: int = 50,
+        cursor: tuple[int, int] | None = None,
+        **filters,
+    ):
+        if filters.get("since") is not None or LEDGER_HOT_WINDOW_DAYS <= 0:
+            return await self._fetch_transactions(limit, cursor, filters)
+
+        # Try the recent window first so the planner only touches the newest
+        # partitions; widen to the full table only when it cannot fill the page.
+        hot_since = int(time.time()) - LEDGER_HOT_WINDOW_DAYS * 86400
+        until = filters.get("until")
+        if until is not None and until <= hot_since:
+            return await self._fetch_transactions(limit, cursor, filters)
+
+        rows = await self._fetch_transactions(limit, cursor, {**filters, "since": hot_since})
+        if len(rows) >= limit:
+            return rows
+        if rows:
+            cursor = (rows[-1]["timestamp"], rows[-1]["id"])
+        return rows + await self._fetch_transactions(limit - len(rows), cursor, {**filters, "until": hot_since})
+
+    async def _fetch_transactions(self, limit: int, cursor: tuple[int, int] | None, filters: dict):
+        where, params = self._transaction_where(filters, cursor)
+        params.append(int(limit))
+        limit_placeholder = "?" if self.backend == "sqlite" else f"${len(params)}"
+        query = f"""
+            SELECT {TRANSACTION_COLUMNS}
+            FROM transactions{where}
+            ORDER BY timestamp DESC, id DESC
+            LIMIT {limit_placeholder}
+        """
+
+        if self.backend == "sqlite":
+            return await self.sqlite.read(lambda conn: self._sqlite_fetch(conn, query, params))
+
+        # The query text depends only on which filters are set, so each of the
+        # handful of variants stays prepared in the per-connection statement cache.
+        async with self.pg.acquire() as conn:
+            rows = await conn.fetch(query, *params)
+            return [dict(row) for row in rows]
+
+    def _sqlite_fetch(self, conn: sqlite3.Connection, query: str, params: list):
+        cur = conn.execute(query, params)
+        return [dict(r) for r in cur.fetchall()]
+
+    async def stream_transactions(
+        self,
+        cursor: tuple[int, int] | None = None,
+        chunk_size: int = 1000,
+        **filters,
+    ):
+        # Archived months are older than anything live, so they stream first.
+        async for chunk in self.archive.stream(cursor=cursor, chunk_size=chunk_size, **filters):
+            yield chunk
+
+        # Oldest first, so a resumed export only ever picks up rows after the cursor.
+        where, params = self._transaction_where(filters, cursor, descending=False)
+        query = f"""
+            SELECT {TRANSACTION_COLUMNS}
+            FROM transactions{where}
+            ORDER BY timestamp ASC, id ASC
+        """
+
+        if self.backend == "sqlite":
+            # A dedicated connection keeps long exports from starving the read pool.
+            conn = await asyncio.to_thread(self.sqlite.open_reader)
+            try:
+                cur = await asyncio.to_thread(conn.execute, query, params)
+                while True:
+                    rows = await asyncio.to_thread(cur.fetchmany, chunk_size)
+                    if not rows:
+                        break
+                    yield [dict(r) for r in rows]
+            finally:
+                conn.close()
+            return
+
+        async with self.pg.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                chunk = []
+                async for row in conn.cursor(query, *params, prefetch=chunk_size):
+                    chunk.append(dict(row))
+                    if len(chunk) >= chunk_size:
+                        yield chunk
+                        chunk = []
+                if chunk:
+                    yield chunk
+
+    async def fetch_rollups(
+        self,
+        group_by: list[str],
+        since_day: int | None = None,
+        until_day: int | None = None,
+        **filters,
+    ) -> list[dict]:
+        clauses = []
+        params = []
+        for column in ("agent_id", "recipient", "status"):
+            if filters.get(column) is not None:
+                clauses.append(f"{column} = {{}}")
+                params.append(filters[column])
+        # Rollups are per UTC day (days since the epoch); until_day is exclusive, like /transactions' until.
+        if since_day is not None:
+            clauses.append("day >= {}")
+            params.append(int(since_day))
+        if until_day is not None:
+            clauses.append("day < {}")
+            params.append(int(until_day))
+
+        where = ""
+        if clauses:
+            where = " WHERE " + " AND ".join(clauses)
+            if self.backend == "sqlite":
+                where = where.format(*["?"] * len(params))
+            else:
+                where = where.format(*[f"${i}" for i in range(1, len(params) + 1)])
+
+        columns = [column for column in group_by if column in ROLLUP_GROUPS]
+        select = "".join(f"{column}, " for column in columns)
+        group = f" GROUP BY {', '.join(columns)} ORDER BY {', '.join(columns)}" if columns else ""
+        query = f"""
+            SELECT {select}SUM(tx_count) AS tx_count, SUM(total_usdc) AS total_usdc, SUM(total_gas) AS total_gas
+            FROM transaction_rollups{where}{group}
+        """
+
+        if self.backend == "sqlite":
+            rows = await self.sqlite.read(lambda conn: self._sqlite_fetch(conn, query, params))
+        else:
+            async with self.pg.acquire() as conn:
+                rows = [dict(row) for row in await conn.fetch(query, *params)]
+
+        for row in rows:
+            row["tx_count"] = int(row["tx_count"] or 0)
+            row["total_usdc"] = float(row["total_usdc"] or 0)
+            row["total_gas"] = int(row["total_gas"] or 0)
+        return rows
+
+    async def count_transactions(self) -> int:
+        totals = await self.fetch_rollups(group_by=[])
+        return totals[0]["tx_count"] if totals else 0
+
+    async def maintain_partitions(self) -> list[str]:
+        if self.backend != "postgres" or not self.partitioned:
+            return []
+        async with self.pg.acquire() as conn:
+            return await ensure_partitions(conn)
+
+    async def archive_before(self, cutoff: int) -> list[dict]:
+        # Archives whole UTC months that end at or before the cutoff.
+        if self.backend == "sqlite":
+            return await self._sqlite_archive_before(cutoff)
+        if not self.partitioned:
+            return []
+
+        archived = []
+        async with self.pg.acquire() as conn:
+            split = await split_default_partition(conn, cutoff)
+            if split:
+                print(f"[db] moved {split} out of transactions_default")
+            partitions = await list_month_partitions(conn)
+        for name, start, end in partitions:
+            if end > cutoff:
+                continue
+            writer = self.archive.open_writer(month_key(start))
+            try:
+                async with self.pg.acquire() as conn:
+                    async with conn.transaction():
+                        # Blocks late inserts into the month while it is copied out.
+                        await conn.execute(f"LOCK TABLE {name} IN EXCLUSIVE MODE")
+                        chunk = []
+                        async for row in conn.cursor(
+                            f"SELECT {TRANSACTION_COLUMNS} FROM {name} ORDER BY timestamp, id", prefetch=5000
+                        ):
+                            chunk.append(dict(row))
+                            if len(chunk) >= 5000:
+                                await asyncio.to_thread(writer.write_rows, chunk)
+                                chunk = []
+                        await asyncio.to_thread(writer.write_rows, chunk)
+                        await asyncio.to_thread(writer.commit)
+                        await conn.execute(f"ALTER TABLE transactions DETACH PARTITION {name}")
+                        await conn.execute(f"DROP TABLE {name}")
+            except BaseException:
+                await asyncio.to_thread(writer.abort)
+                raise
+            archived.append({"partition": name, "rows": writer.rows, "path": writer.path})
+        return archived
+
+    async def _sqlite_archive_before(self, cutoff: int) -> list[dict]:
+        oldest = await self.sqlite.read(lambda conn: conn.execute("SELECT MIN(timestamp) FROM transactions").fetchone()[0])
+        if oldest is None:
+            return []
+
+        archived = []
+        start = month_start(oldest)
+        while next_month_start(start) <= cutoff:
+            end = next_month_start(start)
+            writer = self.archive.open_writer(month_key(start))
+            max_id = 0
+            try:
+                async for chunk in self._sqlite_stream_range(start, end):
+                    max_id = max(max_id, chunk[-1]["id"])
+                    await asyncio.to_thread(writer.write_rows, chunk)
+                if not writer.rows:
+                    await asyncio.to_thread(writer.abort)
+                    start = end
+                    continue
+                await asyncio.to_thread(writer.commit)
+            except BaseException:
+                await asyncio.to_thread(writer.abort)
+                raise
+
+            # Ids only grow, so rows committed after the copy started are left
+            # for the next run instead of being deleted unarchived.
+            def _delete_archived(conn: sqlite3.Connection):
+                params = (start, end, max_id)
+                conn.execute(
+                    """
+                    INSERT OR IGNORE INTO archived_tx_hashes (tx_hash)
+                    SELECT tx_hash FROM transactions WHERE timestamp >= ? AND timestamp < ? AND id <= ?
+                    """,
+                    params,
+                )
+                conn.execute("DELETE FROM transactions WHERE timestamp >= ? AND timestamp < ? AND id <= ?", params)
+
+            await self.sqlite.write(_delete_archived)
+            archived.append({"month": month_key(start), "rows": writer.rows, "path": writer.path})
+            start = end
+        return archived
+
+    async def _sqlite_stream_range(self, start: int, end: int, chunk_size: int = 5000):
+        conn = await asyncio.to_thread(self.sqlite.open_reader)
+        try:
+            cur = await asyncio.to_thread(
+                conn.execute,
+                f"""
+                SELECT {TRANSACTION_COLUMNS} FROM transactions
+                WHERE timestamp >= ? AND timestamp < ?
+                ORDER BY timestamp, id
+                """,
+                (start, end),
+            )
+            while True:
+                rows = await asyncio.to_thread(cur.fetchmany, chunk_size)
+                if not rows:
+                    break
+                yield [dict(r) for r in rows]
         finally:
             conn.close()
 
-    async def fetch_transactions(self, limit: int = 50):
+    async def storage_stats(self) -> dict:
+        partitions = []
+        if self.backend == "postgres" and self.partitioned:
+            async with self.pg.acquire() as conn:
+                partitions = [name for name, _, _ in await list_month_partitions(conn)]
+        return {
+            "backend": self.backend,
+            "partitioned": self.partitioned,
+            "partitions": partitions,
+            "hot_window_days": LEDGER_HOT_WINDOW_DAYS,
+            "archive": self.archive.stats(),
+        }
+
+    async def get_indexer_checkpoint(self, name: str) -> tuple[int, str] | None:
         if self.backend == "sqlite":
-            return await asyncio.to_thread(self._sqlite_fetch, limit)
+            row = await self.sqlite.read(
+                lambda conn: conn.execute(
+                    "SELECT block_number, block_hash FROM indexer_checkpoints WHERE name = ?", (name,)
+                ).fetchone()
+            )
+        else:
+            async with self.pg.acquire() as conn:
+                row = await conn.fetchrow(
+                    "SELECT block_number, block_hash FROM indexer_checkpoints WHERE name = $1", name
+                )
+        return (int(row["block_number"]), row["block_hash"]) if row else None
 
-        async with self.pg_pool.acquire() as conn:
-            rows = await conn.fetch(
-                """
-                SELECT id, agent_id, recipient, amount_usdc, tx_hash, status, block_reason,
-                       timestamp, created_at, block_number, gas_used
-                FROM transactions
-                ORDER BY timestamp DESC
-                LIMIT $1
-                """,
-                limit,
+    async def save_payment_events(self, name: str, rows: list[dict], block_number: int, block_hash: str):
+        # Events and the checkpoint that covers them commit together.
+        values = [tuple(row[c.strip()] for c in PAYMENT_EVENT_COLUMNS.split(",")) for row in rows]
+        if self.backend == "sqlite":
+
+            def _save(conn: sqlite3.Connection):
+                conn.executemany(
+                    f"INSERT OR IGNORE INTO payment_events ({PAYMENT_EVENT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    values,
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO indexer_checkpoints (name, block_number, block_hash) VALUES (?, ?, ?)",
+                    (name, block_number, block_hash),
+                )
+
+            await self.sqlite.write(_save)
+            return
+
+        async with self.pg.acquire() as conn:
+            async with conn.transaction():
+                if values:
+                    await conn.executemany(
+                        f"""
+                        INSERT INTO payment_events ({PAYMENT_EVENT_COLUMNS})
+                        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+                        ON CONFLICT DO NOTHING
+                        """,
+                        values,
+                    )
+                await conn.execute(
+                    """
+                    INSERT INTO indexer_checkpoints (name, block_number, block_hash) VALUES ($1, $2, $3)
+                    ON CONFLICT (name) DO UPDATE SET block_number = EXCLUDED.block_number, block_hash = EXCLUDED.block_hash
+                    """,
+                    name,
+                    block_number,
+                    block_hash,
+                )
+
+    async def rollback_payment_events(self, name: str, block_number: int, block_hash: str):
+        if self.backend == "sqlite":
+
+            def _rollback(conn: sqlite3.Connection):
+                conn.execute("DELETE FROM payment_events WHERE block_number > ?", (block_number,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO indexer_checkpoints (name, block_number, block_hash) VALUES (?, ?, ?)",
+                    (name, block_number, block_hash),
+                )
+
+            await self.sqlite.write(_rollback)
+            return
+
+        async with self.pg.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("DELETE FROM payment_events WHERE block_number > $1", block_number)
+                await conn.execute(
+                    """
+                    INSERT INTO indexer_checkpoints (name, block_number, block_hash) VALUES ($1, $2, $3)
+                    ON CONFLICT (name) DO UPDATE SET block_number = EXCLUDED.block_number, block_hash = EXCLUDED.block_hash
+                    """,
+                    name,
+                    block_number,
+                    block_hash,
+                )
+
+    async def fetch_payment_events(self, tx_hash: str) -> list[dict]:
+        query = f"SELECT {PAYMENT_EVENT_COLUMNS} FROM payment_events WHERE tx_hash = {{}} ORDER BY log_index"
+        if self.backend == "sqlite":
+            return await self.sqlite.read(
+                lambda conn: [dict(r) for r in conn.execute(query.format("?"), (tx_hash,)).fetchall()]
             )
-            return [dict(row) for row in rows]
+        async with self.pg.acquire() as conn:
+            return [dict(r) for r in await conn.fetch(query.format("$1"), tx_hash)]
 
-    def _sqlite_fetch(self, limit: int):
-        conn = sqlite3.connect(self.sqlite_path)
-        conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT id, agent_id, recipient, amount_usdc, tx_hash, status, block_reason,
-                   timestamp, created_at, block_number, gas_used
+    async def fetch_payment_channels(self) -> list[dict]:
+        query = f"SELECT {PAYMENT_CHANNEL_COLUMNS} FROM payment_channels"
+        if self.backend == "sqlite":
+            return await self.sqlite.read(lambda conn: [dict(r) for r in conn.execute(query).fetchall()])
+        async with self.pg.acquire() as conn:
+            return [dict(r) for r in await conn.fetch(query)]
+
+    async def save_payment_channels(self, rows: list[dict]):
+        values = _payment_channel_values(rows)
+        if self.backend == "sqlite":
+            await self.sqlite.write(lambda conn: conn.executemany(SQLITE_PAYMENT_CHANNEL_UPSERT_SQL, values))
+            return
+        async with self.pg.acquire() as conn:
+            await conn.executemany(PG_PAYMENT_CHANNEL_UPSERT_SQL, values)
+
+    async def fetch_pending_transactions(self, limit: int) -> list[dict]:
+        query = f"""
+            SELECT {TRANSACTION_COLUMNS}
             FROM transactions
-            ORDER BY timestamp DESC
-            LIMIT ?
-            """,
-            (limit,),
-        )
-        rows = [dict(r) for r in cur.fetchall()]
-        conn.close()
-        return rows
+            WHERE status = 'pending'
+            ORDER BY timestamp, id
+            LIMIT {{}}
+        """
+        if self.backend == "sqlite":
+            return await self.sqlite.read(lambda conn: self._sqlite_fetch(conn, query.format("?"), [limit]))
+        async with self.pg.acquire() as conn:
+            return [dict(r) for r in await conn.fetch(query.format("$1"), limit)]
+
+    async def update_transaction_status(
+        self,
+        tx_hash: str,
+        timestamp: int,
+        *,
+        status: str,
+        block_reason: str | None,
+        block_number: int,
+        gas_used: int,
+    ) -> bool:
+        """Move a pending row to its final status. False if it was not pending (already resolved)."""
+        # The timestamp lets Postgres prune to the row's monthly partition.
+        query = """
+            UPDATE transactions
+            SET status = {0}, block_reason = {1}, block_number = {2}, gas_used = {3}
+            WHERE tx_hash = {4} AND timestamp = {5} AND status = 'pending'
+        """
+        params = (status, block_reason, block_number, gas_used, tx_hash, timestamp)
+        if self.backend == "sqlite":
+            return await self.sqlite.write(
+                lambda conn: conn.execute(query.format(*["?"] * 6), params).rowcount > 0
+            )
+        async with self.pg.acquire() as conn:
+            result = await conn.execute(query.format(*[f"${i}" for i in range(1, 7)]), *params)
+            return result != "UPDATE 0"
+
+    def pool_stats(self) -> dict:
+        if self.backend == "sqlite":
+            return {"backend": "sqlite", **self.sqlite.stats()}
+        return self.pg.stats()
 
     async def tx_hash_exists(self, tx_hash: str) -> bool:
         if self.backend == "sqlite":
-            return await asyncio.to_thread(self._sqlite_exists, tx_hash)
+            return await self.sqlite.read(lambda conn: self._sqlite_exists(conn, tx_hash))
 
-        async with self.pg_pool.acquire() as conn:
+        async with self.pg.acquire() as conn:
+            row = await conn.fetchrow(PG_PARTITIONED_EXISTS_SQL if self.partitioned else PG_EXISTS_SQL, tx_hash)
+            return row is not None
+
+    async def log_booked(self, tx_hash: str, log_index: int) -> bool:
+        """True if the log, or its whole transaction, already has a ledger row."""
+        if self.backend == "sqlite":
+            return await self.sqlite.read(lambda conn: self._sqlite_log_booked(conn, tx_hash, log_index))
+
+        async with self.pg.acquire() as conn:
             row = await conn.fetchrow(
-                "SELECT 1 FROM transactions WHERE tx_hash = $1 LIMIT 1",
-                tx_hash,
+                PG_PARTITIONED_LOG_BOOKED_SQL if self.partitioned else PG_LOG_BOOKED_SQL, tx_hash, log_index
             )
             return row is not None
 
-    def _sqlite_exists(self, tx_hash: str) -> bool:
-        conn = sqlite3.connect(self.sqlite_path)
-        cur = conn.cursor()
-        cur.execute("SELECT 1 FROM transactions WHERE tx_hash = ? LIMIT 1", (tx_hash,))
-        row = cur.fetchone()
-        conn.close()
-        return row is not None
+    def _sqlite_log_booked(self, conn: sqlite3.Connection, tx_hash: str, log_index: int) -> bool:
+        cur = conn.execute(
+            """
+            SELECT 1 FROM transactions WHERE tx_hash = ? AND log_index IN (?, -1)
+            UNION ALL
+            SELECT 1 FROM archived_tx_hashes WHERE tx_hash = ?
+            LIMIT 1
+            """,
+            (tx_hash, log_index, tx_hash),
+        )
+        return cur.fetchone() is not None
+
+    def _sqlite_claimed(self, conn: sqlite3.Connection, payload: dict) -> bool:
+        # A hash is booked whole, as one payment proof, or as the logs of a batch, never both.
+        if payload["log_index"] == WHOLE_TX_LOG_INDEX:
+            return self._sqlite_exists(conn, payload["tx_hash"])
+        return self._sqlite_log_booked(conn, payload["tx_hash"], payload["log_index"])
+
+    def _sqlite_exists(self, conn: sqlite3.Connection, tx_hash: str) -> bool:
+        cur = conn.execute(
+            """
+            SELECT 1 FROM transactions WHERE tx_hash = ?
+            UNION ALL
+            SELECT 1 FROM archived_tx_hashes WHERE tx_hash = ?
+            LIMIT 1
+            """,
+            (tx_hash, tx_hash),
+        )
+        return cur.fetchone() is not None
+
+    async def load_tx_hashes(self, consume, chunk_size: int = 10000) -> int:
+        if self.backend == "sqlite":
+            return await self.sqlite.read(lambda conn: self._sqlite_load_tx_hashes(conn, consume, chunk_size))
+
+        total = 0
+        async with self.pg.acquire() as conn:
+            async with conn.transaction():
+                source = "transaction_hashes" if self.partitioned else "transactions ORDER BY id"
+                cursor = conn.cursor(f"SELECT tx_hash FROM {source}", prefetch=chunk_size)
+                chunk = []
+                async for row in cursor:
+                    chunk.append(row["tx_hash"])
+                    if len(chunk) >= chunk_size:
+                        consume(chunk)
+                        total += len(chunk)
+                        chunk = []
+                consume(chunk)
+                total += len(chunk)
+        return total
+
+    def _sqlite_load_tx_hashes(self, conn: sqlite3.Connection, consume, chunk_size: int) -> int:
+        total = 0
+        cur = conn.execute("SELECT tx_hash FROM archived_tx_hashes UNION ALL SELECT tx_hash FROM transactions")
+        while True:
+            chunk = [r[0] for r in cur.fetchmany(chunk_size)]
+            if not chunk:
+                return total
+            consume(chunk)
+            total += len(chunk)
 
 
 DEFAULT_SQLITE_URL = "sqlite:///./db/transactions.db"
@@ -252,12 +1234,166 @@ def _resolve_database_url() -> str:
 
 
 DATABASE_URL = _resolve_database_url()
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
 db = Database(DATABASE_URL)
+ledger_queue = LedgerWriteQueue(
+    db.insert_transactions,
+    max_batch_rows=int(os.getenv("LEDGER_BATCH_MAX_ROWS", "256")),
+    max_delay_ms=float(os.getenv("LEDGER_BATCH_MAX_DELAY_MS", "5")),
+)
+replay_index = ConsumedProofIndex()
+LEDGER_ARCHIVE_AFTER_DAYS = int(os.getenv("LEDGER_ARCHIVE_AFTER_DAYS", "0"))
+LEDGER_MAINTENANCE_INTERVAL_SECONDS = int(os.getenv("LEDGER_MAINTENANCE_INTERVAL_SECONDS", "3600"))
+maintenance_task: asyncio.Task | None = None
+# Every chain read goes through one coalescing, batching RPC provider.
+chain_rpc = BatchingRpcProvider(ALCHEMY_RPC_URLS) if w3 and ALCHEMY_RPC_URLS else None
+chain_w3 = AsyncWeb3(chain_rpc) if chain_rpc else None
+chain_vault = (
+    chain_w3.eth.contract(address=Web3.to_checksum_address(AGENT_VAULT_ADDRESS), abi=agent_vault.abi)
+    if chain_w3 and agent_vault and AGENT_VAULT_ADDRESS
+    else None
+)
+payment_verifier = PaymentVerifier(chain_w3, chain_vault) if chain_vault else None
+PAYMENT_INDEXER_ENABLED = os.getenv("PAYMENT_INDEXER_ENABLED", "true").lower() == "true"
+payment_indexer = (
+    PaymentLogIndexer(chain_w3, chain_vault, db, DEPLOYMENT_BLOCK)
+    if payment_verifier is not None and PAYMENT_INDEXER_ENABLED
+    else None
+)
+if payment_indexer is not None:
+    payment_verifier.index = payment_indexer
+payment_reconciler = PaymentReconciler(payment_verifier, db) if payment_verifier is not None else None
+# The backend signer's nonces are allocated locally, so concurrent demo payments never collide.
+fee_oracle = FeeOracle(chain_w3) if chain_w3 else None
+nonce_manager = NonceManager(chain_w3, account, fee_oracle) if chain_w3 and account else None
+receipt_tracker = ReceiptTracker(chain_w3) if chain_w3 else None
+# Payments are spread over PRIVATE_KEY and any vault operator keys in SIGNER_KEYS / SIGNER_KEYS_FILE.
+signer_pool = (
+    SignerPool(chain_w3, chain_vault, nonce_manager, fee_oracle, receipt_tracker)
+    if nonce_manager and chain_vault
+    else None
+)
+# Demo payments are checked against a local copy of the registry and vault state before they are signed.
+POLICY_MIRROR_ENABLED = os.getenv("POLICY_MIRROR_ENABLED", "true").lower() == "true"
+policy_mirror = PolicyMirror(chain_w3, chain_vault, DEPLOYMENT_BLOCK) if POLICY_MIRROR_ENABLED and chain_vault else None
+# Off by default: the deployed vault predates executeBatchPayment.
+PAYMENT_BATCH_ENABLED = os.getenv("PAYMENT_BATCH_ENABLED", "false").lower() == "true"
+payment_aggregator = (
+    PaymentAggregator(chain_vault, signer_pool, fee_oracle) if PAYMENT_BATCH_ENABLED and signer_pool else None
+)
+DEMO_JOB_HISTORY = int(os.getenv("DEMO_JOB_HISTORY", "1000"))
+# job_id -> execute-demo job, newest last; kept in memory, oldest dropped past DEMO_JOB_HISTORY.
+demo_jobs: "OrderedDict[str, dict]" = OrderedDict()
+# job_id -> event set on the job's next change, for streaming clients.
+demo_job_changed: dict[str, asyncio.Event] = {}
+demo_job_tasks: set[asyncio.Task] = set()
+# Off by default: the deployed vault predates payment channels.
+PAYMENT_CHANNELS_ENABLED = os.getenv("PAYMENT_CHANNELS_ENABLED", "false").lower() == "true"
+channel_book = (
+    ChannelBook(chain_w3, chain_vault, db, signer_pool, fee_oracle, receipt_tracker)
+    if PAYMENT_CHANNELS_ENABLED and chain_vault
+    else None
+)
+# tx_hash -> route for payments accepted optimistically by this process.
+pending_routes: dict[str, PaidRoute] = {}
+ledger_queue.add_commit_listener(lambda rows: replay_index.add_many(row["tx_hash"] for row in rows))
 
 
 @app.on_event("startup")
 async def on_startup():
     await db.init()
+    started = time.perf_counter()
+    warmed = await db.load_tx_hashes(replay_index.add_many)
+    replay_index.ready = True
+    print(f"[startup] replay index warmed with {warmed} proofs in {time.perf_counter() - started:.2f}s")
+    ledger_queue.start()
+    if chain_rpc is not None:
+        await chain_rpc.start()
+    if fee_oracle is not None:
+        try:
+            await fee_oracle.refresh()
+        except Exception as e:
+            # The first quote fetches again.
+            print(f"[startup] fee refresh failed: {e}")
+        fee_oracle.start()
+    if nonce_manager is not None:
+        try:
+            await nonce_manager.sync()
+        except Exception as e:
+            # The first allocation syncs again.
+            print(f"[startup] nonce sync failed: {e}")
+        nonce_manager.start()
+    if receipt_tracker is not None:
+        receipt_tracker.start()
+    if signer_pool is not None:
+        try:
+            await signer_pool.reload()
+        except Exception as e:
+            # The first payment loads the keys again.
+            print(f"[startup] signer pool load failed: {e}")
+        signer_pool.start()
+    if policy_mirror is not None:
+        policy_mirror.start()
+    if channel_book is not None:
+        await channel_book.load()
+        channel_book.start()
+    if payment_indexer is not None:
+        payment_indexer.start()
+    if payment_reconciler is not None:
+        # Pending rows from before a restart still count against their route's risk limit.
+        for row in await db.fetch_pending_transactions(limit=100000):
+            route = _route_for_row(row)
+            if route is not None:
+                route.pending_usdc += route.amount_usdc
+        payment_reconciler.start()
+    global maintenance_task
+    maintenance_task = asyncio.create_task(_ledger_maintenance())
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if maintenance_task is not None:
+        maintenance_task.cancel()
+    await ledger_queue.stop()
+    if payment_indexer is not None:
+        await payment_indexer.stop()
+    if payment_reconciler is not None:
+        await payment_reconciler.stop()
+    if payment_aggregator is not None:
+        await payment_aggregator.stop()
+    for task in list(demo_job_tasks):
+        task.cancel()
+    if channel_book is not None:
+        await channel_book.stop()
+    if policy_mirror is not None:
+        await policy_mirror.stop()
+    if signer_pool is not None:
+        await signer_pool.stop()
+    if receipt_tracker is not None:
+        await receipt_tracker.stop()
+    if nonce_manager is not None:
+        await nonce_manager.stop()
+    if fee_oracle is not None:
+        await fee_oracle.stop()
+    if chain_rpc is not None:
+        await chain_rpc.close()
+    await db.close()
+
+
+async def _ledger_maintenance():
+    while True:
+        try:
+            created = await db.maintain_partitions()
+            if created:
+                print(f"[maintenance] created partitions {created}")
+            if LEDGER_ARCHIVE_AFTER_DAYS > 0:
+                cutoff = int(time.time()) - LEDGER_ARCHIVE_AFTER_DAYS * 86400
+                for archived in await db.archive_before(cutoff):
+                    print(f"[maintenance] archived {archived}")
+        except Exception as e:
+            print(f"[maintenance] ERROR: {e}")
+            print(traceback.format_exc())
+        await asyncio.sleep(LEDGER_MAINTENANCE_INTERVAL_SECONDS)
 
 
 class Transaction(BaseModel):
@@ -274,16 +1410,10 @@ class AgentExecuteRequest(BaseModel):
     task: str
 
 
-def _validate_payment_proof(
-    tx_hash: str,
-    *,
-    expected_agent_id: str,
-    expected_recipient: str,
-    expected_amount_usdc: float,
-) -> dict:
+async def _validate_payment_proof(tx_hash: str, route: PaidRoute, optimistic: bool = False) -> dict:
     if MOCK_MODE and tx_hash.startswith("0xMOCK_TX_"):
-        normalized_hash = "0x" + hashlib.sha256(f"{expected_agent_id}:{tx_hash}".encode()).hexdigest()
-        return {"tx_hash": normalized_hash, "block_number": 0, "gas_used": 0}
+        normalized_hash = "0x" + hashlib.sha256(f"{route.agent_id}:{tx_hash}".encode()).hexdigest()
+        return {"tx_hash": normalized_hash, "block_number": 0, "gas_used": 0, "final": True}
 
     if not tx_hash.startswith("0x") or len(tx_hash) != 66:
         raise HTTPException(status_code=402, detail={"error": "Invalid payment proof format"})
@@ -291,49 +1421,25 @@ def _validate_payment_proof(
     if MOCK_MODE:
         raise HTTPException(status_code=402, detail={"error": "Mock mode only accepts mock payment proofs"})
 
-    if not all([w3, agent_vault, AGENT_VAULT_ADDRESS]):
+    if payment_verifier is None:
         raise HTTPException(status_code=500, detail={"error": "Payment verifier is not configured"})
 
-    try:
-        receipt = w3.eth.get_transaction_receipt(tx_hash)
-    except Exception:
-        raise HTTPException(status_code=402, detail={"error": "Payment transaction not found"})
-
-    if receipt.get("status") != 1:
-        raise HTTPException(status_code=402, detail={"error": "Payment transaction failed"})
-
-    to_address = receipt.get("to")
-    if not to_address or to_address.lower() != AGENT_VAULT_ADDRESS.lower():
-        raise HTTPException(status_code=402, detail={"error": "Payment tx did not target AgentVault"})
-
-    try:
-        events = agent_vault.events.PaymentExecuted().process_receipt(receipt)
-    except Exception:
-        raise HTTPException(status_code=402, detail={"error": "Unable to decode payment event"})
-
-    expected_agent_id_bytes = Web3.keccak(text=expected_agent_id)
-    expected_recipient_checksum = Web3.to_checksum_address(expected_recipient)
-    expected_amount_units = int(expected_amount_usdc * 10**6)
-
-    valid = False
-    for event in events:
-        args = event["args"]
-        if (
-            args["agentId"] == expected_agent_id_bytes
-            and args["recipient"].lower() == expected_recipient_checksum.lower()
-            and int(args["amount"]) == expected_amount_units
-        ):
-            valid = True
-            break
-
-    if not valid:
-        raise HTTPException(status_code=402, detail={"error": "Payment proof does not match endpoint requirements"})
+    if optimistic:
+        return await payment_verifier.verify_optimistic(
+            tx_hash,
+            agent_id_bytes=route.agent_id_bytes,
+            recipient=route.recipient_checksum,
+            amount_units=route.amount_units,
+            confirmations=RECONCILE_CONFIRMATIONS,
+        )
 
-    return {
-        "tx_hash": tx_hash,
-        "block_number": int(receipt.get("blockNumber", 0) or 0),
-        "gas_used": int(receipt.get("gasUsed", 0) or 0),
-    }
+    verification = await payment_verifier.verify(
+        tx_hash,
+        agent_id_bytes=route.agent_id_bytes,
+        recipient=route.recipient_checksum,
+        amount_units=route.amount_units,
+    )
+    return {**verification, "final": True}
 
 
 async def _insert_paid_transaction(
@@ -345,8 +1451,18 @@ async def _insert_paid_transaction(
     block_number: int,
     gas_used: int,
     timestamp: int | None = None,
+    status: str = "success",
+    log_index: int = WHOLE_TX_LOG_INDEX,
+    channel: dict | None = None,
 ):
-    if await db.tx_hash_exists(tx_hash):
+    if log_index == WHOLE_TX_LOG_INDEX:
+        # Any row for the hash, batch items included, consumes it as a proof.
+        state = replay_index.check(tx_hash)
+        used = state == "consumed" or (state == "unknown" and await db.tx_hash_exists(tx_hash))
+    else:
+        # Other items of the same batch share the hash; only this log, or the whole tx, conflicts.
+        used = await db.log_booked(tx_hash, log_index)
+    if used:
         raise HTTPException(status_code=409, detail={"error": "Payment proof has already been used"})
 
     payload = {
@@ -354,129 +1470,327 @@ async def _insert_paid_transaction(
         "recipient": recipient,
         "amount_usdc": amount_usdc,
         "tx_hash": tx_hash,
-        "status": "success",
+        "status": status,
         "block_reason": None,
         "timestamp": int(timestamp or time.time()),
         "created_at": datetime.utcnow().isoformat(),
         "block_number": block_number,
         "gas_used": gas_used,
+        "log_index": log_index,
     }
-    await db.insert_transaction(payload)
+    if channel is not None:
+        payload["channel"] = channel
+    await ledger_queue.submit(payload)
 
 
-@app.get("/api/weather")
-async def get_weather(x_payment_proof: Optional[str] = Header(None)):
-    recipient = "0x61254AEcF84eEdb890f07dD29f7F3cd3b8Eb2CBe"
-    amount = 0.001
-    agent_id = "weather_agent"
-
-    if not x_payment_proof:
-        raise HTTPException(
-            status_code=402,
-            detail={
-                "error": "Payment Required",
-                "amount": f"{amount:.3f}",
-                "token": "USDC",
-                "token_address": "0x41E94Eb019C0762f9Bfcf9Fb1E58725BfB0e7582",
-                "network": "Polygon Amoy Testnet",
-                "recipient": recipient,
-                "description": "Weather API - per request fee",
-            },
+async def _settle_paid_request(route: PaidRoute, payment_proof: str):
+    # Room under the route's risk limit is claimed up front, so concurrent requests cannot overshoot it.
+    optimistic = payment_reconciler is not None and route.reserve_optimistic()
+    pending = False
+    try:
+        verification = await _validate_payment_proof(payment_proof, route, optimistic=optimistic)
+        pending = optimistic and not verification["final"]
+        await _insert_paid_transaction(
+            agent_id=route.agent_id,
+            recipient=route.recipient,
+            amount_usdc=route.amount_usdc,
+            tx_hash=verification["tx_hash"],
+            block_number=verification["block_number"],
+            gas_used=verification["gas_used"],
+            status="pending" if pending else "success",
         )
-
-    verification = _validate_payment_proof(
-        x_payment_proof,
-        expected_agent_id=agent_id,
-        expected_recipient=recipient,
-        expected_amount_usdc=amount,
-    )
-    await _insert_paid_transaction(
-        agent_id=agent_id,
-        recipient=recipient,
-        amount_usdc=amount,
-        tx_hash=verification["tx_hash"],
-        block_number=verification["block_number"],
-        gas_used=verification["gas_used"],
+    finally:
+        if optimistic and not pending:
+            route.release_optimistic()
+    if pending:
+        route.optimistic += 1
+        pending_routes[verification["tx_hash"]] = route
+
+
+def _route_for_row(row: dict) -> PaidRoute | None:
+    return pending_routes.get(row["tx_hash"]) or paywall.match(row["agent_id"], row["recipient"], row["amount_usdc"])
+
+
+def _expected_payment(row: dict) -> tuple[bytes, str, int] | None:
+    route = _route_for_row(row)
+    return (route.agent_id_bytes, route.recipient_checksum, route.amount_units) if route else None
+
+
+async def _on_payment_resolved(row: dict, status: str, reason: str | None):
+    route = _route_for_row(row)
+    pending_routes.pop(row["tx_hash"], None)
+    if route is None:
+        return
+    route.release_optimistic()
+    if status != "success":
+        route.claw_back()
+        print(f"[paywall] optimistic acceptance suspended on {route.path}: {reason}")
+
+
+async def _settle_voucher(route: PaidRoute, voucher: str) -> str:
+    if channel_book is None:
+        raise HTTPException(status_code=402, detail={"error": "Payment vouchers are not enabled"})
+    # Settled on chain later by the channel's redemption; recorded now like any paid call.
+    return await channel_book.accept(
+        route.agent_id_bytes,
+        route.recipient_checksum,
+        route.amount_units,
+        voucher,
+        record=lambda voucher_id, channel: _insert_paid_transaction(
+            agent_id=route.agent_id,
+            recipient=route.recipient,
+            amount_usdc=route.amount_usdc,
+            tx_hash=voucher_id,
+            block_number=0,
+            gas_used=0,
+            channel=channel,
+        ),
     )
 
+
+paywall.settle_with(_settle_paid_request)
+paywall.vouchers_with(_settle_voucher)
+if payment_reconciler is not None:
+    payment_reconciler.expected = _expected_payment
+    payment_reconciler.on_resolved = _on_payment_resolved
+
+
+@paywall.get(
+    "/api/weather",
+    amount_usdc=0.001,
+    recipient=DEMO_RECIPIENT,
+    agent_id="weather_agent",
+    description="Weather API - per request fee",
+    optimistic_limit_usdc=0.05,
+)
+async def get_weather(payment_proof: str):
     return {
         "city": "Bangalore",
         "temperature": "28C",
         "condition": "Partly Cloudy",
         "humidity": "65%",
         "paid": True,
-        "payment_proof": x_payment_proof,
+        "payment_proof": payment_proof,
     }
 
 
-@app.get("/api/data-feed")
-async def get_data_feed(x_payment_proof: Optional[str] = Header(None)):
-    recipient = "0x61254AEcF84eEdb890f07dD29f7F3cd3b8Eb2CBe"
-    amount = 0.002
-    agent_id = "weather_agent"
-
-    if not x_payment_proof:
-        raise HTTPException(
-            status_code=402,
-            detail={
-                "error": "Payment Required",
-                "amount": f"{amount:.3f}",
-                "token": "USDC",
-                "token_address": "0x41E94Eb019C0762f9Bfcf9Fb1E58725BfB0e7582",
-                "network": "Polygon Amoy Testnet",
-                "recipient": recipient,
-                "description": "Data Feed API",
-            },
-        )
-
-    verification = _validate_payment_proof(
-        x_payment_proof,
-        expected_agent_id=agent_id,
-        expected_recipient=recipient,
-        expected_amount_usdc=amount,
-    )
-    await _insert_paid_transaction(
-        agent_id=agent_id,
-        recipient=recipient,
-        amount_usdc=amount,
-        tx_hash=verification["tx_hash"],
-        block_number=verification["block_number"],
-        gas_used=verification["gas_used"],
-    )
-
+@paywall.get(
+    "/api/data-feed",
+    amount_usdc=0.002,
+    recipient=DEMO_RECIPIENT,
+    agent_id="weather_agent",
+    description="Data Feed API",
+)
+async def get_data_feed(payment_proof: str):
     return {
         "market": "crypto",
         "btc_price": "45000",
         "eth_price": "2800",
         "trend": "bullish",
         "paid": True,
-        "payment_proof": x_payment_proof,
+        "payment_proof": payment_proof,
     }
 
 
-@app.get("/transactions")
-async def get_transactions():
-    rows = await db.fetch_transactions(limit=50)
-    data = []
+def _encode_cursor(timestamp: int, row_id: int) -> str:
+    raw = f"{int(timestamp)}:{int(row_id)}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[int, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split(":")
+        return int(timestamp), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail={"error": "Invalid pagination cursor"})
+
+
+async def _fetch_transaction_page(
+    *,
+    limit: int,
+    cursor: Optional[str],
+    agent_id: Optional[str],
+    recipient: Optional[str],
+    status: Optional[str],
+    since: Optional[int],
+    until: Optional[int],
+) -> tuple[list, Optional[str]]:
+    rows = await db.fetch_transactions(
+        limit=limit + 1,
+        cursor=_decode_cursor(cursor) if cursor else None,
+        agent_id=agent_id,
+        recipient=recipient,
+        status=status,
+        since=since,
+        until=until,
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1]["timestamp"], rows[-1]["id"])
+
     for tx in rows:
+        if tx["tx_hash"].startswith("voucher:"):
+            # Paid by a channel voucher; the chain only sees the channel's later redemption.
+            tx["tx_url"] = None
+            continue
         tx["tx_url"] = f"https://amoy.polygonscan.com/tx/{tx['tx_hash']}"
-        data.append(tx)
-    return {"transactions": data}
+    return rows, next_cursor
+
+
+@app.get("/transactions")
+async def get_transactions(
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    agent_id: Optional[str] = None,
+    recipient: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+):
+    data, next_cursor = await _fetch_transaction_page(
+        limit=limit,
+        cursor=cursor,
+        agent_id=agent_id,
+        recipient=recipient,
+        status=status,
+        since=since,
+        until=until,
+    )
+    return {"transactions": data, "next_cursor": next_cursor}
+
+
+EXPORT_COLUMNS = [c.strip() for c in TRANSACTION_COLUMNS.split(",")] + ["cursor"]
+
+
+@app.get("/transactions/export")
+async def export_transactions(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    cursor: Optional[str] = None,
+    agent_id: Optional[str] = None,
+    recipient: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+):
+    # Every exported row carries its own keyset cursor; pass the last one
+    # received back as ?cursor= to resume an interrupted export.
+    chunks = db.stream_transactions(
+        cursor=_decode_cursor(cursor) if cursor else None,
+        agent_id=agent_id,
+        recipient=recipient,
+        status=status,
+        since=since,
+        until=until,
+    )
+
+    async def ndjson_body():
+        async for chunk in chunks:
+            lines = []
+            for tx in chunk:
+                tx["cursor"] = _encode_cursor(tx["timestamp"], tx["id"])
+                lines.append(json.dumps(tx))
+            yield ("\n".join(lines) + "\n").encode()
+
+    async def csv_body():
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=EXPORT_COLUMNS)
+        writer.writeheader()
+        yield buf.getvalue().encode()
+        async for chunk in chunks:
+            buf.seek(0)
+            buf.truncate()
+            for tx in chunk:
+                tx["cursor"] = _encode_cursor(tx["timestamp"], tx["id"])
+                writer.writerow(tx)
+            yield buf.getvalue().encode()
+
+    if format == "csv":
+        return StreamingResponse(
+            csv_body(),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="transactions.csv"'},
+        )
+    return StreamingResponse(ndjson_body(), media_type="application/x-ndjson")
 
 
 @app.get("/transactions/onchain")
-async def get_onchain_transactions():
-    return await get_transactions()
+async def get_onchain_transactions(
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    return await get_transactions(
+        limit=limit,
+        cursor=cursor,
+        agent_id=None,
+        recipient=None,
+        status=None,
+        since=None,
+        until=None,
+    )
 
 
 @app.get("/executions")
-async def get_executions():
-    rows = await db.fetch_transactions(limit=50)
-    data = []
-    for tx in rows:
-        tx["tx_url"] = f"https://amoy.polygonscan.com/tx/{tx['tx_hash']}"
-        data.append(tx)
-    return {"executions": data}
+async def get_executions(
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    agent_id: Optional[str] = None,
+    recipient: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+):
+    data, next_cursor = await _fetch_transaction_page(
+        limit=limit,
+        cursor=cursor,
+        agent_id=agent_id,
+        recipient=recipient,
+        status=status,
+        since=since,
+        until=until,
+    )
+    return {"executions": data, "next_cursor": next_cursor}
+
+
+def _epoch_day(day: date) -> int:
+    return (day - date(1970, 1, 1)).days
+
+
+@app.get("/stats")
+async def get_stats(
+    group_by: str = Query("day", pattern="^(day|agent_id|recipient|status)(,(day|agent_id|recipient|status))*$"),
+    agent_id: Optional[str] = None,
+    recipient: Optional[str] = None,
+    status: Optional[str] = "success",
+    since: Optional[date] = Query(None, description="First UTC day included, YYYY-MM-DD"),
+    until: Optional[date] = Query(None, description="First UTC day excluded, YYYY-MM-DD"),
+):
+    """
+    Spend totals from the daily rollups.
+
+    Rollups are kept per UTC day, so the bounds are dates rather than the
+    timestamps /transactions takes; as there, ``since`` is inclusive and
+    ``until`` exclusive.
+    """
+    filters = {
+        "agent_id": agent_id,
+        "recipient": recipient,
+        "status": status or None,
+        "since_day": _epoch_day(since) if since else None,
+        "until_day": _epoch_day(until) if until else None,
+    }
+    columns = list(dict.fromkeys(group_by.split(",")))
+    totals = await db.fetch_rollups(group_by=[], **filters)
+    groups = await db.fetch_rollups(group_by=columns, **filters)
+    for row in groups:
+        if "day" in row:
+            row["day"] = datetime.utcfromtimestamp(int(row["day"]) * ROLLUP_DAY_SECONDS).date().isoformat()
+    return {
+        "totals": totals[0] if totals else {"tx_count": 0, "total_usdc": 0.0, "total_gas": 0},
+        "group_by": columns,
+        "groups": groups,
+    }
 
 
 @app.get("/vault-balance")
@@ -484,13 +1798,13 @@ async def get_vault_balance():
     print("[vault-balance] start")
     if MOCK_MODE:
         raise HTTPException(status_code=400, detail={"error": "Vault balance is unavailable in MOCK_MODE"})
-    if not w3 or not agent_vault:
+    if not chain_vault:
         raise HTTPException(status_code=500, detail={"error": "Blockchain client is not configured"})
 
     agent_id = "weather_agent"
     agent_id_bytes = Web3.keccak(text=agent_id)
     try:
-        balance_units = agent_vault.functions.getBalance(agent_id_bytes).call()
+        balance_units = await chain_vault.functions.getBalance(agent_id_bytes).call()
         balance_usdc = balance_units / 10**6
     except Exception as e:
         raise HTTPException(status_code=500, detail={"error": f"Failed to fetch vault balance: {str(e)}"})
@@ -515,81 +1829,231 @@ async def get_network_info():
     return payload
 
 
-@app.post("/execute-demo")
-async def execute_demo():
-    try:
-        print("[execute-demo] start")
-        print(f"[execute-demo] connecting to RPC: {ALCHEMY_RPC}")
-        print(f"[execute-demo] contract address: {AGENT_VAULT_ADDRESS}")
-        print(f"[execute-demo] signer address: {account.address}")
+DEMO_JOB_DONE = ("confirmed", "failed")
 
-        if MOCK_MODE:
-            raise HTTPException(status_code=400, detail={"error": "Demo execution is disabled in MOCK_MODE"})
-        if not w3 or not agent_vault or not account:
-            raise HTTPException(status_code=500, detail={"error": "Blockchain client is not configured"})
 
-        agent_id = "weather_agent"
-        recipient = "0x61254AEcF84eEdb890f07dD29f7F3cd3b8Eb2CBe"
-        amount_usdc = 0.50
-        amount_units = int(amount_usdc * 10**6)
+def _update_demo_job(job_id: str, **fields):
+    job = demo_jobs.get(job_id)
+    if job is None:
+        return
+    job.update(fields, updated_at=int(time.time()))
+    changed = demo_job_changed.pop(job_id, None)
+    if changed is not None:
+        changed.set()
 
-        agent_id_bytes = Web3.keccak(text=agent_id)
-        recipient_checksum = Web3.to_checksum_address(recipient)
-        nonce = w3.eth.get_transaction_count(account.address)
-        tx = agent_vault.functions.executePayment(
-            agent_id_bytes,
-            recipient_checksum,
-            amount_units,
-        ).build_transaction(
-            {
-                "from": account.address,
-                "nonce": nonce,
-                "gas": 300000,
-                "gasPrice": w3.eth.gas_price,
-                "chainId": w3.eth.chain_id,
-            }
-        )
-        signed = account.sign_transaction(tx)
-        tx_hash = w3.eth.send_raw_transaction(signed.rawTransaction)
-        tx_hash_hex = tx_hash.hex()
-        print(f"[execute-demo] tx_hash={tx_hash_hex}")
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=180)
-        print(f"[execute-demo] receipt={receipt}")
-
-        events = agent_vault.events.PaymentExecuted().process_receipt(receipt)
-        print(f"[execute-demo] decoded_events={events}")
-        if not events:
-            raise HTTPException(status_code=500, detail={"error": "PaymentExecuted event not found"})
-
-        event = events[0]["args"]
+
+async def _finish_demo_job(
+    job_id: str, tx_hash_hex: str, batch_index: int | None = None, hold=None, gas: int | None = None
+):
+    """Wait for the shared tracker to see the receipt, then write the ledger row."""
+    # Block that paid the job, once known; its policy hold is kept until the mirror has applied it.
+    paid_block = None
+    try:
+        receipt = await receipt_tracker.wait(tx_hash_hex)
+        if batch_index is not None:
+            out_of_gas = payment_aggregator.out_of_gas(tx_hash_hex, receipt)
+        else:
+            out_of_gas = gas is not None and fee_oracle.out_of_gas("executePayment", gas, receipt)
+        if out_of_gas:
+            # The memoized gas limit was too low; send once more on a fresh estimate.
+            job = demo_jobs[job_id]
+            print(f"[execute-demo] job={job_id} {tx_hash_hex} ran out of gas; resending")
+            tx_hash_hex, batch_index, gas = await _send_demo(
+                Web3.keccak(text=job["agent_id"]), job["recipient"], int(round(job["amount_usdc"] * 10**6))
+            )
+            _update_demo_job(job_id, tx_hash=tx_hash_hex, batch_index=batch_index)
+            receipt = await receipt_tracker.wait(tx_hash_hex)
         block_number = int(receipt.get("blockNumber", 0) or 0)
         gas_used = int(receipt.get("gasUsed", 0) or 0)
+        if receipt.get("status") != 1:
+            raise RuntimeError("Payment transaction reverted on chain")
+
+        log_index = WHOLE_TX_LOG_INDEX
+        if batch_index is not None:
+            event = payment_aggregator.item_result(receipt, batch_index)
+            print(f"[execute-demo] job={job_id} batch_item={batch_index} result={event}")
+            if event["status"] == "blocked":
+                raise RuntimeError(f"Payment blocked: {event['reason']}")
+            # One transaction settles many payments; the ledger keys each by its log
+            # and charges it a share of the gas, the first item taking the remainder.
+            log_index = event["log_index"]
+            # The batch as a whole is never a payment proof, even before its items are committed.
+            replay_index.add(tx_hash_hex)
+            gas_used = gas_used // event["items"] + (gas_used % event["items"] if batch_index == 0 else 0)
+        else:
+            events = chain_vault.events.PaymentExecuted().process_receipt(receipt)
+            print(f"[execute-demo] job={job_id} decoded_events={events}")
+            if not events:
+                raise RuntimeError("PaymentExecuted event not found")
+            event = events[0]["args"]
+        paid_block = block_number
+
         timestamp = int(time.time())
         if block_number:
             try:
-                timestamp = int(w3.eth.get_block(block_number).get("timestamp", timestamp))
+                timestamp = int((await chain_w3.eth.get_block(block_number)).get("timestamp", timestamp))
             except Exception:
                 pass
 
         await _insert_paid_transaction(
-            agent_id=agent_id,
+            agent_id=demo_jobs[job_id]["agent_id"],
             recipient=event["recipient"],
             amount_usdc=event["amount"] / 10**6,
             tx_hash=tx_hash_hex,
             block_number=block_number,
             gas_used=gas_used,
             timestamp=timestamp,
+            log_index=log_index,
         )
-        print("[execute-demo] db_insert=success")
-        latest = await db.fetch_transactions(limit=1)
-        print(f"[execute-demo] latest_row={latest}")
+        print(f"[execute-demo] job={job_id} db_insert=success")
+        _update_demo_job(job_id, status="confirmed", block_number=block_number, gas_used=gas_used)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"[execute-demo] job={job_id} ERROR: {e}")
+        _update_demo_job(job_id, status="failed", error=str(e))
+    finally:
+        if hold is not None:
+            policy_mirror.release(hold, paid_block)
+
+
+@app.post("/execute-demo", status_code=202)
+async def execute_demo():
+    try:
+        print("[execute-demo] start")
+        print(f"[execute-demo] connecting to RPC: {chain_rpc}")
+        print(f"[execute-demo] contract address: {AGENT_VAULT_ADDRESS}")
+        print(f"[execute-demo] signer address: {account.address}")
 
-        return {"tx_hash": tx_hash_hex}
+        if MOCK_MODE:
+            raise HTTPException(status_code=400, detail={"error": "Demo execution is disabled in MOCK_MODE"})
+        if not chain_vault or not account:
+            raise HTTPException(status_code=500, detail={"error": "Blockchain client is not configured"})
+
+        agent_id = "weather_agent"
+        recipient = DEMO_RECIPIENT
+        amount_usdc = 0.50
+        amount_units = int(amount_usdc * 10**6)
+
+        agent_id_bytes = Web3.keccak(text=agent_id)
+        recipient_checksum = Web3.to_checksum_address(recipient)
+        hold = None
+        if policy_mirror is not None:
+            try:
+                hold = policy_mirror.reserve(agent_id_bytes, recipient_checksum, amount_units)
+            except PolicyViolation as e:
+                print(f"[execute-demo] rejected before broadcast: {e.reason}")
+                raise HTTPException(
+                    status_code=409,
+                    detail={
+                        "error": "Payment would revert on chain",
+                        "reason": e.reason,
+                        "policy": policy_mirror.describe(agent_id_bytes),
+                    },
+                )
+        try:
+            tx_hash_hex, batch_index, gas = await _send_demo(agent_id_bytes, recipient_checksum, amount_units)
+        except Exception:
+            if hold is not None:
+                policy_mirror.release(hold)
+            raise
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"[execute-demo] ERROR: {e}")
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
+    # Broadcast succeeded: hand back a job and let the receipt tracker finish it.
+    now = int(time.time())
+    job_id = uuid.uuid4().hex
+    demo_jobs[job_id] = {
+        "job_id": job_id,
+        "status": "pending",
+        "tx_hash": tx_hash_hex,
+        "batch_index": batch_index,
+        "agent_id": agent_id,
+        "recipient": recipient_checksum,
+        "amount_usdc": amount_usdc,
+        "block_number": 0,
+        "gas_used": 0,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+    while len(demo_jobs) > DEMO_JOB_HISTORY:
+        stale_id, _ = demo_jobs.popitem(last=False)
+        demo_job_changed.pop(stale_id, None)
+    task = asyncio.create_task(_finish_demo_job(job_id, tx_hash_hex, batch_index, hold, gas))
+    demo_job_tasks.add(task)
+    task.add_done_callback(demo_job_tasks.discard)
+    print(f"[execute-demo] job={job_id} tx_hash={tx_hash_hex}")
+    return {**demo_jobs[job_id], "status_url": f"/execute-demo/{job_id}"}
+
+
+async def _send_demo(agent_id_bytes: bytes, recipient_checksum: str, amount_units: int) -> tuple[str, int | None, int | None]:
+    """Broadcast a demo payment. Returns (tx hash, batch item index, gas limit); the last is None for batches."""
+    if payment_aggregator is not None:
+        tx_hash_hex, batch_index = await payment_aggregator.submit(agent_id_bytes, recipient_checksum, amount_units)
+        return tx_hash_hex, batch_index, None
+    tx_hash_hex, gas = await _send_demo_payment(agent_id_bytes, recipient_checksum, amount_units)
+    return tx_hash_hex, None, gas
+
+
+async def _send_demo_payment(agent_id_bytes: bytes, recipient_checksum: str, amount_units: int) -> tuple[str, int]:
+    # Chain id, fees and the gas limit come from the oracle's cache, not a fresh RPC read per payment.
+    await fee_oracle.ready()
+    call = {
+        "from": account.address,
+        "to": chain_vault.address,
+        "data": chain_vault.encodeABI(
+            fn_name="executePayment",
+            args=[agent_id_bytes, recipient_checksum, amount_units],
+        ),
+    }
+    gas = await fee_oracle.gas_limit("executePayment", call)
+    tx_hash = await signer_pool.send(
+        {
+            **call,
+            "value": 0,
+            "gas": gas,
+            "chainId": fee_oracle.chain_id,
+            **fee_oracle.quote(),
+        }
+    )
+    return tx_hash.hex(), gas
+
+
+@app.get("/execute-demo/{job_id}")
+async def execute_demo_status(job_id: str):
+    job = demo_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail={"error": "Unknown job id"})
+    return job
+
+
+@app.get("/execute-demo/{job_id}/events")
+async def execute_demo_events(job_id: str):
+    if job_id not in demo_jobs:
+        raise HTTPException(status_code=404, detail={"error": "Unknown job id"})
+
+    async def ndjson_body():
+        # One line per status change, and a repeat every 15s so idle proxies keep the stream open.
+        while True:
+            job = demo_jobs.get(job_id)
+            if job is None:
+                return
+            yield (json.dumps(job) + "\n").encode()
+            if job["status"] in DEMO_JOB_DONE:
+                return
+            changed = demo_job_changed.setdefault(job_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=15)
+            except asyncio.TimeoutError:
+                pass
+
+    return StreamingResponse(ndjson_body(), media_type="application/x-ndjson")
+
 
 @app.post("/agent-execute")
 async def agent_execute(payload: AgentExecuteRequest):
@@ -611,11 +2075,11 @@ async def create_transaction(transaction: Transaction):
     block_number = 0
     gas_used = 0
 
-    if transaction.tx_hash.startswith("0x") and len(transaction.tx_hash) == 66 and not MOCK_MODE and w3:
+    if transaction.tx_hash.startswith("0x") and len(transaction.tx_hash) == 66 and payment_verifier is not None:
         try:
-            receipt = w3.eth.get_transaction_receipt(transaction.tx_hash)
-            block_number = int(receipt.get("blockNumber", 0) or 0)
-            gas_used = int(receipt.get("gasUsed", 0) or 0)
+            receipt = await payment_verifier.get_payment(transaction.tx_hash)
+            block_number = receipt["block_number"]
+            gas_used = receipt["gas_used"]
         except Exception:
             pass
 
@@ -630,9 +2094,11 @@ async def create_transaction(transaction: Transaction):
         "created_at": datetime.utcnow().isoformat(),
         "block_number": block_number,
         "gas_used": gas_used,
+        "log_index": WHOLE_TX_LOG_INDEX,
     }
 
     transaction_id = await db.insert_transaction(payload)
+    replay_index.add(transaction.tx_hash)
 
     return {
         "id": transaction_id,
@@ -644,29 +2110,29 @@ async def create_transaction(transaction: Transaction):
 @app.get("/debug/db-status")
 async def db_status():
     if db.backend == "sqlite":
-        conn = sqlite3.connect(db.sqlite_path)
-        cur = conn.cursor()
-        cur.execute("SELECT COUNT(*) FROM transactions")
-        row_count = int(cur.fetchone()[0])
-        cur.execute("PRAGMA table_info(transactions)")
-        columns = [
-            {
-                "name": r[1],
-                "type": r[2],
-                "notnull": bool(r[3]),
-                "default": r[4],
-            }
-            for r in cur.fetchall()
-        ]
-        conn.close()
+
+        def _read_status(conn: sqlite3.Connection):
+            columns = [
+                {
+                    "name": r[1],
+                    "type": r[2],
+                    "notnull": bool(r[3]),
+                    "default": r[4],
+                }
+                for r in conn.execute("PRAGMA table_info(transactions)").fetchall()
+            ]
+            return columns
+
+        row_count = await db.count_transactions()
+        columns = await db.sqlite.read(_read_status)
         return {
             "backend": "sqlite",
             "row_count": row_count,
             "columns": columns,
         }
 
-    async with db.pg_pool.acquire() as conn:
-        row_count = await conn.fetchval("SELECT COUNT(*) FROM transactions")
+    row_count = await db.count_transactions()
+    async with db.pg.acquire() as conn:
         cols = await conn.fetch(
             """
             SELECT column_name, data_type, is_nullable, column_default
@@ -691,6 +2157,111 @@ async def db_status():
         }
 
 
+@app.get("/debug/ledger-storage")
+async def ledger_storage_status():
+    return await db.storage_stats()
+
+
+@app.get("/debug/db-pool")
+async def db_pool_status():
+    return db.pool_stats()
+
+
+@app.get("/debug/ledger-queue")
+async def ledger_queue_status():
+    return ledger_queue.stats()
+
+
+@app.get("/debug/paid-routes")
+async def paid_routes_status():
+    return paywall.stats()
+
+
+@app.get("/debug/indexer")
+async def indexer_status():
+    if payment_indexer is None:
+        return {"enabled": False}
+    return {"enabled": True, **payment_indexer.stats()}
+
+
+@app.get("/debug/fees")
+async def fee_status():
+    if fee_oracle is None:
+        return {"enabled": False}
+    return {"enabled": True, **fee_oracle.stats()}
+
+
+@app.get("/debug/nonces")
+async def nonce_status():
+    if nonce_manager is None:
+        return {"enabled": False}
+    return {"enabled": True, **nonce_manager.stats()}
+
+
+@app.get("/debug/signers")
+async def signer_status():
+    if signer_pool is None:
+        return {"enabled": False}
+    return {"enabled": True, **signer_pool.stats()}
+
+
+@app.get("/debug/payment-aggregator")
+async def payment_aggregator_status():
+    if payment_aggregator is None:
+        return {"enabled": False}
+    return {"enabled": True, **payment_aggregator.stats()}
+
+
+@app.get("/debug/policy-mirror")
+async def policy_mirror_status(agent_id: Optional[str] = None):
+    if policy_mirror is None:
+        return {"enabled": False}
+    status = {"enabled": True, **policy_mirror.stats()}
+    if agent_id:
+        status["agent"] = policy_mirror.describe(Web3.keccak(text=agent_id))
+    return status
+
+
+@app.get("/debug/channels")
+async def channel_status():
+    if channel_book is None:
+        return {"enabled": False}
+    return {"enabled": True, **channel_book.stats()}
+
+
+@app.get("/debug/receipt-tracker")
+async def receipt_tracker_status():
+    if receipt_tracker is None:
+        return {"enabled": False}
+    return {"enabled": True, "jobs": len(demo_jobs), **receipt_tracker.stats()}
+
+
+@app.get("/debug/reconciler")
+async def reconciler_status():
+    if payment_reconciler is None:
+        return {"enabled": False}
+    return {"enabled": True, **payment_reconciler.stats()}
+
+
+@app.get("/debug/rpc")
+async def rpc_status():
+    if chain_rpc is None:
+        return {"enabled": False}
+    return {"enabled": True, **chain_rpc.stats()}
+
+
+@app.get("/debug/receipt-cache")
+async def receipt_cache_status():
+    if payment_verifier is None:
+        return {"enabled": False}
+    return {"enabled": True, **payment_verifier.receipts.stats()}
+
+
+@app.get("/debug/replay-index")
+async def replay_index_status():
+    return replay_index.stats()
+
+
 @app.get("/health")
 async def health_check():
     return {
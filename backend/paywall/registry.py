@@ -0,0 +1,229 @@
+"""
+Declarative registry of paid routes.
+
+Each paid route is declared once with its price, recipient and agent:
+
+    @paywall.get("/api/weather", amount_usdc=0.001, recipient=..., agent_id="weather_agent", description=...)
+    async def get_weather(payment_proof: str): ...
+
+Everything derived from that declaration (the keccak of the agent id, the
+checksummed recipient, the amount in token units and the exact 402 response
+bytes) is computed at declaration time. PaywallMiddleware answers requests
+without an X-Payment-Proof header straight from those bytes, before FastAPI
+routing, dependency injection or pydantic run.
+
+A request may instead carry an X-Payment-Voucher header: a signed voucher
+against a payment channel (see chain.channels), checked locally with no
+chain round trip. Its handler receives the voucher's ledger id as the proof.
+
+A route declared with ``optimistic_limit_usdc`` may, when
+OPTIMISTIC_ACCEPTANCE is on, accept proofs that are not yet final. The limit
+caps the USDC value of the route's still-pending payments. A pending payment
+that later fails suspends optimistic acceptance on the route for
+OPTIMISTIC_SUSPEND_SECONDS.
+"""
+
+import json
+import os
+import time
+from typing import Awaitable, Callable, Optional
+
+from fastapi import FastAPI, Header, Response
+from web3 import Web3
+
+_PROOF_HEADER = b"x-payment-proof"
+_VOUCHER_HEADER = b"x-payment-voucher"
+
+OPTIMISTIC_ACCEPTANCE = os.getenv("OPTIMISTIC_ACCEPTANCE", "false").lower() == "true"
+OPTIMISTIC_SUSPEND_SECONDS = float(os.getenv("OPTIMISTIC_SUSPEND_SECONDS", "600"))
+
+
+def _json_bytes(content) -> bytes:
+    # Same encoding as FastAPI's JSONResponse, so cached bodies match HTTPException output byte for byte.
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+class PaidRoute:
+    def __init__(
+        self,
+        path: str,
+        *,
+        amount_usdc: float,
+        recipient: str,
+        agent_id: str,
+        description: str,
+        token: str,
+        token_address: str,
+        network: str,
+        optimistic_limit_usdc: float = 0.0,
+    ):
+        self.path = path
+        self.amount_usdc = amount_usdc
+        self.recipient = recipient
+        self.agent_id = agent_id
+        self.description = description
+
+        self.agent_id_bytes = Web3.keccak(text=agent_id)
+        self.recipient_checksum = Web3.to_checksum_address(recipient)
+        self.amount_units = int(round(amount_usdc * 10**6))
+
+        self.detail_402 = {
+            "error": "Payment Required",
+            "amount": f"{amount_usdc:.3f}",
+            "token": token,
+            "token_address": token_address,
+            "network": network,
+            "recipient": recipient,
+            "description": description,
+        }
+        self.body_402 = _json_bytes({"detail": self.detail_402})
+        self.headers_402 = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(self.body_402)).encode()),
+        ]
+        self.fast_402 = 0
+        self.paid = 0
+        self.vouchers = 0
+
+        self.optimistic_limit_usdc = optimistic_limit_usdc
+        self.pending_usdc = 0.0
+        self.suspended_until = 0.0
+        self.optimistic = 0
+        self.clawbacks = 0
+
+    def reserve_optimistic(self) -> bool:
+        """Claim room under the risk limit for one pending payment. False means verify strictly."""
+        if not OPTIMISTIC_ACCEPTANCE or self.optimistic_limit_usdc <= 0 or time.time() < self.suspended_until:
+            return False
+        if self.pending_usdc + self.amount_usdc > self.optimistic_limit_usdc + 1e-9:
+            return False
+        self.pending_usdc += self.amount_usdc
+        return True
+
+    def release_optimistic(self):
+        self.pending_usdc = max(0.0, self.pending_usdc - self.amount_usdc)
+
+    def claw_back(self):
+        """A pending payment failed: stop trusting unconfirmed proofs on this route for a while."""
+        self.clawbacks += 1
+        self.suspended_until = time.time() + OPTIMISTIC_SUSPEND_SECONDS
+
+
+SettleFn = Callable[[PaidRoute, str], Awaitable[None]]
+VoucherFn = Callable[[PaidRoute, str], Awaitable[str]]
+
+
+class PaidRouteRegistry:
+    def __init__(self, app: FastAPI, *, token: str, token_address: str, network: str):
+        self.app = app
+        self.token = token
+        self.token_address = token_address
+        self.network = network
+        self.routes: dict[str, PaidRoute] = {}
+        self._settle: SettleFn | None = None
+        self._accept_voucher: VoucherFn | None = None
+        app.add_middleware(PaywallMiddleware, registry=self)
+
+    def settle_with(self, settle: SettleFn):
+        """Set the coroutine that verifies and records a proof for a route; it raises HTTPException on failure."""
+        self._settle = settle
+
+    def vouchers_with(self, accept: VoucherFn):
+        """Set the coroutine that checks and records a voucher; it returns the call's proof id or raises HTTPException."""
+        self._accept_voucher = accept
+
+    def get(
+        self,
+        path: str,
+        *,
+        amount_usdc: float,
+        recipient: str,
+        agent_id: str,
+        description: str,
+        optimistic_limit_usdc: float = 0.0,
+    ):
+        route = PaidRoute(
+            path,
+            amount_usdc=amount_usdc,
+            recipient=recipient,
+            agent_id=agent_id,
+            description=description,
+            token=self.token,
+            token_address=self.token_address,
+            network=self.network,
+            optimistic_limit_usdc=optimistic_limit_usdc,
+        )
+        self.routes[path] = route
+
+        def decorator(handler: Callable[[str], Awaitable[dict]]):
+            async def endpoint(
+                x_payment_proof: Optional[str] = Header(None),
+                x_payment_voucher: Optional[str] = Header(None),
+            ):
+                if x_payment_voucher and self._accept_voucher is not None:
+                    proof = await self._accept_voucher(route, x_payment_voucher)
+                    route.vouchers += 1
+                    route.paid += 1
+                    return await handler(proof)
+                if not x_payment_proof:
+                    # Only reached if the middleware is bypassed, e.g. an empty header value.
+                    return Response(route.body_402, status_code=402, media_type="application/json")
+                await self._settle(route, x_payment_proof)
+                route.paid += 1
+                return await handler(x_payment_proof)
+
+            endpoint.__name__ = handler.__name__
+            endpoint.__doc__ = handler.__doc__
+            self.app.get(path)(endpoint)
+            return handler
+
+        return decorator
+
+    def match(self, agent_id: str, recipient: str, amount_usdc: float) -> PaidRoute | None:
+        """First route a ledger row could have paid for; rows do not record the path."""
+        for route in self.routes.values():
+            if (
+                route.agent_id == agent_id
+                and route.recipient.lower() == recipient.lower()
+                and abs(route.amount_usdc - float(amount_usdc)) < 1e-9
+            ):
+                return route
+        return None
+
+    def stats(self) -> list[dict]:
+        now = time.time()
+        return [
+            {
+                "path": route.path,
+                "amount_usdc": route.amount_usdc,
+                "recipient": route.recipient,
+                "agent_id": route.agent_id,
+                "fast_402": route.fast_402,
+                "paid": route.paid,
+                "vouchers": route.vouchers,
+                "optimistic_limit_usdc": route.optimistic_limit_usdc if OPTIMISTIC_ACCEPTANCE else 0.0,
+                "pending_usdc": round(route.pending_usdc, 6),
+                "optimistic": route.optimistic,
+                "clawbacks": route.clawbacks,
+                "suspended_for_seconds": max(0, int(route.suspended_until - now)),
+            }
+            for route in self.routes.values()
+        ]
+
+
+class PaywallMiddleware:
+    def __init__(self, app, registry: PaidRouteRegistry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "GET":
+            route = self.registry.routes.get(scope["path"])
+            if route is not None and not any(
+                name in (_PROOF_HEADER, _VOUCHER_HEADER) and value for name, value in scope["headers"]
+            ):
+                route.fast_402 += 1
+                await send({"type": "http.response.start", "status": 402, "headers": route.headers_402})
+                await send({"type": "http.response.body", "body": route.body_402})
+                return
+        await self.app(scope, receive, send)
@@ -0,0 +1,174 @@
+"""
+Benchmark the real paid-call path end to end against the local chain simulator.
+
+Each payment signs and sends AgentVault.executePayment, waits for the receipt
+and then calls /api/weather with the tx hash as proof, so receipt fetching,
+event decoding, the indexer and the ledger all run as they would on Amoy.
+
+Usage:
+  python3 backend/scripts/bench_paid_flow.py --payments 200 --concurrency 20 --latency-ms 50
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+from eth_account import Account
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from chain.simulator import ChainSimulator  # noqa: E402
+
+VAULT = "0x" + "11" * 20
+USDC = "0x41E94Eb019C0762f9Bfcf9Fb1E58725BfB0e7582"
+DEMO_RECIPIENT = "0x61254AEcF84eEdb890f07dD29f7F3cd3b8Eb2CBe"
+
+
+def _start_simulator(args, owner: str) -> ChainSimulator:
+    """Runs the simulator on its own loop, so the SDK's blocking startup calls can reach it."""
+    simulator = ChainSimulator(
+        vault_address=VAULT,
+        owner=owner,
+        block_time=args.block_time,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+    )
+    simulator.add_agent(
+        "weather_agent",
+        balance_usdc=args.payments,
+        max_per_tx_usdc=1.0,
+        daily_cap_usdc=args.payments,
+        whitelist=[DEMO_RECIPIENT],
+    )
+    ready = threading.Event()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(simulator.start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return simulator
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))] if ordered else 0.0
+
+
+async def run(args, main) -> int:
+    from web3 import Web3
+
+    account = main.account
+    agent_id_bytes = Web3.keccak(text="weather_agent")
+    recipient = Web3.to_checksum_address(DEMO_RECIPIENT)
+    settle_times: list[float] = []
+    paid_times: list[float] = []
+    failures = 0
+
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def pay(amount_units: int) -> tuple[str, int]:
+                call = {
+                    "from": account.address,
+                    "to": main.chain_vault.address,
+                    "data": main.chain_vault.encodeABI(fn_name="executePayment", args=[agent_id_bytes, recipient, amount_units]),
+                }
+                tx_hash = await main.nonce_manager.send(
+                    {
+                        **call,
+                        "value": 0,
+                        "gas": await main.fee_oracle.gas_limit("executePayment", call),
+                        "chainId": main.fee_oracle.chain_id,
+                        **main.fee_oracle.quote(),
+                    }
+                )
+                receipt = await main.receipt_tracker.wait(tx_hash)
+                return tx_hash.hex(), receipt["status"]
+
+            async def one_paid_call():
+                nonlocal failures
+                async with semaphore:
+                    started = time.perf_counter()
+                    tx_hash, status = await pay(1000)
+                    settled = time.perf_counter()
+                    response = await client.get("/api/weather", headers={"X-Payment-Proof": tx_hash})
+                    done = time.perf_counter()
+                    if status != 1 or response.status_code != 200:
+                        failures += 1
+                        return
+                    settle_times.append(settled - started)
+                    paid_times.append(done - settled)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one_paid_call() for _ in range(args.payments)))
+            elapsed = time.perf_counter() - started
+
+            # A payment above the per-tx limit reverts on chain and its hash must not unlock the route.
+            over_limit_hash, over_limit_status = await pay(2_000_000)
+            rejected = await client.get("/api/weather", headers={"X-Payment-Proof": over_limit_hash})
+
+            rpc = (await client.get("/debug/rpc")).json()
+            indexer = (await client.get("/debug/indexer")).json()
+            nonces = (await client.get("/debug/nonces")).json()
+            tracker = (await client.get("/debug/receipt-tracker")).json()
+            fees = (await client.get("/debug/fees")).json()
+
+    print(f"[bench] payments={args.payments} concurrency={args.concurrency} block_time={args.block_time}s latency={args.latency_ms}ms")
+    print(f"[bench] throughput      : {len(paid_times) / elapsed:8.1f} paid calls/s ({failures} failed)")
+    print(f"[bench] pay + receipt   : p50 {statistics.median(settle_times) * 1000:7.1f}ms  p95 {_percentile(settle_times, 0.95) * 1000:7.1f}ms")
+    print(f"[bench] verified call   : p50 {statistics.median(paid_times) * 1000:7.1f}ms  p95 {_percentile(paid_times, 0.95) * 1000:7.1f}ms")
+    print(f"[bench] over-limit      : receipt status {over_limit_status}, paid call -> {rejected.status_code}")
+    print(f"[bench] rpc             : {rpc.get('calls')} calls in {rpc.get('http_requests')} HTTP requests ({rpc.get('coalesced')} coalesced)")
+    print(f"[bench] indexer         : {indexer}")
+    print(f"[bench] tracker         : {tracker.get('receipt_lookups')} receipt lookups in {tracker.get('polls')} polls for {tracker.get('mined')} receipts")
+    print(f"[bench] fees            : {fees.get('quote')}, gas limits {fees.get('gas_limits')}, {fees.get('refreshes')} refreshes")
+    print(f"[bench] nonces          : sent {nonces.get('sent')}, reused {nonces.get('reused')}, resyncs {nonces.get('resyncs')}")
+    print(f"[bench] simulator       : {args.simulator.stats()}")
+    return 0 if failures == 0 and over_limit_status == 0 and rejected.status_code == 402 else 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--payments", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--block-time", type=float, default=0.0)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    account = Account.create()
+    args.simulator = _start_simulator(args, account.address)
+
+    # The backend reads its configuration at import time, from a scratch directory for the SQLite ledger.
+    os.chdir(tempfile.mkdtemp(prefix="agentpay-bench-"))
+    os.environ.update(
+        MOCK_PAYMENT="false",
+        ALCHEMY_RPC=args.simulator.url,
+        PRIVATE_KEY=account.key.hex(),
+        AGENT_VAULT_ADDRESS=VAULT,
+        USDC_ADDRESS=USDC,
+        INDEXER_POLL_SECONDS="0.5",
+        TRACKER_POLL_SECONDS="0.05",
+    )
+    os.environ.pop("DATABASE_URL", None)
+    import main as backend
+
+    return asyncio.run(run(args, backend))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
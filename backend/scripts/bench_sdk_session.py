@@ -0,0 +1,169 @@
+"""
+Benchmark the SDK's HTTP session: paid calls through a fresh httpx client
+per call (as call_paid_endpoint used to make) against one pooled
+AgentPayClient, on a local HTTP stand-in for a paid route that answers 402
+until a payment proof is sent. Payments are mocked, so only the HTTP side is
+measured; the server counts the TCP connections it accepted.
+
+Also checks the retry policy: the unpaid probe is retried after a 503, and
+a request carrying a payment proof is not re-sent.
+
+Usage:
+  python3 backend/scripts/bench_sdk_session.py --calls 500 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from aiohttp import web
+
+# The SDK pays with mock transaction hashes; the bench measures its HTTP traffic only.
+os.environ["MOCK_PAYMENT"] = "true"
+os.environ.setdefault("AGENTPAY_RETRY_BACKOFF_SECONDS", "0.01")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from check_rpc_batching import _check  # noqa: E402
+from sdk.agentpay_client import AgentPayClient  # noqa: E402
+
+PAYMENT_DETAIL = {"detail": {"amount": "0.001", "recipient": "0x61254AEcF84eEdb890f07dD29f7F3cd3b8Eb2CBe"}}
+
+
+class PaidRoute:
+    def __init__(self):
+        # client (host, port) of every connection accepted
+        self.connections: set[tuple] = set()
+        self.requests = 0
+        self.paid_requests = 0
+        # (path, carries a proof) -> statuses to answer before the real one
+        self.failures: dict[tuple[str, bool], list[int]] = {}
+        self.url = ""
+        self._runner: web.AppRunner | None = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.connections.add(request.transport.get_extra_info("peername"))
+        self.requests += 1
+        paid = "X-Payment-Proof" in request.headers
+        self.paid_requests += paid
+        queued = self.failures.get((request.path, paid))
+        if queued:
+            return web.json_response({"error": "unavailable"}, status=queued.pop(0))
+        if not paid:
+            return web.json_response(PAYMENT_DETAIL, status=402)
+        return web.json_response({"city": "Bangalore", "paid": True})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/{path:.*}", self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))] if ordered else 0.0
+
+
+async def _run(route: PaidRoute, calls: int, concurrency: int, pooled: bool) -> dict:
+    route.connections.clear()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    shared = AgentPayClient()
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            if pooled:
+                result = await shared.call_paid_endpoint("weather_agent", f"{route.url}/api/weather")
+            else:
+                async with AgentPayClient() as client:
+                    result = await client.call_paid_endpoint("weather_agent", f"{route.url}/api/weather")
+            if result.get("paid"):
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    # The SDK prints each step of every call.
+    with contextlib.redirect_stdout(io.StringIO()):
+        async with shared:
+            await asyncio.gather(*(one() for _ in range(calls)))
+    elapsed = time.perf_counter() - started
+    return {
+        "per_second": len(latencies) / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": _percentile(latencies, 0.95),
+        "paid": len(latencies),
+        "connections": len(route.connections),
+    }
+
+
+async def check_retries(route: PaidRoute) -> list[bool]:
+    route.failures[("/api/flaky", False)] = [503, 502]
+    route.failures[("/api/flaky-paid", True)] = [503]
+    before = route.paid_requests
+    with contextlib.redirect_stdout(io.StringIO()):
+        async with AgentPayClient() as client:
+            probed = await client.call_paid_endpoint("weather_agent", f"{route.url}/api/flaky")
+            try:
+                await client.call_paid_endpoint("weather_agent", f"{route.url}/api/flaky-paid")
+                paid_error = None
+            except Exception as e:
+                paid_error = str(e)
+            retries = client.probe_retries
+    paid_sent = route.paid_requests - before
+    return [
+        await _check("probe retry", probed.get("paid") is True and retries == 2, f"two 5xx on the unpaid probe -> {retries} retries, then paid"),
+        await _check(
+            "paid request not re-sent",
+            paid_error is not None and "503" in paid_error and paid_sent == 2,
+            f"a 503 to a request carrying a proof was raised, not retried ({paid_sent - 1} proof request on that route)",
+        ),
+    ]
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    route = PaidRoute()
+    await route.start()
+    try:
+        fresh = await _run(route, args.calls, args.concurrency, pooled=False)
+        pooled = await _run(route, args.calls, args.concurrency, pooled=True)
+        print(f"[bench] calls={args.calls} concurrency={args.concurrency} (402 probe + paid retry per call)")
+        for name, result in (("client per call", fresh), ("pooled session", pooled)):
+            print(
+                f"[bench] {name:15} : {result['per_second']:8.1f} paid calls/s  p50 {result['p50'] * 1000:6.2f}ms  "
+                f"p95 {result['p95'] * 1000:6.2f}ms  {result['connections']} TCP connections"
+            )
+        results = [
+            await _check(
+                "connection reuse",
+                fresh["paid"] == pooled["paid"] == args.calls and pooled["connections"] <= args.concurrency,
+                f"{fresh['connections']} connections with a client per call, {pooled['connections']} with one pooled session",
+            ),
+            *await check_retries(route),
+        ]
+    finally:
+        await route.stop()
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
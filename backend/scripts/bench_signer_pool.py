@@ -0,0 +1,212 @@
+"""
+Benchmark vault payments sent from one key against a pool of operator keys,
+on the in-process chain simulator with a block time and geth's 16 pending
+transactions per sender.
+
+Also rotates a key mid-run through the keys file (the old key drains and
+leaves the pool, the new one takes payments) and checks that a key the vault
+does not accept is never used, with no reverted or refused transaction.
+
+Usage:
+  python3 backend/scripts/bench_signer_pool.py --payments 400 --keys 4
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Receipts are noticed within a fraction of the block time.
+os.environ.setdefault("TRACKER_POLL_SECONDS", "0.05")
+
+from eth_account import Account  # noqa: E402
+from web3 import AsyncWeb3, Web3  # noqa: E402
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from chain.fees import FeeOracle  # noqa: E402
+from chain.nonces import NonceManager  # noqa: E402
+from chain.rpc import BatchingRpcProvider  # noqa: E402
+from chain.signers import SignerPool  # noqa: E402
+from chain.simulator import ChainSimulator  # noqa: E402
+from chain.tracker import ReceiptTracker  # noqa: E402
+from check_rpc_batching import _check  # noqa: E402
+
+VAULT = "0x" + "11" * 20
+RECIPIENT = Web3.to_checksum_address("0x61254AEcF84eEdb890f07dD29f7F3cd3b8Eb2CBe")
+AGENT_ID = Web3.keccak(text="weather_agent")
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))] if ordered else 0.0
+
+
+class Chain:
+    def __init__(self, args, owner):
+        self.simulator = ChainSimulator(
+            vault_address=VAULT,
+            owner=owner.address,
+            block_time=args.block_time,
+            latency_ms=args.latency_ms,
+            jitter_ms=args.latency_ms / 5,
+            sender_slots=args.sender_slots,
+        )
+        self.simulator.add_agent("weather_agent", balance_usdc=100_000, max_per_tx_usdc=1.0, daily_cap_usdc=100_000, whitelist=[RECIPIENT])
+        self.owner = owner
+
+    async def __aenter__(self):
+        await self.simulator.start()
+        self.provider = BatchingRpcProvider(self.simulator.url)
+        await self.provider.start()
+        self.w3 = AsyncWeb3(self.provider)
+        self.vault = self.w3.eth.contract(address=VAULT, abi=self.simulator.vault.abi)
+        self.fees = FeeOracle(self.w3)
+        self.nonces = NonceManager(self.w3, self.owner, self.fees)
+        self.tracker = ReceiptTracker(self.w3)
+        self.tracker.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.tracker.stop()
+        await self.provider.close()
+        await self.simulator.stop()
+
+    def pool(self, keys: list[str], keys_file: str | None = None) -> SignerPool:
+        return SignerPool(self.w3, self.vault, self.nonces, self.fees, self.tracker, keys=keys, keys_file=keys_file)
+
+
+async def _pay(chain: Chain, pool: SignerPool, payments: int, during=None) -> dict:
+    await chain.fees.ready()
+    call = {
+        "from": pool.address,
+        "to": VAULT,
+        "data": chain.vault.encodeABI(fn_name="executePayment", args=[AGENT_ID, RECIPIENT, 10_000]),
+    }
+    latencies: list[float] = []
+    failed = 0
+    senders: dict[str, int] = {}
+
+    async def one():
+        nonlocal failed
+        started = time.perf_counter()
+        try:
+            tx_hash = await pool.send({**call, "value": 0, "gas": 200_000, "chainId": chain.fees.chain_id, **chain.fees.quote()})
+            receipt = await chain.tracker.wait(tx_hash)
+        except Exception as e:
+            failed += 1
+            print(f"[bench] payment failed: {e}")
+            return
+        if receipt["status"] != 1:
+            failed += 1
+            return
+        sender = chain.simulator.transactions[Web3.to_hex(tx_hash).lower()]["from"]
+        senders[sender] = senders.get(sender, 0) + 1
+        latencies.append(time.perf_counter() - started)
+
+    reverts = chain.simulator.reverts
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(one()) for _ in range(payments)]
+    if during is not None:
+        await during()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    return {
+        "per_second": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) if latencies else 0.0,
+        "p95": _percentile(latencies, 0.95),
+        "failed": failed,
+        "reverted": chain.simulator.reverts - reverts,
+        "senders": senders,
+    }
+
+
+async def bench_keys(args, keys: int) -> dict:
+    owner = Account.create()
+    extra = [Account.create() for _ in range(keys - 1)]
+    async with Chain(args, owner) as chain:
+        chain.simulator.operators.update(a.address for a in extra)
+        pool = chain.pool([a.key.hex() for a in extra])
+        pool.start()
+        try:
+            result = await _pay(chain, pool, args.payments)
+        finally:
+            await pool.stop()
+    print(
+        f"[bench] {keys} key(s)  : {result['per_second']:8.1f} payments/s  "
+        f"p50 {result['p50'] * 1000:7.1f}ms  p95 {result['p95'] * 1000:7.1f}ms  waits {pool.waits}"
+    )
+    return result
+
+
+async def check_rotation(args) -> list[bool]:
+    owner = Account.create()
+    old, new, stranger = Account.create(), Account.create(), Account.create()
+    keys_file = Path(tempfile.mkdtemp(prefix="agentpay-signers-")) / "keys"
+    keys_file.write_text(f"{old.key.hex()}\n{stranger.key.hex()}\n")
+    async with Chain(args, owner) as chain:
+        # The stranger's key is listed but the vault never made it an operator.
+        chain.simulator.operators.update([old.address, new.address])
+        pool = chain.pool([], keys_file=str(keys_file))
+        pool.start()
+
+        async def rotate():
+            await asyncio.sleep(args.block_time * 2)
+            keys_file.write_text(f"{new.key.hex()}\n{stranger.key.hex()}\n")
+            await pool.reload()
+
+        try:
+            result = await _pay(chain, pool, args.payments, during=rotate)
+            await asyncio.sleep(0)
+            stats = pool.stats()
+        finally:
+            await pool.stop()
+    states = {s["address"]: s["state"] for s in stats["signers"]}
+    print(f"[bench] rotation : {result['senders']}")
+    return [
+        await _check(
+            "rotation",
+            result["failed"] == 0 and result["senders"].get(old.address, 0) > 0 and result["senders"].get(new.address, 0) > 0
+            and old.address not in states and states.get(new.address) == "active",
+            f"{result['senders'].get(old.address, 0)} payments from the old key before it drained and left the pool, "
+            f"{result['senders'].get(new.address, 0)} from the new key, {result['failed']} failed",
+        ),
+        await _check(
+            "unauthorized key",
+            states.get(stranger.address) == "unauthorized" and stranger.address not in result["senders"],
+            "a key that is not a vault operator stayed out of rotation and sent nothing",
+        ),
+        await _check("no reverts", result["reverted"] == 0 and stats["pending"] == 0, f"{result['reverted']} reverted, {stats['pending']} still pending"),
+    ]
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--payments", type=int, default=400)
+    parser.add_argument("--keys", type=int, default=4)
+    parser.add_argument("--block-time", type=float, default=0.5)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--sender-slots", type=int, default=16)
+    args = parser.parse_args()
+
+    print(f"[bench] payments={args.payments} block_time={args.block_time}s sender_slots={args.sender_slots} latency={args.latency_ms}ms")
+    one = await bench_keys(args, 1)
+    many = await bench_keys(args, args.keys)
+    results = [
+        await _check(
+            "throughput",
+            one["failed"] == many["failed"] == 0 and one["reverted"] == many["reverted"] == 0 and many["per_second"] > one["per_second"] * 2,
+            f"{many['per_second'] / one['per_second']:.1f}x with {args.keys} keys; payments per key {sorted(many['senders'].values())}",
+        ),
+        *await check_rotation(args),
+    ]
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,141 @@
+"""
+Benchmark ledger inserts: per-call sqlite3.connect vs the persistent SQLiteEngine.
+
+Usage:
+  python3 backend/scripts/bench_sqlite_inserts.py --rows 5000 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from storage.sqlite_engine import SQLiteEngine  # noqa: E402
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    agent_id TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    amount_usdc REAL NOT NULL,
+    tx_hash TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL,
+    block_reason TEXT,
+    timestamp INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    block_number INTEGER NOT NULL DEFAULT 0,
+    gas_used INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+INSERT_SQL = """
+INSERT INTO transactions (
+    agent_id, recipient, amount_usdc, tx_hash, status, block_reason,
+    timestamp, created_at, block_number, gas_used
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+EXISTS_SQL = "SELECT 1 FROM transactions WHERE tx_hash = ? LIMIT 1"
+
+
+def _row(prefix: str, i: int) -> tuple:
+    return (
+        "weather_agent",
+        "0x61254AEcF84eEdb890f07dD29f7F3cd3b8Eb2CBe",
+        0.001,
+        f"0x{prefix}{i:063x}",
+        "success",
+        None,
+        int(time.time()),
+        "2024-01-01T00:00:00",
+        0,
+        0,
+    )
+
+
+def _legacy_exists(path: str, tx_hash: str) -> bool:
+    conn = sqlite3.connect(path)
+    row = conn.execute(EXISTS_SQL, (tx_hash,)).fetchone()
+    conn.close()
+    return row is not None
+
+
+def _legacy_insert(path: str, row: tuple):
+    conn = sqlite3.connect(path)
+    conn.execute(INSERT_SQL, row)
+    conn.commit()
+    conn.close()
+
+
+async def _run(rows: int, concurrency: int, paid_call) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with sem:
+            await paid_call(i)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(rows)))
+    return rows / (time.perf_counter() - started)
+
+
+async def bench_legacy(path: str, rows: int, concurrency: int) -> float:
+    conn = sqlite3.connect(path)
+    conn.execute(CREATE_TABLE_SQL)
+    conn.commit()
+    conn.close()
+
+    async def paid_call(i: int):
+        row = _row("a", i)
+        await asyncio.to_thread(_legacy_exists, path, row[3])
+        while True:
+            try:
+                await asyncio.to_thread(_legacy_insert, path, row)
+                return
+            except sqlite3.OperationalError:
+                # "database is locked" under the rollback journal
+                await asyncio.sleep(0.001)
+
+    return await _run(rows, concurrency, paid_call)
+
+
+async def bench_engine(path: str, rows: int, concurrency: int) -> float:
+    engine = SQLiteEngine(path)
+    await asyncio.to_thread(engine.start, lambda conn: conn.execute(CREATE_TABLE_SQL))
+
+    async def paid_call(i: int):
+        row = _row("b", i)
+        await engine.read(lambda conn: conn.execute(EXISTS_SQL, (row[3],)).fetchone())
+        await engine.write(lambda conn: conn.execute(INSERT_SQL, row))
+
+    try:
+        return await _run(rows, concurrency, paid_call)
+    finally:
+        engine.close()
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = await bench_legacy(os.path.join(tmp, "legacy.db"), args.rows, args.concurrency)
+        engine = await bench_engine(os.path.join(tmp, "engine.db"), args.rows, args.concurrency)
+
+    print(f"[bench] rows={args.rows} concurrency={args.concurrency}")
+    print(f"[bench] per-call connect : {legacy:10.0f} inserts/s")
+    print(f"[bench] SQLiteEngine     : {engine:10.0f} inserts/s")
+    print(f"[bench] speedup          : {engine / legacy:10.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))
@@ -0,0 +1,253 @@
+"""
+Benchmark paid calls settled by channel vouchers against the local chain simulator.
+
+Opens one AgentVault payment channel, then makes paid calls to /api/weather
+through the SDK's voucher path: every call carries a signed cumulative
+voucher that the backend checks locally. Also checks that replayed, forged
+and over-deposit vouchers are refused, that one settlement pass redeems the
+whole run on chain, that the best voucher survives a restart, that a call
+whose ledger write fails is not charged, and that a crash between
+settlement passes loses neither the channel's accepted total nor its best
+voucher, and that a failed chain read of a channel is answered with 503.
+
+Usage:
+  python3 backend/scripts/bench_voucher_flow.py --calls 2000 --concurrency 20 --latency-ms 50
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+from eth_account import Account
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from chain.simulator import ChainSimulator  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+
+VAULT = "0x" + "11" * 20
+USDC = "0x41E94Eb019C0762f9Bfcf9Fb1E58725BfB0e7582"
+DEMO_RECIPIENT = "0x61254AEcF84eEdb890f07dD29f7F3cd3b8Eb2CBe"
+CHANNEL_USDC = 5.0
+
+
+def _start_simulator(args, owner: str) -> ChainSimulator:
+    """Runs the simulator on its own loop, so the SDK's blocking startup calls can reach it."""
+    simulator = ChainSimulator(vault_address=VAULT, owner=owner, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms)
+    simulator.add_agent("weather_agent", balance_usdc=100, max_per_tx_usdc=1.0, daily_cap_usdc=100, whitelist=[DEMO_RECIPIENT])
+    ready = threading.Event()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(simulator.start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return simulator
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))] if ordered else 0.0
+
+
+async def _check(name: str, ok: bool, detail: str) -> bool:
+    print(f"[{'ok' if ok else 'FAIL'}] {name}: {detail}")
+    return ok
+
+
+async def run(args, main) -> int:
+    from web3 import Web3
+
+    from chain.channels import ChannelBook
+    from chain.vouchers import VOUCHER_HEADER, sign_voucher
+    from sdk import agentpay_client as sdk
+
+    account = main.account
+    agent_id_bytes = Web3.keccak(text="weather_agent")
+    recipient = Web3.to_checksum_address(DEMO_RECIPIENT)
+    call_times: list[float] = []
+    failures = 0
+
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            call = {
+                "from": account.address,
+                "to": main.chain_vault.address,
+                "data": main.chain_vault.encodeABI(
+                    fn_name="openChannel",
+                    args=[agent_id_bytes, recipient, account.address, int(CHANNEL_USDC * 10**6), int(time.time()) + 86400],
+                ),
+            }
+            tx_hash = await main.nonce_manager.send(
+                {**call, "value": 0, "gas": 200000, "chainId": main.fee_oracle.chain_id, **main.fee_oracle.quote()}
+            )
+            opened = await main.receipt_tracker.wait(tx_hash)
+
+            payment_info = (await client.get("/api/weather")).json()["detail"]
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def one_paid_call():
+                nonlocal failures
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await sdk._call_with_voucher(client, "weather_agent", "http://bench/api/weather", payment_info)
+                    if response.status_code != 200:
+                        failures += 1
+                        return
+                    call_times.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one_paid_call() for _ in range(args.calls)))
+            elapsed = time.perf_counter() - started
+            channels = (await client.get("/debug/channels")).json()
+
+            accepted = channels["accepted_calls"] * 1000
+            domain = main.channel_book.domain
+            latest = sdk._voucher_totals[(agent_id_bytes, recipient)]
+            replayed = await client.get("/api/weather", headers={VOUCHER_HEADER: sign_voucher(account.key, domain, agent_id_bytes, recipient, latest)})
+            forged = await client.get(
+                "/api/weather",
+                headers={VOUCHER_HEADER: sign_voucher(Account.create().key, domain, agent_id_bytes, recipient, latest + 1000)},
+            )
+            too_much = await client.get(
+                "/api/weather",
+                headers={VOUCHER_HEADER: sign_voucher(account.key, domain, agent_id_bytes, recipient, int(CHANNEL_USDC * 10**6) + 1)},
+            )
+
+            rpc_before = args.simulator.calls
+            redeemed = await main.channel_book.settle_once()
+            on_chain = await main.chain_vault.functions.getChannel(agent_id_bytes, recipient).call()
+
+            # A fresh book restores the saved voucher, as after a restart.
+            restored = ChannelBook(main.chain_w3, main.chain_vault, main.db)
+            await restored.load()
+            restored_channel = restored._channels.get((bytes(agent_id_bytes), recipient))
+
+            # The ledger write of the next call fails: neither side may count it.
+            live = main.channel_book._channels[(bytes(agent_id_bytes), recipient)]
+            before = (live.accepted, live.latest, sdk._voucher_totals[(agent_id_bytes, recipient)])
+            submit = main.ledger_queue.submit
+
+            async def failing_submit(payload):
+                main.ledger_queue.submit = submit
+                raise HTTPException(status_code=503, detail={"error": "Ledger unavailable"})
+
+            main.ledger_queue.submit = failing_submit
+            unrecorded = await sdk._call_with_voucher(client, "weather_agent", "http://bench/api/weather", payment_info)
+            after = (live.accepted, live.latest, sdk._voucher_totals[(agent_id_bytes, recipient)])
+
+            # A crash after these calls, before any settlement pass, must restore the channel as they left it.
+            for _ in range(3):
+                await sdk._call_with_voucher(client, "weather_agent", "http://bench/api/weather", payment_info)
+            old_voucher = sign_voucher(account.key, domain, agent_id_bytes, recipient, sdk._voucher_totals[(agent_id_bytes, recipient)] - 1000)
+            crashed = (live.accepted, live.latest, live.signature)
+            main.channel_book = ChannelBook(main.chain_w3, main.chain_vault, main.db)
+            await main.channel_book.load()
+            revived = main.channel_book._channels[(bytes(agent_id_bytes), recipient)]
+            recovered = (revived.accepted, revived.latest, revived.signature)
+            replayed_after_crash = await client.get("/api/weather", headers={VOUCHER_HEADER: old_voucher})
+            after_restart = [
+                (await sdk._call_with_voucher(client, "weather_agent", "http://bench/api/weather", payment_info)).status_code
+                for _ in range(3)
+            ]
+
+            # The first voucher for a channel not yet cached reads it from the chain; that read times out.
+            cold = ChannelBook(main.chain_w3, main.chain_vault, main.db)
+            cold.domain = domain
+
+            async def timed_out_fetch(agent_id, recipient):
+                raise asyncio.TimeoutError()
+
+            cold._fetch = timed_out_fetch
+            main.channel_book, warm = cold, main.channel_book
+            unreadable = await client.get("/api/weather", headers={VOUCHER_HEADER: old_voucher})
+            main.channel_book = warm
+
+    print(f"[bench] calls={args.calls} concurrency={args.concurrency} latency={args.latency_ms}ms")
+    print(f"[bench] throughput      : {len(call_times) / elapsed:8.1f} paid calls/s ({failures} failed)")
+    print(f"[bench] paid call       : p50 {statistics.median(call_times) * 1000:7.2f}ms  p95 {_percentile(call_times, 0.95) * 1000:7.2f}ms")
+    print(f"[bench] voucher check   : {channels['avg_verify_us']}us on average")
+    print(f"[bench] channels        : {channels}")
+    results = [
+        await _check("channel opened", opened["status"] == 1, f"{CHANNEL_USDC} USDC locked for {recipient}"),
+        await _check("voucher calls", failures == 0 and accepted == latest, f"{len(call_times)} calls accepted for {accepted} units, signed up to {latest}"),
+        await _check("replayed voucher", replayed.status_code == 409, f"re-sending the last voucher -> {replayed.status_code}"),
+        await _check("forged voucher", forged.status_code == 402, f"a voucher from another key -> {forged.status_code}"),
+        await _check("over deposit", too_much.status_code == 402, f"a voucher above the deposit -> {too_much.status_code}"),
+        await _check(
+            "settlement",
+            redeemed == 1 and int(on_chain[2]) == latest,
+            f"one redeemVoucher paid {int(on_chain[2])} units for {len(call_times)} calls "
+            f"({args.simulator.calls - rpc_before} RPC calls in the settlement pass)",
+        ),
+        await _check(
+            "restart",
+            restored_channel is not None and restored_channel.accepted == latest and restored_channel.redeemed == latest,
+            "the saved voucher and on-chain state were restored by a fresh channel book",
+        ),
+        await _check(
+            "unrecorded call",
+            unrecorded.status_code == 503 and after == before,
+            f"a failed ledger write -> {unrecorded.status_code}; channel accepted/latest and the SDK's total unchanged",
+        ),
+        await _check(
+            "crash restart",
+            recovered == crashed and replayed_after_crash.status_code == 409 and after_restart == [200, 200, 200],
+            f"3 unsettled calls restored (accepted {recovered[0]}, latest {recovered[1]}); "
+            f"an already-used voucher -> {replayed_after_crash.status_code}; next calls -> {after_restart}",
+        ),
+        await _check(
+            "channel read failure",
+            unreadable.status_code == 503 and not cold._loading,
+            f"a timed-out getChannel -> {unreadable.status_code} {unreadable.json().get('detail')}",
+        ),
+    ]
+    return 0 if all(results) else 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    account = Account.create()
+    args.simulator = _start_simulator(args, account.address)
+
+    # The backend reads its configuration at import time, from a scratch directory for the SQLite ledger.
+    os.chdir(tempfile.mkdtemp(prefix="agentpay-bench-"))
+    os.environ.update(
+        MOCK_PAYMENT="false",
+        ALCHEMY_RPC=args.simulator.url,
+        PRIVATE_KEY=account.key.hex(),
+        AGENT_VAULT_ADDRESS=VAULT,
+        USDC_ADDRESS=USDC,
+        AGENTPAY_PAYMENT_MODE="voucher",
+        PAYMENT_CHANNELS_ENABLED="true",
+        # Settlement is driven by hand below.
+        CHANNEL_SETTLE_SECONDS="3600",
+        CHANNEL_SETTLE_MIN_USDC="0",
+        TRACKER_POLL_SECONDS="0.05",
+    )
+    os.environ.pop("DATABASE_URL", None)
+    import main as backend
+
+    return asyncio.run(run(args, backend))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,155 @@
+"""
+Check batched settlement against the in-process chain simulator: concurrent
+payments folded into executeBatchPayment transactions, a blocked item that
+does not sink its batch, the gas of a batch against the same payments
+sent one by one (simulator gas model; the contract benchmark is in
+contracts/test/AgentVault.test.js), and the memoized gas limits being
+re-estimated once stale or after an out-of-gas revert.
+
+Usage:
+  python3 backend/scripts/check_batch_payments.py --payments 40
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+from eth_account import Account
+from web3 import AsyncWeb3, Web3
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from chain.aggregator import PaymentAggregator  # noqa: E402
+from chain.fees import FeeOracle  # noqa: E402
+from chain.nonces import NonceManager  # noqa: E402
+from chain.rpc import BatchingRpcProvider  # noqa: E402
+from chain.simulator import ChainSimulator  # noqa: E402
+from check_rpc_batching import _check  # noqa: E402
+
+VAULT = "0x" + "11" * 20
+RECIPIENTS = [
+    Web3.to_checksum_address("0x61254AEcF84eEdb890f07dD29f7F3cd3b8Eb2CBe"),
+    Web3.to_checksum_address("0x" + "22" * 20),
+]
+AGENTS = ["weather_agent", "data_agent"]
+
+
+async def _receipts(w3, hashes) -> dict:
+    receipts = await asyncio.gather(*(w3.eth.wait_for_transaction_receipt(h, timeout=30, poll_latency=0.05) for h in hashes))
+    return dict(zip(hashes, receipts))
+
+
+async def check_batched(simulator, w3, aggregator, payments: int) -> bool:
+    items = [(Web3.keccak(text=AGENTS[i % 2]), RECIPIENTS[i % 2], 1000 + i) for i in range(payments)]
+    started = time.perf_counter()
+    sent = await asyncio.gather(*(aggregator.submit(*item) for item in items))
+    elapsed = time.perf_counter() - started
+    hashes = sorted({tx_hash for tx_hash, _ in sent})
+    receipts = await _receipts(w3, hashes)
+
+    results = [aggregator.item_result(receipts[tx_hash], index) for tx_hash, index in sent]
+    paid = all(
+        r["status"] == "executed" and r["recipient"] == item[1] and r["amount"] == item[2]
+        for r, item in zip(results, items)
+    )
+    batch_gas = sum(int(r["gasUsed"]) for r in receipts.values())
+    single_gas = payments * int(await w3.eth.estimate_gas({"from": aggregator.nonces.address, "to": VAULT, "data": simulator.vault.encodeABI(fn_name="executePayment", args=list(items[0]))}))
+    return await _check(
+        "batched payments",
+        paid and len(hashes) < payments and all(r["status"] == 1 for r in receipts.values()),
+        f"{payments} concurrent payments broadcast in {elapsed * 1000:.0f}ms as {len(hashes)} transaction(s); "
+        f"every item matched to its PaymentExecuted log; gas {batch_gas} batched vs ~{single_gas} one by one",
+    )
+
+
+async def check_blocked(w3, aggregator) -> bool:
+    agent_id = Web3.keccak(text=AGENTS[0])
+    items = [(agent_id, RECIPIENTS[0], 1000), (agent_id, RECIPIENTS[0], 5 * 10**6), (agent_id, RECIPIENTS[0], 1001)]
+    sent = await asyncio.gather(*(aggregator.submit(*item) for item in items))
+    receipts = await _receipts(w3, sorted({tx_hash for tx_hash, _ in sent}))
+    results = [aggregator.item_result(receipts[tx_hash], index) for tx_hash, index in sent]
+    return await _check(
+        "blocked item",
+        [r["status"] for r in results] == ["executed", "blocked", "executed"]
+        and results[1]["reason"] == "ExceedsPerTxLimit"
+        and all(r["status"] == 1 for r in receipts.values()),
+        f"an over-limit item was skipped with PaymentBlocked({results[1].get('reason')}); the other two were paid",
+    )
+
+
+async def check_single(w3, aggregator) -> bool:
+    before = aggregator.singles
+    tx_hash, index = await aggregator.submit(Web3.keccak(text=AGENTS[0]), RECIPIENTS[0], 1000)
+    receipt = (await _receipts(w3, [tx_hash]))[tx_hash]
+    result = aggregator.item_result(receipt, index)
+    return await _check(
+        "single payment",
+        aggregator.singles == before + 1 and result["status"] == "executed",
+        "a window holding one payment was sent as a plain executePayment",
+    )
+
+
+async def check_out_of_gas(w3, aggregator) -> bool:
+    fees = aggregator.fees
+    item = (Web3.keccak(text=AGENTS[0]), RECIPIENTS[0], 1000)
+    # A memoized limit that has gone too low, as after the policy's whitelist grew.
+    fees._gas["executePayment"] = (25000, time.time())
+    tx_hash, index = await aggregator.submit(*item)
+    receipt = (await _receipts(w3, [tx_hash]))[tx_hash]
+    out_of_gas = aggregator.out_of_gas(tx_hash, receipt)
+    retry_hash, retry_index = await aggregator.submit(*item)
+    retried = (await _receipts(w3, [retry_hash]))[retry_hash]
+    refreshed = fees._gas.get("executePayment", (0, 0))[0]
+
+    # An estimate past FEE_GAS_TTL_SECONDS is taken again.
+    estimates = fees.estimates
+    fees._gas["executePayment"] = (refreshed, 0.0)
+    await aggregator.submit(*item)
+    return await _check(
+        "out of gas",
+        receipt["status"] == 0
+        and out_of_gas
+        and retried["status"] == 1
+        and aggregator.item_result(retried, retry_index)["status"] == "executed"
+        and refreshed > 25000
+        and fees.estimates == estimates + 1,
+        f"a 25000 gas limit ran out -> re-estimated to {refreshed} and the resend was paid; "
+        f"an expired estimate was taken again",
+    )
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--payments", type=int, default=40)
+    args = parser.parse_args()
+
+    account = Account.create()
+    simulator = ChainSimulator(vault_address=VAULT, owner=account.address, block_time=0.2, latency_ms=5, jitter_ms=2)
+    for name in AGENTS:
+        simulator.add_agent(name, balance_usdc=10_000, max_per_tx_usdc=1.0, daily_cap_usdc=10_000, whitelist=RECIPIENTS)
+    await simulator.start()
+    provider = BatchingRpcProvider(simulator.url)
+    await provider.start()
+    w3 = AsyncWeb3(provider)
+    fees = FeeOracle(w3)
+    aggregator = PaymentAggregator(simulator.vault, NonceManager(w3, account, fees), fees, window_ms=50, max_items=25)
+    try:
+        results = [
+            await check_batched(simulator, w3, aggregator, args.payments),
+            await check_blocked(w3, aggregator),
+            await check_single(w3, aggregator),
+            await check_out_of_gas(w3, aggregator),
+        ]
+        print(f"[aggregator] {aggregator.stats()}")
+    finally:
+        await aggregator.stop()
+        await provider.close()
+        await simulator.stop()
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,177 @@
+"""
+Check the local nonce manager against the in-process chain simulator:
+concurrent sends, rejected sends, a key used elsewhere, and a dropped
+transaction leaving a gap.
+
+Usage:
+  python3 backend/scripts/check_nonce_manager.py --payments 100
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+# Gaps are filled as soon as check() sees them.
+os.environ.setdefault("NONCE_STUCK_SECONDS", "0")
+
+from eth_account import Account  # noqa: E402
+from web3 import AsyncWeb3, Web3  # noqa: E402
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from chain.nonces import NonceManager  # noqa: E402
+from chain.rpc import BatchingRpcProvider  # noqa: E402
+from chain.simulator import ChainSimulator  # noqa: E402
+from check_rpc_batching import _check  # noqa: E402
+
+VAULT = "0x" + "11" * 20
+RECIPIENT = Web3.to_checksum_address("0x61254AEcF84eEdb890f07dD29f7F3cd3b8Eb2CBe")
+AGENT_ID = Web3.keccak(text="weather_agent")
+
+
+async def _chain(account, block_time: float) -> tuple[ChainSimulator, BatchingRpcProvider, AsyncWeb3]:
+    simulator = ChainSimulator(vault_address=VAULT, owner=account.address, block_time=block_time, latency_ms=5, jitter_ms=2)
+    simulator.add_agent("weather_agent", balance_usdc=10_000, max_per_tx_usdc=1.0, daily_cap_usdc=10_000, whitelist=[RECIPIENT])
+    await simulator.start()
+    provider = BatchingRpcProvider(simulator.url)
+    await provider.start()
+    return simulator, provider, AsyncWeb3(provider)
+
+
+def _payment(simulator: ChainSimulator, amount_units: int, chain_id: int | None = None) -> dict:
+    return {
+        "to": VAULT,
+        "data": simulator.vault.encodeABI(fn_name="executePayment", args=[AGENT_ID, RECIPIENT, amount_units]),
+        "value": 0,
+        "gas": 300000,
+        "gasPrice": 2 * 10**9,
+        "chainId": chain_id or simulator.chain_id,
+    }
+
+
+async def check_naive(account, simulator, w3, payments: int) -> bool:
+    """Baseline: every send reads the pending count itself."""
+
+    async def send(i: int):
+        nonce = await w3.eth.get_transaction_count(account.address, "pending")
+        signed = account.sign_transaction({**_payment(simulator, 1000 + i), "nonce": nonce})
+        return await w3.eth.send_raw_transaction(signed.rawTransaction)
+
+    outcomes = await asyncio.gather(*(send(i) for i in range(payments)), return_exceptions=True)
+    rejected = sum(isinstance(o, Exception) for o in outcomes)
+    simulator.mine()
+    return await _check(
+        "baseline",
+        rejected > 0,
+        f"{payments} concurrent sends reading eth_getTransactionCount -> {rejected} rejected or replaced",
+    )
+
+
+async def check_concurrent(account, simulator, w3, payments: int) -> bool:
+    manager = NonceManager(w3, account)
+    await manager.sync()
+    first = manager.stats()["next_nonce"]
+    started = time.perf_counter()
+    hashes = await asyncio.gather(*(manager.send(_payment(simulator, 1000 + i)) for i in range(payments)))
+    sent = time.perf_counter() - started
+    receipts = await asyncio.gather(*(w3.eth.wait_for_transaction_receipt(h, timeout=30, poll_latency=0.05) for h in hashes))
+    txs = await asyncio.gather(*(w3.eth.get_transaction(h) for h in hashes))
+    nonces = sorted(int(tx["nonce"]) for tx in txs)
+    await manager.check()
+    return await _check(
+        "concurrent sends",
+        nonces == list(range(first, first + payments))
+        and all(r["status"] == 1 for r in receipts)
+        and manager.stats()["in_flight"] == 0,
+        f"{payments} payments sent in {sent * 1000:.0f}ms, all mined with contiguous nonces "
+        f"{nonces[0]}..{nonces[-1]}; {manager.stats()['mined']} confirmed",
+    )
+
+
+async def check_rejected(account, simulator, w3) -> bool:
+    manager = NonceManager(w3, account)
+    await manager.sync()
+    first = manager.stats()["next_nonce"]
+    try:
+        await manager.send(_payment(simulator, 1000, chain_id=1))
+        rejected = False
+    except ValueError:
+        rejected = True
+    tx_hash = await manager.send(_payment(simulator, 1000))
+    tx = await w3.eth.get_transaction(tx_hash)
+    return await _check(
+        "rejected send",
+        rejected and int(tx["nonce"]) == first and manager.stats()["next_nonce"] == first + 1,
+        f"a send rejected for its chain id returned nonce {first}; the next payment reused it",
+    )
+
+
+async def check_external(account, simulator, w3) -> bool:
+    manager = NonceManager(w3, account)
+    await manager.sync()
+    # Another process signs with the same key behind the manager's back.
+    nonce = await w3.eth.get_transaction_count(account.address, "pending")
+    signed = account.sign_transaction({**_payment(simulator, 1000), "nonce": nonce})
+    await w3.eth.send_raw_transaction(signed.rawTransaction)
+    simulator.mine()
+    tx_hash = await manager.send(_payment(simulator, 1001))
+    receipt = await w3.eth.wait_for_transaction_receipt(tx_hash, timeout=30, poll_latency=0.05)
+    return await _check(
+        "key used elsewhere",
+        receipt["status"] == 1 and manager.resyncs == 1,
+        f"'nonce too low' -> {manager.resyncs} resync, payment mined with nonce {nonce + 1}",
+    )
+
+
+async def check_dropped(account) -> bool:
+    # Blocks only when mined by hand, so the dropped transaction stays a gap.
+    simulator, provider, w3 = await _chain(account, block_time=3600)
+    manager = NonceManager(w3, account)
+    try:
+        hashes = [await manager.send(_payment(simulator, 1000 + i)) for i in range(3)]
+        simulator.drop(hashes[1].hex())
+        simulator.mine()
+        stuck = simulator.stats()["pending"]
+        filled = await manager.check()
+        simulator.mine()
+        await manager.check()
+        receipt = await w3.eth.get_transaction_receipt(hashes[2])
+        count = await w3.eth.get_transaction_count(account.address)
+        return await _check(
+            "dropped transaction",
+            stuck == 1 and filled == 1 and receipt["status"] == 1 and count == 3 and manager.stats()["in_flight"] == 0,
+            f"nonce 1 dropped with nonce 2 queued behind it -> {manager.gaps_filled} gap filled, "
+            f"nonce 2 mined, account nonce now {count}",
+        )
+    finally:
+        await provider.close()
+        await simulator.stop()
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--payments", type=int, default=100)
+    args = parser.parse_args()
+
+    account = Account.create()
+    simulator, provider, w3 = await _chain(account, block_time=0.2)
+    try:
+        results = [
+            await check_naive(account, simulator, w3, 20),
+            await check_concurrent(account, simulator, w3, args.payments),
+            await check_rejected(account, simulator, w3),
+            await check_external(account, simulator, w3),
+        ]
+    finally:
+        await provider.close()
+        await simulator.stop()
+    results.append(await check_dropped(account))
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,201 @@
+"""
+Check the PolicyRegistry/AgentVault mirror against the in-process chain
+simulator: a mirror built from events matches the chain, its verdicts match
+the contract's reverts, registry changes are followed, and concurrent
+payments racing for the same daily cap are cut off before broadcast with no
+revert on chain.
+
+Usage:
+  python3 backend/scripts/check_policy_mirror.py --payments 30
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+from eth_account import Account
+from web3 import AsyncWeb3, Web3
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from chain.fees import FeeOracle  # noqa: E402
+from chain.nonces import NonceManager  # noqa: E402
+from chain.policy import PolicyMirror, PolicyViolation  # noqa: E402
+from chain.rpc import BatchingRpcProvider  # noqa: E402
+from chain.simulator import ChainSimulator, Revert, _selector  # noqa: E402
+from check_rpc_batching import _check  # noqa: E402
+
+VAULT = "0x" + "11" * 20
+RECIPIENTS = [
+    Web3.to_checksum_address("0x61254AEcF84eEdb890f07dD29f7F3cd3b8Eb2CBe"),
+    Web3.to_checksum_address("0x" + "22" * 20),
+]
+DAILY_CAP_USDC = 10
+
+
+def _agent(name: str) -> bytes:
+    return bytes(Web3.keccak(text=name))
+
+
+def _verdict(mirror: PolicyMirror, agent_id: bytes, recipient: str, amount: int) -> str | None:
+    try:
+        mirror.release(mirror.reserve(agent_id, recipient, amount))
+    except PolicyViolation as e:
+        return e.reason
+    return None
+
+
+def _contract_verdict(simulator: ChainSimulator, agent_id: bytes, recipient: str, amount: int) -> str | None:
+    data = simulator.vault.encodeABI(fn_name="executePayment", args=[agent_id, recipient, amount])
+    try:
+        simulator._execute(simulator.owner, VAULT, data, int(time.time()), commit=False)
+    except Revert as r:
+        for reason in ("AgentNotActive", "RecipientNotWhitelisted", "ExceedsPerTxLimit", "ExceedsDailyCap", "InsufficientBalance"):
+            if r.data == _selector(f"{reason}()"):
+                return reason
+        return r.data
+    return None
+
+
+async def _send(w3, nonces, fees, to: str, data: str) -> dict:
+    await fees.ready()
+    call = {"from": nonces.address, "to": to, "data": data}
+    tx_hash = await nonces.send({**call, "value": 0, "gas": 200000, "chainId": fees.chain_id, **fees.quote()})
+    return await w3.eth.wait_for_transaction_receipt(tx_hash, timeout=30, poll_latency=0.05)
+
+
+async def check_built(simulator, mirror) -> bool:
+    agent = simulator.agents[_agent("weather_agent")]
+    policy = mirror.describe(_agent("weather_agent"))
+    ok = (
+        policy is not None
+        and policy["active"]
+        and policy["balance_usdc"] * 10**6 == agent.balance
+        and policy["daily_cap_usdc"] * 10**6 == agent.daily_cap
+        and policy["max_per_tx_usdc"] * 10**6 == agent.max_per_tx
+        and set(policy["whitelist"]) == agent.whitelist
+    )
+    return await _check(
+        "built from events",
+        ok,
+        f"{mirror.events_applied} events from block {mirror.start_block} to {mirror.head} -> {mirror.stats()['agents']} agents; weather_agent matches the simulator",
+    )
+
+
+async def check_verdicts(simulator, mirror) -> bool:
+    cases = [
+        ("weather_agent", RECIPIENTS[0], 500_000),
+        ("weather_agent", RECIPIENTS[1], 500_000),
+        ("weather_agent", RECIPIENTS[0], 2_000_000),
+        ("paused_agent", RECIPIENTS[0], 500_000),
+        ("unknown_agent", RECIPIENTS[0], 500_000),
+        ("poor_agent", RECIPIENTS[0], 800_000),
+    ]
+    verdicts = []
+    for name, recipient, amount in cases:
+        verdicts.append((name, _verdict(mirror, _agent(name), recipient, amount), _contract_verdict(simulator, _agent(name), recipient, amount)))
+    return await _check(
+        "verdicts",
+        all(mine == contract for _, mine, contract in verdicts) and mirror.stats()["holds"] == 0,
+        "; ".join(f"{name}: {mine or 'ok'}" for name, mine, _ in verdicts) + " (all as the contract decides)",
+    )
+
+
+async def check_updates(simulator, w3, nonces, fees, mirror) -> bool:
+    registry = simulator.registry
+    weather = _agent("weather_agent")
+    await _send(w3, nonces, fees, registry.address, registry.encodeABI(fn_name="addToWhitelist", args=[weather, RECIPIENTS[1]]))
+    await _send(w3, nonces, fees, registry.address, registry.encodeABI(fn_name="unpauseAgent", args=[_agent("paused_agent")]))
+    await _send(w3, nonces, fees, registry.address, registry.encodeABI(fn_name="updatePolicy", args=[weather, 1_000_000, DAILY_CAP_USDC * 10**6]))
+    while not await mirror.poll_once():
+        pass
+    whitelisted = _verdict(mirror, weather, RECIPIENTS[1], 500_000)
+    unpaused = _verdict(mirror, _agent("paused_agent"), RECIPIENTS[0], 500_000)
+    return await _check(
+        "registry updates",
+        whitelisted is None and unpaused is None and mirror.describe(weather)["daily_cap_usdc"] == DAILY_CAP_USDC,
+        f"addToWhitelist, unpauseAgent and updatePolicy followed within one poll (head {mirror.head})",
+    )
+
+
+async def check_concurrent_cap(simulator, w3, nonces, fees, mirror, payments: int) -> bool:
+    weather = _agent("weather_agent")
+    amount = 1_000_000
+    room = DAILY_CAP_USDC * 10**6 - int(mirror.describe(weather)["spent_today_usdc"] * 10**6)
+    reverts_before = simulator.reverts
+    rejected = 0
+
+    async def pay():
+        nonlocal rejected
+        try:
+            hold = mirror.reserve(weather, RECIPIENTS[0], amount)
+        except PolicyViolation as e:
+            rejected += e.reason == "ExceedsDailyCap"
+            return
+        paid_block = None
+        try:
+            receipt = await _send(w3, nonces, fees, VAULT, simulator.vault.encodeABI(fn_name="executePayment", args=[weather, RECIPIENTS[0], amount]))
+            if receipt["status"] == 1:
+                paid_block = receipt["blockNumber"]
+        finally:
+            mirror.release(hold, paid_block)
+
+    await asyncio.gather(*(pay() for _ in range(payments)))
+    while not await mirror.poll_once():
+        pass
+    spent = simulator.agents[weather].daily_spent
+    return await _check(
+        "concurrent cap",
+        rejected == payments - room // amount
+        and simulator.reverts == reverts_before
+        and spent == DAILY_CAP_USDC * 10**6
+        and mirror.stats()["holds"] == 0,
+        f"{payments} concurrent 1 USDC payments with {room / 10**6:.0f} USDC of cap left: {payments - rejected} sent, "
+        f"{rejected} rejected before broadcast, {simulator.reverts - reverts_before} reverted on chain",
+    )
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--payments", type=int, default=30)
+    args = parser.parse_args()
+
+    account = Account.create()
+    simulator = ChainSimulator(vault_address=VAULT, owner=account.address, block_time=0.2, latency_ms=5, jitter_ms=2)
+    simulator.add_agent("weather_agent", balance_usdc=100, max_per_tx_usdc=1.0, daily_cap_usdc=100, whitelist=RECIPIENTS[:1])
+    simulator.add_agent("paused_agent", balance_usdc=100, max_per_tx_usdc=1.0, daily_cap_usdc=100, whitelist=RECIPIENTS, active=False)
+    simulator.add_agent("poor_agent", balance_usdc=0.5, max_per_tx_usdc=1.0, daily_cap_usdc=100, whitelist=RECIPIENTS)
+    await simulator.start()
+    provider = BatchingRpcProvider(simulator.url)
+    await provider.start()
+    w3 = AsyncWeb3(provider)
+    fees = FeeOracle(w3)
+    nonces = NonceManager(w3, account, fees)
+    mirror = PolicyMirror(w3, w3.eth.contract(address=VAULT, abi=simulator.vault.abi), simulator.blocks[0]["number"])
+    try:
+        while not await mirror.poll_once():
+            pass
+        # Some of today's cap is already spent on chain before the race.
+        for _ in range(3):
+            await _send(w3, nonces, fees, VAULT, simulator.vault.encodeABI(fn_name="executePayment", args=[_agent("weather_agent"), RECIPIENTS[0], 1_000_000]))
+        mirror.start()
+        await asyncio.sleep(0.3)
+        results = [
+            await check_built(simulator, mirror),
+            await check_verdicts(simulator, mirror),
+            await check_updates(simulator, w3, nonces, fees, mirror),
+            await check_concurrent_cap(simulator, w3, nonces, fees, mirror, args.payments),
+        ]
+        print(f"[policy] {mirror.stats()}")
+    finally:
+        await mirror.stop()
+        await provider.close()
+        await simulator.stop()
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
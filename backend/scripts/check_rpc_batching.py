@@ -0,0 +1,212 @@
+"""
+Check the coalescing/batching RPC provider against a local fake JSON-RPC server.
+
+Usage:
+  python3 backend/scripts/check_rpc_batching.py
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+from aiohttp import web
+from web3 import AsyncWeb3, Web3
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chain.rpc import BatchingRpcProvider  # noqa: E402
+from chain.verifier import PaymentVerifier  # noqa: E402
+
+VAULT = Web3.to_checksum_address("0x" + "11" * 20)
+RECIPIENT = "0x61254AEcF84eEdb890f07dD29f7F3cd3b8Eb2CBe"
+PAYMENT_EXECUTED = {
+    "anonymous": False,
+    "name": "PaymentExecuted",
+    "type": "event",
+    "inputs": [
+        {"indexed": True, "name": "agentId", "type": "bytes32"},
+        {"indexed": True, "name": "recipient", "type": "address"},
+        {"indexed": False, "name": "amount", "type": "uint256"},
+        {"indexed": False, "name": "timestamp", "type": "uint256"},
+    ],
+}
+
+
+def _receipt(tx_hash: str, amount_units: int) -> dict:
+    topic = Web3.keccak(text="PaymentExecuted(bytes32,address,uint256,uint256)").hex()
+    agent_id = Web3.keccak(text="weather_agent").hex()
+    data = "0x" + amount_units.to_bytes(32, "big").hex() + (1_700_000_000).to_bytes(32, "big").hex()
+    block = {"blockHash": "0x" + "ab" * 32, "blockNumber": hex(100), "transactionHash": tx_hash, "transactionIndex": "0x0"}
+    return {
+        **block,
+        "contractAddress": None,
+        "cumulativeGasUsed": "0x5208",
+        "effectiveGasPrice": "0x1",
+        "from": "0x" + "22" * 20,
+        "gasUsed": "0x5208",
+        "logsBloom": "0x" + "00" * 256,
+        "status": "0x1",
+        "to": VAULT,
+        "type": "0x2",
+        "logs": [
+            {
+                **block,
+                "address": VAULT,
+                "topics": [topic, agent_id, "0x" + "00" * 12 + RECIPIENT[2:].lower()],
+                "data": data,
+                "logIndex": "0x0",
+                "removed": False,
+            }
+        ],
+    }
+
+
+class FakeRpcServer:
+    """Answers a handful of eth_* methods after a fixed delay and records every HTTP body.
+
+    ``fail_status`` makes every request fail with that HTTP status instead.
+    """
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.bodies: list = []
+        self.calls: list[str] = []
+        self.fail_batches = False
+        self.fail_status: int | None = None
+        self._runner: web.AppRunner | None = None
+        self.url = ""
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/"
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def _answer(self, request: dict) -> dict:
+        method, params = request["method"], request.get("params") or []
+        self.calls.append(method)
+        await asyncio.sleep(self.delay)
+        reply = {"jsonrpc": "2.0", "id": request["id"]}
+        if method == "eth_getTransactionReceipt":
+            reply["result"] = _receipt(params[0], 1000)
+        elif method == "eth_blockNumber":
+            reply["result"] = hex(200)
+        elif method == "eth_chainId":
+            reply["result"] = hex(80002)
+        elif method == "eth_gasPrice":
+            reply["result"] = hex(30 * 10**9)
+        elif method == "eth_getTransactionCount":
+            reply["result"] = hex(7)
+        else:
+            reply["error"] = {"code": -32601, "message": f"method {method} not found"}
+        return reply
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.bodies.append(body)
+        if self.fail_status is not None:
+            return web.Response(status=self.fail_status, text="injected failure")
+        if isinstance(body, list):
+            if self.fail_batches:
+                return web.json_response({"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "batch rejected"}})
+            return web.json_response(list(await asyncio.gather(*(self._answer(item) for item in body))))
+        return web.json_response(await self._answer(body))
+
+
+async def _check(name: str, ok: bool, detail: str):
+    print(f"[{'ok' if ok else 'FAIL'}] {name}: {detail}")
+    return ok
+
+
+async def main() -> int:
+    server = FakeRpcServer()
+    await server.start()
+    provider = BatchingRpcProvider(server.url, batch_window_ms=5, max_batch_size=50)
+    await provider.start()
+    w3 = AsyncWeb3(provider)
+    results = []
+    try:
+        tx_hash = "0x" + "aa" * 32
+        receipts = await asyncio.gather(*(w3.eth.get_transaction_receipt(tx_hash) for _ in range(20)))
+        results.append(
+            await _check(
+                "single-flight",
+                server.calls.count("eth_getTransactionReceipt") == 1 and all(r["status"] == 1 for r in receipts),
+                f"20 identical receipt reads -> {server.calls.count('eth_getTransactionReceipt')} upstream call",
+            )
+        )
+
+        server.bodies.clear()
+        hashes = ["0x" + f"{i:064x}" for i in range(10)]
+        nonce, gas_price, chain_id, *distinct = await asyncio.gather(
+            w3.eth.get_transaction_count(VAULT),
+            w3.eth.gas_price,
+            w3.eth.chain_id,
+            *(w3.eth.get_transaction_receipt(h) for h in hashes),
+        )
+        batch_sizes = [len(b) if isinstance(b, list) else 1 for b in server.bodies]
+        results.append(
+            await _check(
+                "batching",
+                batch_sizes == [13] and (nonce, chain_id) == (7, 80002) and len(distinct) == 10,
+                f"13 distinct reads -> HTTP bodies of sizes {batch_sizes}",
+            )
+        )
+
+        try:
+            await asyncio.gather(w3.eth.chain_id, w3.eth.get_block(1))
+            per_call_error = False
+        except Exception as e:
+            per_call_error = "not found" in str(e)
+        results.append(await _check("per-call error", per_call_error, "an error reply only fails its own call"))
+
+        server.fail_batches = True
+        outcomes = await asyncio.gather(w3.eth.chain_id, w3.eth.gas_price, return_exceptions=True)
+        server.fail_batches = False
+        results.append(
+            await _check(
+                "batch-level error",
+                all(isinstance(o, Exception) for o in outcomes),
+                "a rejected batch fails every call in it",
+            )
+        )
+
+        vault = w3.eth.contract(address=VAULT, abi=[PAYMENT_EXECUTED])
+        verifier = PaymentVerifier(w3, vault)
+        server.calls.clear()
+        verifications = await asyncio.gather(
+            *(
+                verifier.verify(
+                    "0x" + "bb" * 32,
+                    agent_id_bytes=Web3.keccak(text="weather_agent"),
+                    recipient=RECIPIENT,
+                    amount_units=1000,
+                )
+                for _ in range(5)
+            )
+        )
+        results.append(
+            await _check(
+                "verifier",
+                server.calls.count("eth_getTransactionReceipt") == 1 and verifications[0]["block_number"] == 100,
+                f"5 concurrent verifications -> {server.calls.count('eth_getTransactionReceipt')} receipt fetch",
+            )
+        )
+        print(json.dumps(provider.stats()))
+    finally:
+        await provider.close()
+        await server.stop()
+
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
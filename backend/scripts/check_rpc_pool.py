@@ -0,0 +1,135 @@
+"""
+Check the RPC endpoint pool (routing, circuit breaker, failover, hedging)
+against local fake JSON-RPC servers with injected latency and failures.
+
+Usage:
+  python3 backend/scripts/check_rpc_pool.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+# Short cooldown so the half-open path is exercised within the check.
+os.environ.setdefault("RPC_BREAKER_COOLDOWN_SECONDS", "0.5")
+os.environ.setdefault("RPC_HEDGE_MIN_DELAY_MS", "50")
+
+from web3 import AsyncWeb3  # noqa: E402
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from chain.rpc import BatchingRpcProvider  # noqa: E402
+from check_rpc_batching import FakeRpcServer, _check  # noqa: E402
+
+
+async def _provider(*servers: FakeRpcServer) -> tuple[BatchingRpcProvider, AsyncWeb3]:
+    provider = BatchingRpcProvider([s.url for s in servers], batch_window_ms=0)
+    await provider.start()
+    return provider, AsyncWeb3(provider)
+
+
+async def check_routing(fast: FakeRpcServer, slow: FakeRpcServer) -> bool:
+    provider, w3 = await _provider(slow, fast)
+    try:
+        for _ in range(20):
+            await w3.eth.block_number
+        slow_stats, fast_stats = provider.pool.stats()
+        return await _check(
+            "routing",
+            fast_stats["requests"] >= 18,
+            f"20 reads -> fast {fast_stats['requests']}, slow {slow_stats['requests']} "
+            f"(ewma {fast_stats['ewma_ms']}ms vs {slow_stats['ewma_ms']}ms)",
+        )
+    finally:
+        await provider.close()
+
+
+async def check_breaker(failing: FakeRpcServer) -> bool:
+    provider, w3 = await _provider(failing)
+    endpoint = provider.pool.endpoints[0]
+    try:
+        failing.fail_status = 503
+        for _ in range(3):
+            try:
+                await w3.eth.block_number
+            except Exception:
+                pass
+        opened = endpoint.open and not endpoint.available(time.monotonic())
+
+        failing.fail_status = None
+        await asyncio.sleep(0.6)
+        await w3.eth.block_number
+        return await _check(
+            "circuit breaker",
+            opened and not endpoint.open,
+            f"3 failures -> circuit {'open' if opened else 'closed'}; "
+            f"after cooldown a trial request closed it: {not endpoint.open}",
+        )
+    finally:
+        failing.fail_status = None
+        await provider.close()
+
+
+async def check_failover(fast: FakeRpcServer, slow: FakeRpcServer) -> bool:
+    provider, w3 = await _provider(fast, slow)
+    try:
+        for _ in range(5):
+            await w3.eth.block_number
+        fast.fail_status = 502
+        values = [await w3.eth.block_number for _ in range(5)]
+        fast_stats, slow_stats = provider.pool.stats()
+        return await _check(
+            "failover",
+            values == [200] * 5 and provider.failovers >= 1 and provider.errors == 0,
+            f"fast endpoint down -> 5/5 reads answered by slow, {provider.failovers} failover(s), "
+            f"fast failures {fast_stats['failures']}",
+        )
+    finally:
+        fast.fail_status = None
+        await provider.close()
+
+
+async def check_hedging(fast: FakeRpcServer, backup: FakeRpcServer) -> bool:
+    provider, w3 = await _provider(fast, backup)
+    try:
+        for i in range(12):
+            await w3.eth.get_transaction_receipt("0x" + f"{i:064x}")
+        fast.delay = 1.0
+        started = time.perf_counter()
+        receipt = await w3.eth.get_transaction_receipt("0x" + "cc" * 32)
+        elapsed = time.perf_counter() - started
+        fast.delay = 0.01
+        return await _check(
+            "hedging",
+            receipt["status"] == 1 and elapsed < 0.5 and provider.hedge_wins >= 1,
+            f"1s latency spike on the primary -> receipt in {elapsed * 1000:.0f}ms, "
+            f"{provider.hedges} hedge(s), {provider.hedge_wins} won by the backup",
+        )
+    finally:
+        fast.delay = 0.01
+        await provider.close()
+
+
+async def main() -> int:
+    fast, slow, other = FakeRpcServer(delay=0.01), FakeRpcServer(delay=0.15), FakeRpcServer(delay=0.03)
+    for server in (fast, slow, other):
+        await server.start()
+    try:
+        results = [
+            await check_routing(fast, slow),
+            await check_breaker(other),
+            await check_failover(fast, slow),
+            await check_hedging(fast, other),
+        ]
+    finally:
+        for server in (fast, slow, other):
+            await server.stop()
+
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,104 @@
+"""
+Run the local AgentVault chain simulator as a JSON-RPC server.
+
+Point the backend and SDK at it with ALCHEMY_RPC=http://127.0.0.1:8545 and
+the same PRIVATE_KEY / AGENT_VAULT_ADDRESS; the key's account is the vault
+owner, so it may call executePayment. Keys in SIGNER_KEYS are made vault
+operators, as contracts/scripts/set-operator.js does on chain.
+
+Usage:
+  python3 backend/scripts/run_chain_simulator.py --block-time 2 --latency-ms 80
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+from eth_account import Account
+from web3 import Web3
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chain.simulator import (  # noqa: E402
+    SIM_BLOCK_TIME_SECONDS,
+    SIM_LATENCY_JITTER_MS,
+    SIM_LATENCY_MS,
+    SIM_SENDER_SLOTS,
+    ChainSimulator,
+)
+
+DEMO_RECIPIENT = "0x61254AEcF84eEdb890f07dD29f7F3cd3b8Eb2CBe"
+
+
+async def serve(args) -> None:
+    simulator = ChainSimulator(
+        vault_address=args.vault,
+        owner=args.owner,
+        block_time=args.block_time,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        sender_slots=args.sender_slots,
+    )
+    simulator.operators.update(args.operator)
+    for agent_id in args.agent:
+        simulator.add_agent(
+            agent_id,
+            balance_usdc=args.balance,
+            max_per_tx_usdc=args.max_per_tx,
+            daily_cap_usdc=args.daily_cap,
+            whitelist=args.recipient,
+        )
+        print(f"[simulator] agent {agent_id}: balance={args.balance} max_per_tx={args.max_per_tx} daily_cap={args.daily_cap}")
+
+    await simulator.start(args.host, args.port)
+    print(f"[simulator] vault={simulator.vault_address} owner={simulator.owner} operators={sorted(simulator.operators)}")
+    try:
+        while True:
+            await asyncio.sleep(30)
+            print(f"[simulator] {simulator.stats()}")
+    finally:
+        await simulator.stop()
+
+
+def main() -> int:
+    load_dotenv(Path(__file__).resolve().parent.parent / ".env")
+    private_key = os.getenv("PRIVATE_KEY")
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8545)
+    parser.add_argument("--block-time", type=float, default=SIM_BLOCK_TIME_SECONDS, help="Seconds per block; 0 mines each tx at once")
+    parser.add_argument("--latency-ms", type=float, default=SIM_LATENCY_MS)
+    parser.add_argument("--jitter-ms", type=float, default=SIM_LATENCY_JITTER_MS)
+    parser.add_argument("--vault", default=os.getenv("AGENT_VAULT_ADDRESS") or "0x" + "11" * 20)
+    parser.add_argument("--owner", default=Account.from_key(private_key).address if private_key else None)
+    parser.add_argument("--sender-slots", type=int, default=SIM_SENDER_SLOTS, help="Pending transactions kept per sender; 0 is unlimited")
+    parser.add_argument("--operator", action="append", help="Address allowed to execute payments besides the owner (repeatable)")
+    parser.add_argument("--agent", action="append", help="Agent id to register (repeatable)")
+    parser.add_argument("--recipient", action="append", help="Whitelisted recipient (repeatable)")
+    parser.add_argument("--balance", type=float, default=1000.0, help="Agent balance in USDC")
+    parser.add_argument("--max-per-tx", type=float, default=1.0, help="Per-transaction limit in USDC")
+    parser.add_argument("--daily-cap", type=float, default=100.0, help="Daily cap in USDC")
+    args = parser.parse_args()
+
+    if not args.owner:
+        parser.error("--owner is required when PRIVATE_KEY is not set")
+    args.agent = args.agent or ["weather_agent", "agent-001"]
+    args.recipient = args.recipient or [DEMO_RECIPIENT]
+    if args.operator is None:
+        signer_keys = [key.strip() for key in os.getenv("SIGNER_KEYS", "").split(",") if key.strip()]
+        args.operator = [Account.from_key(key).address for key in signer_keys]
+    args.operator = [Web3.to_checksum_address(address) for address in args.operator]
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
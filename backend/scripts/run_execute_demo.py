@@ -1,6 +1,7 @@
 import argparse
 import os
 import json
+import time
 import httpx
 
 
@@ -20,7 +21,7 @@ def main() -> int:
         return 0
 
     print(f"[demo] POST {execute_url}")
-    with httpx.Client(timeout=180) as client:
+    with httpx.Client(timeout=30) as client:
         resp = client.post(execute_url)
         print(f"[demo] status={resp.status_code}")
         try:
@@ -30,6 +31,15 @@ def main() -> int:
         print("[demo] response:")
         print(json.dumps(payload, indent=2))
 
+        status_url = payload.get("status_url")
+        deadline = time.time() + 180
+        while status_url and payload.get("status") == "pending" and time.time() < deadline:
+            time.sleep(2)
+            payload = client.get(f"{base_url}{status_url}").json()
+            print(f"[demo] job {payload.get('job_id')}: {payload.get('status')}")
+        if payload.get("error"):
+            print(f"[demo] job error: {payload['error']}")
+
         print(f"[demo] GET {executions_url}")
         resp2 = client.get(executions_url)
         print(f"[demo] status={resp2.status_code}")
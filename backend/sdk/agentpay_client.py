@@ -4,23 +4,38 @@ Implements on-chain payment execution flow for AI agents on Polygon Amoy
 """
 
 import os
+import sys
 import json
 import asyncio
 import time
 from pathlib import Path
-from web3 import Web3
+from urllib.parse import urlparse
+from web3 import AsyncWeb3, Web3
 from eth_account import Account
 import httpx
 from dotenv import load_dotenv
 
+# The chain helpers live in backend/chain; make them importable when this file is run as a script.
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from chain.fees import FeeOracle
+from chain.nonces import NonceManager
+from chain.signers import SignerPool
+from chain.policy import PolicyMirror, PolicyViolation
+from chain.vouchers import VOUCHER_HEADER, domain_separator, sign_voucher
+
 # Load environment variables from backend/.env first, then root .env as fallback.
-backend_env_path = Path(__file__).resolve().parent.parent / ".env"
-root_env_path = Path(__file__).resolve().parent.parent.parent / ".env"
+backend_env_path = BACKEND_DIR / ".env"
+root_env_path = BACKEND_DIR.parent / ".env"
 load_dotenv(dotenv_path=backend_env_path)
 load_dotenv(dotenv_path=root_env_path)
 
 # Environment variables
 ALCHEMY_RPC = os.getenv("ALCHEMY_RPC")
+# ALCHEMY_RPC may list several endpoints, comma-separated, for failover.
+ALCHEMY_RPC_URLS = [url.strip() for url in (ALCHEMY_RPC or "").split(",") if url.strip()]
 PRIVATE_KEY = os.getenv("PRIVATE_KEY")
 AGENT_VAULT_ADDRESS = os.getenv("AGENT_VAULT_ADDRESS")
 USDC_ADDRESS = os.getenv("USDC_ADDRESS")
@@ -31,6 +46,27 @@ DEPLOYMENT_BLOCK = 33980000
 
 # Mock mode flag
 MOCK_MODE = os.getenv("MOCK_PAYMENT", "false").lower() == "true"
+# "tx" pays each call on chain; "voucher" signs a channel voucher per call (the channel must be open).
+PAYMENT_MODE = os.getenv("AGENTPAY_PAYMENT_MODE", "tx").lower()
+# Check payments against a local mirror of the agent's policy and balance before sending them.
+POLICY_MIRROR_ENABLED = os.getenv("POLICY_MIRROR_ENABLED", "true").lower() == "true"
+# Paid-endpoint HTTP session: one pooled connection set reused by every call.
+AGENTPAY_HTTP2 = os.getenv("AGENTPAY_HTTP2", "true").lower() == "true"
+AGENTPAY_MAX_CONNECTIONS = int(os.getenv("AGENTPAY_MAX_CONNECTIONS", "100"))
+AGENTPAY_MAX_KEEPALIVE = int(os.getenv("AGENTPAY_MAX_KEEPALIVE", "20"))
+AGENTPAY_KEEPALIVE_SECONDS = float(os.getenv("AGENTPAY_KEEPALIVE_SECONDS", "30"))
+AGENTPAY_TIMEOUT_SECONDS = float(os.getenv("AGENTPAY_TIMEOUT_SECONDS", "30"))
+AGENTPAY_CONNECT_TIMEOUT_SECONDS = float(os.getenv("AGENTPAY_CONNECT_TIMEOUT_SECONDS", "5"))
+AGENTPAY_RETRIES = int(os.getenv("AGENTPAY_RETRIES", "2"))
+AGENTPAY_RETRY_BACKOFF_SECONDS = float(os.getenv("AGENTPAY_RETRY_BACKOFF_SECONDS", "0.2"))
+
+try:
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    # httpx speaks HTTP/2 only with the h2 package (httpx[http2]); without it every call uses HTTP/1.1.
+    HTTP2_AVAILABLE = False
 
 # Validate required environment variables (skip in mock mode)
 if not MOCK_MODE:
@@ -45,13 +81,22 @@ if not MOCK_MODE:
 
 # Initialize Web3 and contracts (skip in mock mode)
 if not MOCK_MODE:
-    w3 = Web3(Web3.HTTPProvider(ALCHEMY_RPC))
-
-    if not w3.is_connected():
-        raise ConnectionError(f"Failed to connect to Polygon Amoy via {ALCHEMY_RPC}")
-
+    w3 = None
+    for rpc_url in ALCHEMY_RPC_URLS:
+        candidate = Web3(Web3.HTTPProvider(rpc_url))
+        if candidate.is_connected():
+            w3 = candidate
+            break
+        print(f"[!] RPC endpoint unreachable, trying next: {urlparse(rpc_url).netloc or rpc_url}")
+
+    if w3 is None:
+        raise ConnectionError(f"Failed to connect to Polygon Amoy via any of {len(ALCHEMY_RPC_URLS)} RPC endpoint(s)")
+    # Sends and receipt waits use the async client, so concurrent payments don't block the event loop.
+    async_w3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(rpc_url))
+
+    CHAIN_ID = w3.eth.chain_id
     print("[✓] Connected to Polygon Amoy")
-    print(f"[✓] Chain ID: {w3.eth.chain_id}")
+    print(f"[✓] Chain ID: {CHAIN_ID}")
 
     try:
         account = Account.from_key(PRIVATE_KEY)
@@ -59,6 +104,11 @@ if not MOCK_MODE:
     except Exception as e:
         raise ValueError(f"Failed to load account from PRIVATE_KEY: {str(e)}")
 
+    # Fees are quoted from a cache refreshed in the background, not fetched per payment.
+    fee_oracle = FeeOracle(async_w3)
+    # One allocator per signer, so concurrent call_paid_endpoint() calls never share a nonce.
+    nonce_manager = NonceManager(async_w3, account, fee_oracle)
+
     abi_candidates = [
         Path(__file__).parent / "abi" / "AgentVault.json",
         Path(__file__).parent.parent.parent
@@ -90,31 +140,170 @@ if not MOCK_MODE:
         print(f"[✓] AgentVault contract initialized at {AGENT_VAULT_ADDRESS}")
     except Exception as e:
         raise ValueError(f"Failed to initialize AgentVault contract: {str(e)}")
+    voucher_domain = domain_separator(CHAIN_ID, agent_vault.address)
+    async_vault = async_w3.eth.contract(address=agent_vault.address, abi=AGENT_VAULT_ABI)
+    # Catches up on first use and whenever it is older than POLICY_MIRROR_POLL_SECONDS; unchecked until then.
+    policy_mirror = PolicyMirror(async_w3, async_vault, DEPLOYMENT_BLOCK) if POLICY_MIRROR_ENABLED else None
+    # Payments go out from PRIVATE_KEY and any vault operator keys in SIGNER_KEYS / SIGNER_KEYS_FILE.
+    signer_pool = SignerPool(async_w3, async_vault, nonce_manager, fee_oracle)
 else:
     print("[✓] Running in MOCK MODE - no blockchain connection required")
     w3 = None
+    async_w3 = None
     account = None
+    fee_oracle = None
+    nonce_manager = None
     agent_vault = None
+    voucher_domain = None
+    policy_mirror = None
+    signer_pool = None
 
+# (agent id hash, recipient) -> cumulative units signed so far through that channel
+_voucher_totals: dict[tuple[bytes, str], int] = {}
 
-async def call_paid_endpoint(agent_id: str, endpoint: str) -> dict:
-    """
-    Call a paid API endpoint with automatic on-chain payment execution
 
-    Args:
-        agent_id: Agent identifier
-        endpoint: Full URL of the paid endpoint
+def _next_voucher(agent_id_bytes: bytes, recipient: str, amount_units: int, accepted_units: int = 0) -> tuple[str, int]:
+    key = (agent_id_bytes, recipient)
+    # Never sign below what the backend has already accepted, e.g. after this process restarted.
+    total = max(_voucher_totals.get(key, 0), accepted_units) + amount_units
+    _voucher_totals[key] = total
+    return sign_voucher(account.key, voucher_domain, agent_id_bytes, recipient, total), total
+
 
-    Returns:
-        Response JSON from the paid endpoint
+def _unsign_voucher(agent_id_bytes: bytes, recipient: str, amount_units: int, total: int):
+    # The backend did not charge the call; sign the next one over the same total unless a later call moved past it.
+    key = (agent_id_bytes, recipient)
+    if _voucher_totals.get(key) == total:
+        _voucher_totals[key] = total - amount_units
 
-    Raises:
-        Exception: If payment or endpoint call fails
+
+async def _call_with_voucher(client: httpx.AsyncClient, agent_id: str, endpoint: str, payment_info: dict):
+    agent_id_bytes = Web3.keccak(text=agent_id)
+    recipient_address = Web3.to_checksum_address(payment_info["recipient"])
+    amount_units = int(round(float(payment_info["amount"]) * 10**6))
+
+    voucher, total = _next_voucher(agent_id_bytes, recipient_address, amount_units)
+    response = await client.get(endpoint, headers={VOUCHER_HEADER: voucher})
+    channel = response.json().get("detail", {}).get("channel") if response.status_code == 409 else None
+    if channel:
+        # Our running total is behind the backend's; catch up once and sign again.
+        voucher, total = _next_voucher(agent_id_bytes, recipient_address, amount_units, int(channel.get("accepted_units", 0)))
+        response = await client.get(endpoint, headers={VOUCHER_HEADER: voucher})
+    if response.status_code >= 400:
+        _unsign_voucher(agent_id_bytes, recipient_address, amount_units, total)
+    return response
+
+
+class AgentPayClient:
+    """
+    Long-lived session for paid endpoint calls.
+
+    Every call goes through one httpx client, so the 402 probe and the paid
+    retry reuse pooled keep-alive connections instead of opening a fresh one
+    each (two TCP and TLS handshakes per paid call before). HTTP/2 is used
+    with https endpoints when h2 is installed, multiplexing concurrent calls
+    over one connection per host.
+
+    Retries: connection failures are retried by the transport up to
+    AGENTPAY_RETRIES times, since such a request never reached the server.
+    The unpaid probe is idempotent, so it is also retried on read errors and
+    502/503/504 with exponential backoff. A request carrying a payment proof
+    or voucher is not re-sent once it may have arrived, as the backend
+    consumes the proof.
+
+    Use as ``async with AgentPayClient() as client``, or call ``aclose()``.
     """
 
-    async with httpx.AsyncClient() as client:
+    def __init__(
+        self,
+        *,
+        http2: bool = AGENTPAY_HTTP2,
+        max_connections: int = AGENTPAY_MAX_CONNECTIONS,
+        max_keepalive: int = AGENTPAY_MAX_KEEPALIVE,
+        keepalive_seconds: float = AGENTPAY_KEEPALIVE_SECONDS,
+        timeout_seconds: float = AGENTPAY_TIMEOUT_SECONDS,
+        connect_timeout_seconds: float = AGENTPAY_CONNECT_TIMEOUT_SECONDS,
+        retries: int = AGENTPAY_RETRIES,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_seconds,
+        )
+        self.timeout = httpx.Timeout(timeout_seconds, connect=connect_timeout_seconds)
+        self.retries = retries
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+        self.calls = 0
+        self.tx_payments = 0
+        self.voucher_payments = 0
+        self.probe_retries = 0
+
+    async def __aenter__(self) -> "AgentPayClient":
+        self.http  # opens the pool on this loop
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """The pooled client, opened on first use."""
+        loop = asyncio.get_running_loop()
+        if self._client is not None and self._loop is not loop:
+            # Pooled connections belong to the loop that opened them, e.g. an earlier asyncio.run().
+            self._client = None
+        if self._client is None:
+            transport = self._transport or httpx.AsyncHTTPTransport(
+                http2=self.http2, limits=self.limits, retries=self.retries
+            )
+            self._client = httpx.AsyncClient(transport=transport, timeout=self.timeout)
+            self._loop = loop
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            client, self._client = self._client, None
+            if self._loop is asyncio.get_running_loop():
+                await client.aclose()
+
+    async def _probe(self, client: httpx.AsyncClient, endpoint: str) -> httpx.Response:
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                response = await client.get(endpoint)
+            except httpx.TransportError:
+                if last:
+                    raise
+            else:
+                if response.status_code not in (502, 503, 504) or last:
+                    return response
+            self.probe_retries += 1
+            await asyncio.sleep(AGENTPAY_RETRY_BACKOFF_SECONDS * 2**attempt)
+
+    async def call_paid_endpoint(self, agent_id: str, endpoint: str) -> dict:
+        """
+        Call a paid API endpoint with automatic on-chain payment execution
+
+        Args:
+            agent_id: Agent identifier
+            endpoint: Full URL of the paid endpoint
+
+        Returns:
+            Response JSON from the paid endpoint
+
+        Raises:
+            Exception: If payment or endpoint call fails
+        """
+
+        client = self.http
+        self.calls += 1
         print("[1] Calling endpoint")
-        response = await client.get(endpoint)
+        response = await self._probe(client, endpoint)
 
         if response.status_code != 402:
             return response.json()
@@ -128,6 +317,15 @@ async def call_paid_endpoint(agent_id: str, endpoint: str) -> dict:
         amount = float(payment_info["amount"])
         recipient = payment_info["recipient"]
 
+        if PAYMENT_MODE == "voucher" and not MOCK_MODE:
+            print("[3] Paying with a channel voucher")
+            self.voucher_payments += 1
+            response = await _call_with_voucher(client, agent_id, endpoint, payment_info)
+            if response.status_code >= 400:
+                raise Exception(f"Voucher payment failed ({response.status_code}): {response.text}")
+            print("[6] Success")
+            return response.json()
+
         print("[3] Executing payment")
 
         if MOCK_MODE:
@@ -137,38 +335,61 @@ async def call_paid_endpoint(agent_id: str, endpoint: str) -> dict:
             amount_units = int(amount * 10**6)
             recipient_address = Web3.to_checksum_address(recipient)
 
-            nonce = w3.eth.get_transaction_count(account.address)
-
-            transaction = agent_vault.functions.executePayment(
-                agent_id_bytes,
-                recipient_address,
-                amount_units,
-            ).build_transaction(
-                {
+            hold = None
+            if policy_mirror is not None:
+                try:
+                    hold = policy_mirror.reserve(agent_id_bytes, recipient_address, amount_units)
+                except PolicyViolation as e:
+                    raise Exception(f"Payment not sent: it would revert on chain with {e.reason}")
+            paid_block = None
+            tx_hash = None
+            try:
+                await fee_oracle.ready()
+                call = {
                     "from": account.address,
-                    "nonce": nonce,
-                    "gas": 300000,
-                    "gasPrice": w3.to_wei(30, "gwei"),
-                    "chainId": 80002,
+                    "to": agent_vault.address,
+                    "data": agent_vault.encodeABI(
+                        fn_name="executePayment",
+                        args=[agent_id_bytes, recipient_address, amount_units],
+                    ),
                 }
-            )
-
-            signed_txn = account.sign_transaction(transaction)
-            tx_hash = w3.eth.send_raw_transaction(signed_txn.rawTransaction)
-            tx_hash_hex = tx_hash.hex()
-
-            try:
-                receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
-            except Exception as e:
-                raise Exception(f"Transaction timeout or RPC error: {str(e)}")
-
-            if receipt["status"] == 0:
-                raise Exception(
-                    "On-chain payment transaction reverted - policy check failed or insufficient balance"
-                )
+                # A second attempt only follows an out-of-gas revert, on a fresh estimate.
+                for attempt in range(2):
+                    if tx_hash is not None:
+                        signer_pool.done(tx_hash)
+                    gas = await fee_oracle.gas_limit("executePayment", call)
+                    tx_hash = await signer_pool.send(
+                        {
+                            **call,
+                            "value": 0,
+                            "gas": gas,
+                            "chainId": fee_oracle.chain_id,
+                            **fee_oracle.quote(),
+                        }
+                    )
+                    tx_hash_hex = tx_hash.hex()
+
+                    try:
+                        receipt = await async_w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
+                    except Exception as e:
+                        raise Exception(f"Transaction timeout or RPC error: {str(e)}")
+                    if attempt or not fee_oracle.out_of_gas("executePayment", gas, receipt):
+                        break
+
+                if receipt["status"] == 0:
+                    raise Exception(
+                        "On-chain payment transaction reverted - policy check failed or insufficient balance"
+                    )
+                paid_block = receipt["blockNumber"]
+            finally:
+                if tx_hash is not None:
+                    signer_pool.done(tx_hash)
+                if hold is not None:
+                    policy_mirror.release(hold, paid_block)
 
             print(f"[4] Transaction confirmed: {tx_hash_hex}")
 
+        self.tx_payments += 1
         print("[5] Retrying endpoint")
         headers = {"X-Payment-Proof": tx_hash_hex}
         response = await client.get(endpoint, headers=headers)
@@ -179,18 +400,43 @@ async def call_paid_endpoint(agent_id: str, endpoint: str) -> dict:
         print("[6] Success")
         return response.json()
 
+    def stats(self) -> dict:
+        return {
+            "open": self._client is not None,
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive": self.limits.max_keepalive_connections,
+            "calls": self.calls,
+            "tx_payments": self.tx_payments,
+            "voucher_payments": self.voucher_payments,
+            "probe_retries": self.probe_retries,
+        }
+
+
+# Shared by call_paid_endpoint(); agents making many calls can hold their own AgentPayClient instead.
+default_client = AgentPayClient()
+
+
+async def call_paid_endpoint(agent_id: str, endpoint: str) -> dict:
+    """
+    Call a paid API endpoint with automatic on-chain payment execution,
+    through the module's shared AgentPayClient session.
+    """
+    return await default_client.call_paid_endpoint(agent_id, endpoint)
+
 
 async def main():
     """Example usage"""
     agent_id = "agent-001"
     endpoint = "http://127.0.0.1:8000/api/weather"
 
-    try:
-        result = await call_paid_endpoint(agent_id, endpoint)
-        print("\n=== Result ===")
-        print(json.dumps(result, indent=2))
-    except Exception as e:
-        print(f"\n[✗] Error: {str(e)}")
+    async with AgentPayClient() as client:
+        try:
+            result = await client.call_paid_endpoint(agent_id, endpoint)
+            print("\n=== Result ===")
+            print(json.dumps(result, indent=2))
+        except Exception as e:
+            print(f"\n[✗] Error: {str(e)}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1 @@
+__all__ = ["archive", "ingest", "partitions", "postgres", "replay", "sqlite_engine"]
@@ -0,0 +1,175 @@
+"""
+Monthly gzip NDJSON archives of cold ledger rows.
+
+Both backends archive the same way: Postgres detaches and drops a monthly
+partition once its rows are written here, SQLite deletes the month's rows
+from the live table. Each month is one file, sorted by (timestamp, id), so
+the export path can stream archives followed by the live table in order.
+"""
+
+import asyncio
+import calendar
+import gzip
+import heapq
+import json
+import os
+from datetime import datetime, timezone
+
+LEDGER_ARCHIVE_DIR = os.getenv("LEDGER_ARCHIVE_DIR", "db/archive")
+
+_PREFIX = "transactions_"
+_SUFFIX = ".ndjson.gz"
+
+
+def month_start(timestamp: int) -> int:
+    dt = datetime.fromtimestamp(int(timestamp), tz=timezone.utc)
+    return calendar.timegm((dt.year, dt.month, 1, 0, 0, 0))
+
+
+def next_month_start(timestamp: int) -> int:
+    dt = datetime.fromtimestamp(month_start(timestamp), tz=timezone.utc)
+    year, month = (dt.year + 1, 1) if dt.month == 12 else (dt.year, dt.month + 1)
+    return calendar.timegm((year, month, 1, 0, 0, 0))
+
+
+def month_key(timestamp: int) -> str:
+    dt = datetime.fromtimestamp(int(timestamp), tz=timezone.utc)
+    return f"{dt.year:04d}_{dt.month:02d}"
+
+
+def month_key_start(key: str) -> int:
+    year, month = key.split("_")
+    return calendar.timegm((int(year), int(month), 1, 0, 0, 0))
+
+
+def _sort_key(row: dict) -> tuple[int, int]:
+    return int(row["timestamp"]), int(row["id"])
+
+
+class ArchiveWriter:
+    """Writes one month's rows to a temp file and swaps it in on commit.
+
+    Rows must be appended in (timestamp, id) order. If the month was already
+    archived, the existing file is merged in so the result stays sorted.
+    """
+
+    def __init__(self, archive: "LedgerArchive", key: str):
+        self.archive = archive
+        self.key = key
+        self.path = archive.path_for(key)
+        self.tmp_path = f"{self.path}.tmp"
+        self.rows = 0
+        self._file = gzip.open(self.tmp_path, "wt", encoding="utf-8")
+
+    def write_rows(self, rows: list[dict]):
+        for row in rows:
+            self._file.write(json.dumps(row))
+            self._file.write("\n")
+        self.rows += len(rows)
+
+    def commit(self):
+        self._file.close()
+        if os.path.exists(self.path):
+            merged_path = f"{self.path}.merge"
+            with gzip.open(merged_path, "wt", encoding="utf-8") as out:
+                merged = heapq.merge(
+                    self.archive.read_file(self.path),
+                    self.archive.read_file(self.tmp_path),
+                    key=_sort_key,
+                )
+                for row in merged:
+                    out.write(json.dumps(row))
+                    out.write("\n")
+            os.remove(self.tmp_path)
+            self.tmp_path = merged_path
+
+        with open(self.tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class LedgerArchive:
+    def __init__(self, directory: str = LEDGER_ARCHIVE_DIR):
+        self.directory = directory
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{_PREFIX}{key}{_SUFFIX}")
+
+    def months(self) -> list[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        keys = [
+            name[len(_PREFIX) : -len(_SUFFIX)]
+            for name in os.listdir(self.directory)
+            if name.startswith(_PREFIX) and name.endswith(_SUFFIX)
+        ]
+        return sorted(keys)
+
+    def open_writer(self, key: str) -> ArchiveWriter:
+        os.makedirs(self.directory, exist_ok=True)
+        return ArchiveWriter(self, key)
+
+    @staticmethod
+    def read_file(path: str):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def _read_chunks(self, path: str, cursor, filters: dict, chunk_size: int):
+        chunk = []
+        for row in self.read_file(path):
+            if cursor is not None and _sort_key(row) <= tuple(cursor):
+                continue
+            if not _matches(row, filters):
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    async def stream(self, cursor: tuple[int, int] | None = None, chunk_size: int = 1000, **filters):
+        since = filters.get("since")
+        until = filters.get("until")
+        for key in self.months():
+            start = month_key_start(key)
+            end = next_month_start(start)
+            if since is not None and end <= int(since):
+                continue
+            if until is not None and start >= int(until):
+                continue
+            if cursor is not None and end <= int(cursor[0]):
+                continue
+
+            chunks = self._read_chunks(self.path_for(key), cursor, filters, chunk_size)
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+
+    def stats(self) -> dict:
+        months = self.months()
+        return {
+            "directory": self.directory,
+            "months": months,
+            "bytes": sum(os.path.getsize(self.path_for(key)) for key in months),
+        }
+
+
+def _matches(row: dict, filters: dict) -> bool:
+    for column in ("agent_id", "recipient", "status"):
+        if filters.get(column) is not None and row.get(column) != filters[column]:
+            return False
+    if filters.get("since") is not None and int(row["timestamp"]) < int(filters["since"]):
+        return False
+    if filters.get("until") is not None and int(row["timestamp"]) >= int(filters["until"]):
+        return False
+    return True
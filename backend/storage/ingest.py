@@ -0,0 +1,146 @@
+"""
+Group-commit write-behind queue for ledger inserts.
+
+Paid requests submit their ledger row and await a future. A single flusher
+task collects pending rows for at most ``max_delay_ms`` (or until
+``max_batch_rows`` are waiting) and writes them with one multi-row insert, so
+concurrent requests share a commit instead of each paying for their own.
+A request's future only resolves after its batch has committed.
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from fastapi import HTTPException
+
+FlushFn = Callable[[list[dict]], Awaitable[list[int | None]]]
+
+
+class LedgerWriteQueue:
+    def __init__(self, flush: FlushFn, max_batch_rows: int = 256, max_delay_ms: float = 5.0):
+        self._flush = flush
+        self.max_batch_rows = max(1, max_batch_rows)
+        self.max_delay = max(0.0, max_delay_ms) / 1000
+        self._pending: list[tuple[dict, asyncio.Future]] = []
+        self._has_items: asyncio.Event | None = None
+        self._full: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self._commit_listeners: list[Callable[[list[dict]], None]] = []
+
+        self.batches = 0
+        self.rows = 0
+        self.duplicates = 0
+        self.failed_batches = 0
+        self.max_batch_size = 0
+        self.last_batch_size = 0
+        self.last_flush_ms = 0.0
+
+    def add_commit_listener(self, listener: Callable[[list[dict]], None]):
+        """Call ``listener`` with the rows actually inserted, after each batch commits."""
+        self._commit_listeners.append(listener)
+
+    def start(self):
+        if self._task is None:
+            # Events bind to the running loop, so create them here rather than at import time.
+            self._has_items = asyncio.Event()
+            self._full = asyncio.Event()
+            if self._pending:
+                self._has_items.set()
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        # Not cancelled: a flush in progress completes and resolves its futures, then the flusher exits.
+        self._stopping = True
+        self._has_items.set()
+        self._full.set()
+        await task
+        while self._pending:
+            await self._flush_next()
+
+    async def submit(self, payload: dict) -> int:
+        if self._task is None:
+            raise RuntimeError("Ledger write queue is not started")
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((payload, future))
+        self._has_items.set()
+        if len(self._pending) >= self.max_batch_rows:
+            self._full.set()
+        return await future
+
+    async def _run(self):
+        while not self._stopping:
+            await self._has_items.wait()
+            if self._stopping:
+                return
+            if len(self._pending) < self.max_batch_rows and self.max_delay:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            await self._flush_next()
+
+    async def _flush_next(self):
+        batch = self._pending[: self.max_batch_rows]
+        del self._pending[: self.max_batch_rows]
+        if not self._pending:
+            self._has_items.clear()
+        if len(self._pending) < self.max_batch_rows:
+            self._full.clear()
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        try:
+            ids = await self._flush([payload for payload, _ in batch])
+        except Exception as e:
+            self.failed_batches += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
+        self.batches += 1
+        self.rows += len(batch)
+        self.last_batch_size = len(batch)
+        self.max_batch_size = max(self.max_batch_size, len(batch))
+
+        committed = [payload for (payload, _), row_id in zip(batch, ids) if row_id is not None]
+        for listener in self._commit_listeners:
+            try:
+                listener(committed)
+            except Exception as e:
+                print(f"[ledger-queue] commit listener failed: {e}")
+
+        for (_, future), row_id in zip(batch, ids):
+            if row_id is None:
+                self.duplicates += 1
+                if not future.done():
+                    future.set_exception(
+                        HTTPException(status_code=409, detail={"error": "Payment proof has already been used"})
+                    )
+                continue
+            if not future.done():
+                future.set_result(row_id)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": len(self._pending),
+            "batches": self.batches,
+            "rows": self.rows,
+            "duplicates": self.duplicates,
+            "failed_batches": self.failed_batches,
+            "avg_batch_size": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "last_batch_size": self.last_batch_size,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_batch_rows": self.max_batch_rows,
+            "max_delay_ms": self.max_delay * 1000,
+        }
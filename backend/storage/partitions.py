@@ -0,0 +1,213 @@
+"""
+Monthly range partitioning of the Postgres ledger on ``timestamp``.
+
+A partitioned table cannot carry a UNIQUE index on (tx_hash, log_index)
+without the partition key, so replay protection moves to
+``transaction_hashes``: every insert claims its (tx_hash, log_index) there
+first, in the same statement, and only claimed rows reach the ledger. A
+claim is refused if it would book a hash both whole (log_index -1) and by its
+logs. Hashes stay in that table after their partition is archived.
+"""
+
+import os
+import time
+
+from storage.archive import month_key, month_key_start, month_start, next_month_start
+
+PG_PARTITIONING = os.getenv("PG_PARTITIONING", "true").lower() == "true"
+PG_PARTITION_EXISTING = os.getenv("PG_PARTITION_EXISTING", "false").lower() == "true"
+PG_PARTITION_MONTHS_AHEAD = int(os.getenv("PG_PARTITION_MONTHS_AHEAD", "2"))
+
+PARTITION_PREFIX = "transactions_p"
+
+
+def _partitioned_table_sql(name: str) -> str:
+    return f"""
+    CREATE TABLE IF NOT EXISTS {name} (
+        id BIGSERIAL,
+        agent_id TEXT NOT NULL,
+        recipient TEXT NOT NULL,
+        amount_usdc DOUBLE PRECISION NOT NULL,
+        tx_hash TEXT NOT NULL,
+        status TEXT NOT NULL,
+        block_reason TEXT,
+        timestamp BIGINT NOT NULL,
+        created_at TEXT NOT NULL,
+        block_number BIGINT NOT NULL DEFAULT 0,
+        gas_used BIGINT NOT NULL DEFAULT 0,
+        log_index INTEGER NOT NULL DEFAULT -1,
+        PRIMARY KEY (id, timestamp)
+    ) PARTITION BY RANGE (timestamp)
+    """
+
+
+TRANSACTION_HASHES_SQL = """
+CREATE TABLE IF NOT EXISTS transaction_hashes (
+    tx_hash TEXT NOT NULL,
+    timestamp BIGINT NOT NULL,
+    log_index INTEGER NOT NULL DEFAULT -1,
+    PRIMARY KEY (tx_hash, log_index)
+)
+"""
+
+
+def partition_name(key: str) -> str:
+    return f"{PARTITION_PREFIX}{key}"
+
+
+async def table_kind(conn, table: str) -> str | None:
+    # 'p' = partitioned, 'r' = plain table, None = missing
+    kind = await conn.fetchval("SELECT relkind FROM pg_class WHERE oid = to_regclass($1)", table)
+    return kind.decode() if isinstance(kind, bytes) else kind
+
+
+async def create_partitioned_ledger(conn):
+    await conn.execute(_partitioned_table_sql("transactions"))
+    await conn.execute(TRANSACTION_HASHES_SQL)
+    await conn.execute("CREATE TABLE IF NOT EXISTS transactions_default PARTITION OF transactions DEFAULT")
+
+
+# Batch rows were stored as "<tx hash>:<log index>" before log_index existed.
+_SPLIT_LOG_INDEX_SQL = """
+UPDATE {table}
+SET log_index = split_part(tx_hash, ':', 2)::int, tx_hash = split_part(tx_hash, ':', 1)
+WHERE tx_hash LIKE '0x%:%'
+"""
+
+
+async def pg_add_log_index(conn, kind: str):
+    """Key an existing ledger on (tx_hash, log_index) instead of tx_hash alone."""
+    if await conn.fetchval(
+        "SELECT 1 FROM information_schema.columns WHERE table_name = 'transactions' AND column_name = 'log_index'"
+    ):
+        return
+    print("[partitions] adding log_index to transactions")
+    async with conn.transaction():
+        await conn.execute("LOCK TABLE transactions IN ACCESS EXCLUSIVE MODE")
+        await conn.execute("ALTER TABLE transactions ADD COLUMN log_index INTEGER NOT NULL DEFAULT -1")
+        await conn.execute(_SPLIT_LOG_INDEX_SQL.format(table="transactions"))
+        if kind == "r":
+            await conn.execute("ALTER TABLE transactions DROP CONSTRAINT IF EXISTS transactions_tx_hash_key")
+            await conn.execute(
+                "ALTER TABLE transactions ADD CONSTRAINT transactions_tx_hash_log_index_key UNIQUE (tx_hash, log_index)"
+            )
+            return
+        await conn.execute("ALTER TABLE transaction_hashes DROP CONSTRAINT transaction_hashes_pkey")
+        await conn.execute("ALTER TABLE transaction_hashes ADD COLUMN log_index INTEGER NOT NULL DEFAULT -1")
+        await conn.execute(_SPLIT_LOG_INDEX_SQL.format(table="transaction_hashes"))
+        await conn.execute("ALTER TABLE transaction_hashes ADD PRIMARY KEY (tx_hash, log_index)")
+
+
+async def convert_to_partitioned(conn):
+    """Rewrite a plain ``transactions`` table as a partitioned one in a single transaction."""
+    async with conn.transaction():
+        await conn.execute("LOCK TABLE transactions IN ACCESS EXCLUSIVE MODE")
+        bounds = await conn.fetchrow("SELECT MIN(timestamp) AS lo, MAX(timestamp) AS hi FROM transactions")
+
+        await conn.execute(_partitioned_table_sql("transactions_partitioned"))
+        await conn.execute(
+            "CREATE TABLE transactions_partitioned_default PARTITION OF transactions_partitioned DEFAULT"
+        )
+        if bounds["lo"] is not None:
+            start = month_start(bounds["lo"])
+            while start <= bounds["hi"]:
+                end = next_month_start(start)
+                await conn.execute(
+                    f"CREATE TABLE {partition_name(month_key(start))} PARTITION OF transactions_partitioned "
+                    f"FOR VALUES FROM ({start}) TO ({end})"
+                )
+                start = end
+
+        await conn.execute(TRANSACTION_HASHES_SQL)
+        await conn.execute(
+            """
+            INSERT INTO transaction_hashes (tx_hash, timestamp, log_index)
+            SELECT tx_hash, timestamp, log_index FROM transactions
+            ON CONFLICT (tx_hash, log_index) DO NOTHING
+            """
+        )
+        await conn.execute("INSERT INTO transactions_partitioned SELECT * FROM transactions")
+        await conn.execute(
+            """
+            SELECT setval(
+                pg_get_serial_sequence('transactions_partitioned', 'id'),
+                COALESCE((SELECT MAX(id) FROM transactions_partitioned), 1),
+                (SELECT MAX(id) FROM transactions_partitioned) IS NOT NULL
+            )
+            """
+        )
+        await conn.execute("DROP TABLE transactions")
+        await conn.execute("ALTER TABLE transactions_partitioned RENAME TO transactions")
+        await conn.execute("ALTER TABLE transactions_partitioned_default RENAME TO transactions_default")
+
+
+async def ensure_partitions(conn, now: int | None = None, months_ahead: int = PG_PARTITION_MONTHS_AHEAD) -> list[str]:
+    created = []
+    start = month_start(int(now or time.time()))
+    for _ in range(max(0, months_ahead) + 1):
+        end = next_month_start(start)
+        name = partition_name(month_key(start))
+        if await table_kind(conn, name) is None:
+            try:
+                await conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF transactions "
+                    f"FOR VALUES FROM ({start}) TO ({end})"
+                )
+                created.append(name)
+            except Exception as e:
+                # Usually rows for this month already landed in the default partition.
+                print(f"[partitions] could not create {name}: {e}")
+        start = end
+    return created
+
+
+async def split_default_partition(conn, before: int) -> list[str]:
+    """Move whole months older than ``before`` out of the default partition.
+
+    Rows for months without a partition (late or backfilled writes) land in
+    transactions_default; each such month is copied into a standalone table
+    that is then attached as its own partition, so it can be archived.
+    """
+    split = []
+    async with conn.transaction():
+        await conn.execute("LOCK TABLE transactions_default IN EXCLUSIVE MODE")
+        starts = await conn.fetch(
+            "SELECT DISTINCT timestamp - timestamp % 86400 AS day FROM transactions_default WHERE timestamp < $1",
+            before,
+        )
+        months = sorted({month_start(row["day"]) for row in starts})
+        for start in months:
+            end = next_month_start(start)
+            if end > before:
+                continue
+            name = partition_name(month_key(start))
+            await conn.execute(f"CREATE TABLE {name} (LIKE transactions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+            await conn.execute(
+                f"INSERT INTO {name} SELECT * FROM transactions_default WHERE timestamp >= $1 AND timestamp < $2",
+                start,
+                end,
+            )
+            await conn.execute("DELETE FROM transactions_default WHERE timestamp >= $1 AND timestamp < $2", start, end)
+            await conn.execute(f"ALTER TABLE transactions ATTACH PARTITION {name} FOR VALUES FROM ({start}) TO ({end})")
+            split.append(name)
+    return split
+
+
+async def list_month_partitions(conn) -> list[tuple[str, int, int]]:
+    rows = await conn.fetch(
+        """
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'transactions'::regclass
+        ORDER BY c.relname
+        """
+    )
+    partitions = []
+    for row in rows:
+        name = row["relname"]
+        if not name.startswith(PARTITION_PREFIX):
+            continue
+        start = month_key_start(name[len(PARTITION_PREFIX) :])
+        partitions.append((name, start, next_month_start(start)))
+    return partitions
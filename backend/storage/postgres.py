@@ -0,0 +1,169 @@
+"""
+Configurable asyncpg pool for the ledger with per-connection statement
+caching and pool telemetry.
+
+Imported lazily by Database.init, so asyncpg stays optional in SQLite mode.
+"""
+
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+import asyncpg
+
+PG_POOL_MIN_SIZE = int(os.getenv("PG_POOL_MIN_SIZE", "2"))
+PG_POOL_MAX_SIZE = int(os.getenv("PG_POOL_MAX_SIZE", "10"))
+PG_STATEMENT_CACHE_SIZE = int(os.getenv("PG_STATEMENT_CACHE_SIZE", "256"))
+PG_COMMAND_TIMEOUT = float(os.getenv("PG_COMMAND_TIMEOUT", "10"))
+PG_MAX_QUERIES = int(os.getenv("PG_MAX_QUERIES", "50000"))
+PG_MAX_INACTIVE_LIFETIME = float(os.getenv("PG_MAX_INACTIVE_LIFETIME", "300"))
+
+_WAIT_SAMPLES = 1024
+_QPS_WINDOW_SECONDS = 60
+
+
+class PoolTelemetry:
+    def __init__(self):
+        self.acquires = 0
+        self.waiting = 0
+        self.in_use = 0
+        self.queries = 0
+        self._waits: deque = deque(maxlen=_WAIT_SAMPLES)
+        self._query_buckets: deque = deque()
+
+    def record_query(self):
+        self.queries += 1
+        second = int(time.monotonic())
+        if self._query_buckets and self._query_buckets[-1][0] == second:
+            self._query_buckets[-1][1] += 1
+        else:
+            self._query_buckets.append([second, 1])
+        while self._query_buckets and self._query_buckets[0][0] <= second - _QPS_WINDOW_SECONDS:
+            self._query_buckets.popleft()
+
+    def record_wait(self, seconds: float):
+        self.acquires += 1
+        self._waits.append(seconds)
+
+    def queries_per_second(self) -> float:
+        if not self._query_buckets:
+            return 0.0
+        now = int(time.monotonic())
+        recent = sum(count for second, count in self._query_buckets if second > now - _QPS_WINDOW_SECONDS)
+        return recent / _QPS_WINDOW_SECONDS
+
+    def wait_stats(self) -> dict:
+        if not self._waits:
+            return {"avg_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+        waits = sorted(self._waits)
+        return {
+            "avg_ms": round(sum(waits) / len(waits) * 1000, 3),
+            "p95_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 3),
+            "max_ms": round(waits[-1] * 1000, 3),
+        }
+
+
+class LedgerConnection(asyncpg.Connection):
+    """Connection that reports every query it runs to the pool telemetry.
+
+    Hot statements are parsed and prepared once per connection by asyncpg's
+    statement cache (PG_STATEMENT_CACHE_SIZE); later calls only bind and
+    execute the cached server-side statement instead of re-sending the SQL.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._ledger_telemetry: PoolTelemetry | None = None
+
+    def _count_query(self):
+        if self._ledger_telemetry is not None:
+            self._ledger_telemetry.record_query()
+
+    async def execute(self, *args, **kwargs):
+        self._count_query()
+        return await super().execute(*args, **kwargs)
+
+    async def executemany(self, *args, **kwargs):
+        self._count_query()
+        return await super().executemany(*args, **kwargs)
+
+    async def fetch(self, *args, **kwargs):
+        self._count_query()
+        return await super().fetch(*args, **kwargs)
+
+    async def fetchrow(self, *args, **kwargs):
+        self._count_query()
+        return await super().fetchrow(*args, **kwargs)
+
+    async def fetchval(self, *args, **kwargs):
+        self._count_query()
+        return await super().fetchval(*args, **kwargs)
+
+
+class LedgerPool:
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self.min_size = max(0, PG_POOL_MIN_SIZE)
+        self.max_size = max(1, PG_POOL_MAX_SIZE, self.min_size)
+        self.pool: asyncpg.Pool | None = None
+        self.telemetry = PoolTelemetry()
+
+    async def open(self) -> asyncpg.Pool:
+        self.pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            max_queries=PG_MAX_QUERIES,
+            max_inactive_connection_lifetime=PG_MAX_INACTIVE_LIFETIME,
+            statement_cache_size=PG_STATEMENT_CACHE_SIZE,
+            command_timeout=PG_COMMAND_TIMEOUT,
+            connection_class=LedgerConnection,
+            init=self._init_connection,
+        )
+        return self.pool
+
+    async def _init_connection(self, conn: LedgerConnection):
+        conn._ledger_telemetry = self.telemetry
+
+    @asynccontextmanager
+    async def acquire(self):
+        telemetry = self.telemetry
+        started = time.perf_counter()
+        telemetry.waiting += 1
+        try:
+            conn = await self.pool.acquire()
+        finally:
+            telemetry.waiting -= 1
+        telemetry.record_wait(time.perf_counter() - started)
+        telemetry.in_use += 1
+        try:
+            yield conn
+        finally:
+            telemetry.in_use -= 1
+            await self.pool.release(conn)
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    def stats(self) -> dict:
+        telemetry = self.telemetry
+        size = self.pool.get_size() if self.pool is not None else 0
+        idle = self.pool.get_idle_size() if self.pool is not None else 0
+        return {
+            "backend": "postgres",
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "size": size,
+            "idle": idle,
+            "in_use": telemetry.in_use,
+            "waiting": telemetry.waiting,
+            "acquires": telemetry.acquires,
+            "acquire_wait": telemetry.wait_stats(),
+            "queries": telemetry.queries,
+            "queries_per_second": round(telemetry.queries_per_second(), 2),
+            "statement_cache_size": PG_STATEMENT_CACHE_SIZE,
+            "command_timeout": PG_COMMAND_TIMEOUT,
+        }
@@ -0,0 +1,128 @@
+"""
+In-memory index of consumed payment proofs.
+
+Two layers with fixed memory:
+  * a Bloom filter over every tx_hash in the ledger — a miss proves the
+    proof was never used, so the request can skip the existence query and go
+    straight to the atomic insert-or-conflict;
+  * an exact LRU set of the most recently consumed hashes — a hit proves
+    reuse, so the request is rejected with 409 without touching the DB.
+
+A Bloom hit that is not in the recent set is ambiguous (false positive or an
+old hash) and falls back to the database. So does a Bloom miss until the
+index is ``ready``, i.e. warmed with every hash already in the ledger.
+"""
+
+import hashlib
+import math
+import os
+import threading
+from collections import OrderedDict
+
+REPLAY_BLOOM_CAPACITY = int(os.getenv("REPLAY_BLOOM_CAPACITY", "1000000"))
+REPLAY_BLOOM_FP_RATE = float(os.getenv("REPLAY_BLOOM_FP_RATE", "0.001"))
+REPLAY_RECENT_SIZE = int(os.getenv("REPLAY_RECENT_SIZE", "100000"))
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, fp_rate: float):
+        capacity = max(1, capacity)
+        fp_rate = min(max(fp_rate, 1e-9), 0.5)
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+
+    def add(self, key: str):
+        bits = self._bits
+        for pos in self._positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self._bits
+        for pos in self._positions(key):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._bits)
+
+    def estimated_fp_rate(self) -> float:
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+
+class ConsumedProofIndex:
+    def __init__(
+        self,
+        capacity: int = REPLAY_BLOOM_CAPACITY,
+        fp_rate: float = REPLAY_BLOOM_FP_RATE,
+        recent_size: int = REPLAY_RECENT_SIZE,
+    ):
+        self.bloom = BloomFilter(capacity, fp_rate)
+        self.recent_size = max(0, recent_size)
+        self._recent: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Set once the ledger's hashes are loaded; before that a Bloom miss proves nothing.
+        self.ready = False
+
+        self.rejected_fast = 0
+        self.skipped_lookups = 0
+        self.db_fallbacks = 0
+
+    @staticmethod
+    def _key(tx_hash: str) -> str:
+        return tx_hash.lower()
+
+    def add(self, tx_hash: str):
+        key = self._key(tx_hash)
+        with self._lock:
+            self.bloom.add(key)
+            if self.recent_size:
+                self._recent[key] = None
+                self._recent.move_to_end(key)
+                if len(self._recent) > self.recent_size:
+                    self._recent.popitem(last=False)
+
+    def add_many(self, tx_hashes):
+        for tx_hash in tx_hashes:
+            self.add(tx_hash)
+
+    def check(self, tx_hash: str) -> str:
+        """Classify a proof as "consumed", "unseen" or "unknown" (needs a DB check)."""
+        key = self._key(tx_hash)
+        with self._lock:
+            if key in self._recent:
+                self.rejected_fast += 1
+                return "consumed"
+            if self.ready and key not in self.bloom:
+                self.skipped_lookups += 1
+                return "unseen"
+        self.db_fallbacks += 1
+        return "unknown"
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "entries": self.bloom.count,
+            "bloom_capacity": self.bloom.capacity,
+            "bloom_bytes": self.bloom.size_bytes,
+            "bloom_hashes": self.bloom.num_hashes,
+            "estimated_fp_rate": self.bloom.estimated_fp_rate(),
+            "recent_entries": len(self._recent),
+            "recent_size": self.recent_size,
+            "rejected_fast": self.rejected_fast,
+            "skipped_lookups": self.skipped_lookups,
+            "db_fallbacks": self.db_fallbacks,
+        }
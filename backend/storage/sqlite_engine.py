@@ -0,0 +1,164 @@
+"""
+Long-lived SQLite engine for the transaction ledger.
+
+All writes go through a single writer thread that owns the only read-write
+connection, so statements never contend for the write lock. Reads borrow a
+connection from a small pool of read-only connections; with WAL enabled they
+run concurrently with the writer.
+"""
+
+import asyncio
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable
+
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "4"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+_STOP = object()
+
+
+class SQLiteEngine:
+    def __init__(self, path: str, read_pool_size: int = SQLITE_READ_POOL_SIZE):
+        self.path = path
+        self.read_pool_size = max(1, read_pool_size)
+        self._write_queue: "queue.Queue" = queue.Queue()
+        self._read_pool: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._read_conns: list[sqlite3.Connection] = []
+        self._writer: threading.Thread | None = None
+        self._ready = threading.Event()
+        self._start_error: BaseException | None = None
+
+    @property
+    def started(self) -> bool:
+        return self._writer is not None and self._writer.is_alive()
+
+    def _apply_pragmas(self, conn: sqlite3.Connection):
+        conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+
+    def _open_writer(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        # NORMAL is durable across application crashes in WAL mode; only an OS
+        # crash or power loss can drop the most recent commits.
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA wal_autocheckpoint = 1000")
+        self._apply_pragmas(conn)
+        return conn
+
+    def open_reader(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only = ON")
+        self._apply_pragmas(conn)
+        return conn
+
+    def start(self, init: Callable[[sqlite3.Connection], Any] | None = None):
+        if self.started:
+            return
+
+        self._ready.clear()
+        self._start_error = None
+        self._writer = threading.Thread(
+            target=self._writer_loop,
+            args=(init,),
+            name="sqlite-writer",
+            daemon=True,
+        )
+        self._writer.start()
+        self._ready.wait()
+        if self._start_error is not None:
+            self._writer.join()
+            self._writer = None
+            raise self._start_error
+
+        # Reader connections are opened after the writer so the schema and WAL
+        # mode are already in place.
+        for _ in range(self.read_pool_size):
+            conn = self.open_reader()
+            self._read_conns.append(conn)
+            self._read_pool.put(conn)
+
+    def _writer_loop(self, init: Callable[[sqlite3.Connection], Any] | None):
+        try:
+            conn = self._open_writer()
+            if init is not None:
+                self._run_in_transaction(conn, init)
+        except BaseException as e:
+            self._start_error = e
+            self._ready.set()
+            return
+
+        self._ready.set()
+        try:
+            while True:
+                item = self._write_queue.get()
+                if item is _STOP:
+                    break
+                fn, future = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    result = self._run_in_transaction(conn, fn)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        finally:
+            conn.close()
+
+    def _run_in_transaction(self, conn: sqlite3.Connection, fn: Callable[[sqlite3.Connection], Any]):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def submit_write(self, fn: Callable[[sqlite3.Connection], Any]) -> Future:
+        if not self.started:
+            raise RuntimeError("SQLite engine is not started")
+        future: Future = Future()
+        self._write_queue.put((fn, future))
+        return future
+
+    async def write(self, fn: Callable[[sqlite3.Connection], Any]):
+        return await asyncio.wrap_future(self.submit_write(fn))
+
+    def read_sync(self, fn: Callable[[sqlite3.Connection], Any]):
+        conn = self._read_pool.get()
+        try:
+            return fn(conn)
+        finally:
+            self._read_pool.put(conn)
+
+    async def read(self, fn: Callable[[sqlite3.Connection], Any]):
+        return await asyncio.to_thread(self.read_sync, fn)
+
+    def stats(self) -> dict:
+        return {
+            "read_pool_size": self.read_pool_size,
+            "read_pool_idle": self._read_pool.qsize(),
+            "write_queue_depth": self._write_queue.qsize(),
+        }
+
+    def close(self):
+        if self._writer is not None:
+            self._write_queue.put(_STOP)
+            self._writer.join()
+            self._writer = None
+
+        while self._read_conns:
+            self._read_conns.pop().close()
+        while not self._read_pool.empty():
+            self._read_pool.get_nowait()
@@ -4,9 +4,11 @@ pragma solidity 0.8.20;
 import "@openzeppelin/contracts/access/Ownable.sol";
 import "@openzeppelin/contracts/utils/ReentrancyGuard.sol";
 import "@openzeppelin/contracts/token/ERC20/IERC20.sol";
+import "@openzeppelin/contracts/utils/cryptography/ECDSA.sol";
+import "@openzeppelin/contracts/utils/cryptography/EIP712.sol";
 import "./PolicyRegistry.sol";
 
-contract AgentVault is Ownable, ReentrancyGuard {
+contract AgentVault is Ownable, ReentrancyGuard, EIP712 {
     IERC20 public usdcToken;
     PolicyRegistry public policyRegistry;
 
@@ -14,19 +16,64 @@ contract AgentVault is Ownable, ReentrancyGuard {
     mapping(bytes32 => uint256) private dailySpent;
     mapping(bytes32 => uint256) private lastResetDay;
 
+    // Keys besides the owner's that may execute payments, so payments can be signed from
+    // several nonce sequences at once.
+    mapping(address => bool) private operators;
+
+    // Policy and spend state for a run of batch items that share an agent.
+    struct AgentRun {
+        bytes32 agentId;
+        PolicyRegistry.Policy policy;
+        uint256 balance;
+        uint256 spent;
+    }
+
+    // Funds an agent has locked for one recipient, paid out against cumulative EIP-712 vouchers
+    // signed by `signer`. `redeemed` only ever grows, so an old voucher can never pay twice.
+    struct Channel {
+        address signer;
+        uint256 deposited;
+        uint256 redeemed;
+        uint64 expiresAt;
+    }
+
+    mapping(bytes32 => mapping(address => Channel)) private channels;
+
+    bytes32 private constant VOUCHER_TYPEHASH =
+        keccak256("Voucher(bytes32 agentId,address recipient,uint256 cumulativeAmount)");
+
     // Custom errors
     error AgentNotActive();
     error RecipientNotWhitelisted();
     error ExceedsPerTxLimit();
     error ExceedsDailyCap();
     error InsufficientBalance();
+    error BatchLengthMismatch();
+    error ChannelNotOpen();
+    error ChannelSignerMismatch();
+    error ChannelNotExpired();
+    error VoucherAlreadyRedeemed();
+    error VoucherExceedsDeposit();
+    error InvalidVoucherSignature();
+    error NotOperator(address account);
 
     // Events
     event Deposited(bytes32 indexed agentId, uint256 amount);
     event PaymentExecuted(bytes32 indexed agentId, address indexed recipient, uint256 amount, uint256 timestamp);
     event PaymentBlocked(bytes32 indexed agentId, string reason);
+    event ChannelOpened(bytes32 indexed agentId, address indexed recipient, address signer, uint256 amount, uint64 expiresAt);
+    event VoucherRedeemed(bytes32 indexed agentId, address indexed recipient, uint256 cumulativeAmount, uint256 paid);
+    event ChannelClosed(bytes32 indexed agentId, address indexed recipient, uint256 refund);
+    event OperatorUpdated(address indexed operator, bool allowed);
 
-    constructor(address _usdcToken, address _policyRegistry) Ownable(msg.sender) {
+    modifier onlyOperator() {
+        if (!isOperator(msg.sender)) {
+            revert NotOperator(msg.sender);
+        }
+        _;
+    }
+
+    constructor(address _usdcToken, address _policyRegistry) Ownable(msg.sender) EIP712("AgentVault", "1") {
         usdcToken = IERC20(_usdcToken);
         policyRegistry = PolicyRegistry(_policyRegistry);
     }
@@ -38,11 +85,21 @@ contract AgentVault is Ownable, ReentrancyGuard {
         emit Deposited(agentId, amount);
     }
 
+    function setOperator(address operator, bool allowed) external onlyOwner {
+        operators[operator] = allowed;
+
+        emit OperatorUpdated(operator, allowed);
+    }
+
+    function isOperator(address account) public view returns (bool) {
+        return account == owner() || operators[account];
+    }
+
     function executePayment(
         bytes32 agentId,
         address recipient,
         uint256 amount
-    ) external onlyOwner nonReentrant {
+    ) external onlyOperator nonReentrant {
         // Check agent is active
         if (!policyRegistry.isAgentActive(agentId)) {
             revert AgentNotActive();
@@ -87,6 +144,238 @@ contract AgentVault is Ownable, ReentrancyGuard {
         emit PaymentExecuted(agentId, recipient, amount, block.timestamp);
     }
 
+    // Settles many payments in one transaction. Each agent's policy is read once per run
+    // of consecutive items for that agent, and transfers are summed per recipient. An item
+    // that breaks the policy is skipped with PaymentBlocked instead of reverting the batch;
+    // every paid item emits its own PaymentExecuted, as executePayment does.
+    function executeBatchPayment(
+        bytes32[] calldata agentIds,
+        address[] calldata recipients,
+        uint256[] calldata amounts
+    ) external onlyOperator nonReentrant {
+        uint256 count = agentIds.length;
+        if (recipients.length != count || amounts.length != count) {
+            revert BatchLengthMismatch();
+        }
+
+        address[] memory payees = new address[](count);
+        uint256[] memory totals = new uint256[](count);
+        uint256 payeeCount = 0;
+        AgentRun memory run;
+
+        for (uint256 i = 0; i < count; i++) {
+            if (i == 0 || agentIds[i] != run.agentId) {
+                if (i > 0) {
+                    _saveRun(run);
+                }
+                run = _loadRun(agentIds[i]);
+            }
+
+            payeeCount = _payBatchItem(run, payees, totals, payeeCount, recipients[i], amounts[i]);
+        }
+        if (count > 0) {
+            _saveRun(run);
+        }
+
+        for (uint256 j = 0; j < payeeCount; j++) {
+            require(usdcToken.transfer(payees[j], totals[j]), "Transfer failed");
+        }
+    }
+
+    function _loadRun(bytes32 agentId) private returns (AgentRun memory run) {
+        run.agentId = agentId;
+        run.policy = policyRegistry.getPolicy(agentId);
+        run.balance = agentBalances[agentId];
+
+        uint256 currentDay = block.timestamp / 86400;
+        if (currentDay > lastResetDay[agentId]) {
+            lastResetDay[agentId] = currentDay;
+            run.spent = 0;
+        } else {
+            run.spent = dailySpent[agentId];
+        }
+    }
+
+    function _saveRun(AgentRun memory run) private {
+        agentBalances[run.agentId] = run.balance;
+        dailySpent[run.agentId] = run.spent;
+    }
+
+    // Kept out of executeBatchPayment so its loop holds few enough locals for the legacy
+    // code generator's stack limit.
+    function _payBatchItem(
+        AgentRun memory run,
+        address[] memory payees,
+        uint256[] memory totals,
+        uint256 payeeCount,
+        address recipient,
+        uint256 amount
+    ) private returns (uint256) {
+        string memory reason = _checkBatchItem(run, recipient, amount);
+        if (bytes(reason).length != 0) {
+            emit PaymentBlocked(run.agentId, reason);
+            return payeeCount;
+        }
+
+        run.balance -= amount;
+        run.spent += amount;
+
+        emit PaymentExecuted(run.agentId, recipient, amount, block.timestamp);
+        return _addPayee(payees, totals, payeeCount, recipient, amount);
+    }
+
+    function _checkBatchItem(
+        AgentRun memory run,
+        address recipient,
+        uint256 amount
+    ) private pure returns (string memory) {
+        if (!run.policy.isActive) {
+            return "AgentNotActive";
+        }
+
+        bool whitelisted = false;
+        for (uint256 k = 0; k < run.policy.whitelist.length; k++) {
+            if (run.policy.whitelist[k] == recipient) {
+                whitelisted = true;
+                break;
+            }
+        }
+        if (!whitelisted) {
+            return "RecipientNotWhitelisted";
+        }
+
+        if (amount > run.policy.maxPerTx) {
+            return "ExceedsPerTxLimit";
+        }
+        if (run.spent + amount > run.policy.dailyCap) {
+            return "ExceedsDailyCap";
+        }
+        if (run.balance < amount) {
+            return "InsufficientBalance";
+        }
+        return "";
+    }
+
+    function _addPayee(
+        address[] memory payees,
+        uint256[] memory totals,
+        uint256 payeeCount,
+        address recipient,
+        uint256 amount
+    ) private pure returns (uint256) {
+        for (uint256 j = 0; j < payeeCount; j++) {
+            if (payees[j] == recipient) {
+                totals[j] += amount;
+                return payeeCount;
+            }
+        }
+        payees[payeeCount] = recipient;
+        totals[payeeCount] = amount;
+        return payeeCount + 1;
+    }
+
+    // Locks `amount` of the agent's balance for `recipient`. The lock counts against the agent's
+    // daily cap when it is made; vouchers then spend from it without further policy checks.
+    // Opening an existing channel tops it up and can only extend its expiry.
+    function openChannel(
+        bytes32 agentId,
+        address recipient,
+        address signer,
+        uint256 amount,
+        uint64 expiresAt
+    ) external onlyOwner nonReentrant {
+        if (!policyRegistry.isAgentActive(agentId)) {
+            revert AgentNotActive();
+        }
+        if (!policyRegistry.isWhitelisted(agentId, recipient)) {
+            revert RecipientNotWhitelisted();
+        }
+
+        PolicyRegistry.Policy memory policy = policyRegistry.getPolicy(agentId);
+        uint256 currentDay = block.timestamp / 86400;
+        if (currentDay > lastResetDay[agentId]) {
+            dailySpent[agentId] = 0;
+            lastResetDay[agentId] = currentDay;
+        }
+        if (dailySpent[agentId] + amount > policy.dailyCap) {
+            revert ExceedsDailyCap();
+        }
+        if (agentBalances[agentId] < amount) {
+            revert InsufficientBalance();
+        }
+
+        Channel storage channel = channels[agentId][recipient];
+        // The signer can only change once every locked unit has been redeemed or refunded.
+        if (channel.signer != address(0) && channel.signer != signer && channel.deposited != channel.redeemed) {
+            revert ChannelSignerMismatch();
+        }
+
+        agentBalances[agentId] -= amount;
+        dailySpent[agentId] += amount;
+        channel.signer = signer;
+        channel.deposited += amount;
+        if (expiresAt > channel.expiresAt) {
+            channel.expiresAt = expiresAt;
+        }
+
+        emit ChannelOpened(agentId, recipient, signer, amount, channel.expiresAt);
+    }
+
+    // Pays the recipient the difference between a voucher and what was already redeemed.
+    // Anyone may submit a voucher: the funds can only go to the channel's recipient.
+    function redeemVoucher(
+        bytes32 agentId,
+        address recipient,
+        uint256 cumulativeAmount,
+        bytes calldata signature
+    ) external nonReentrant {
+        Channel storage channel = channels[agentId][recipient];
+        if (channel.signer == address(0)) {
+            revert ChannelNotOpen();
+        }
+        if (cumulativeAmount <= channel.redeemed) {
+            revert VoucherAlreadyRedeemed();
+        }
+        if (cumulativeAmount > channel.deposited) {
+            revert VoucherExceedsDeposit();
+        }
+
+        bytes32 digest = _hashTypedDataV4(
+            keccak256(abi.encode(VOUCHER_TYPEHASH, agentId, recipient, cumulativeAmount))
+        );
+        if (ECDSA.recover(digest, signature) != channel.signer) {
+            revert InvalidVoucherSignature();
+        }
+
+        uint256 paid = cumulativeAmount - channel.redeemed;
+        channel.redeemed = cumulativeAmount;
+
+        require(usdcToken.transfer(recipient, paid), "Transfer failed");
+
+        emit VoucherRedeemed(agentId, recipient, cumulativeAmount, paid);
+    }
+
+    // Returns the unredeemed part of an expired channel to the agent's balance.
+    function closeChannel(bytes32 agentId, address recipient) external onlyOwner nonReentrant {
+        Channel storage channel = channels[agentId][recipient];
+        if (channel.signer == address(0)) {
+            revert ChannelNotOpen();
+        }
+        if (block.timestamp < channel.expiresAt) {
+            revert ChannelNotExpired();
+        }
+
+        uint256 refund = channel.deposited - channel.redeemed;
+        channel.deposited = channel.redeemed;
+        agentBalances[agentId] += refund;
+
+        emit ChannelClosed(agentId, recipient, refund);
+    }
+
+    function getChannel(bytes32 agentId, address recipient) external view returns (Channel memory) {
+        return channels[agentId][recipient];
+    }
+
     function getBalance(bytes32 agentId) external view returns (uint256) {
         return agentBalances[agentId];
     }
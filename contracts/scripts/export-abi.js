@@ -0,0 +1,20 @@
+const fs = require("fs");
+const path = require("path");
+const { artifacts } = require("hardhat");
+
+async function main() {
+  // npx hardhat run scripts/export-abi.js  (compiles first, then refreshes the backend's copies)
+  const target = path.join(__dirname, "..", "..", "backend", "sdk", "abi");
+  for (const name of ["AgentVault", "PolicyRegistry"]) {
+    const artifact = await artifacts.readArtifact(name);
+    fs.writeFileSync(path.join(target, `${name}.json`), JSON.stringify(artifact, null, 2) + "\n");
+    console.log(`Wrote ${name}.json (${(artifact.deployedBytecode.length - 2) / 2} bytes deployed)`);
+  }
+}
+
+main()
+  .then(() => process.exit(0))
+  .catch((error) => {
+    console.error(error);
+    process.exit(1);
+  });
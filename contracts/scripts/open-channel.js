@@ -0,0 +1,25 @@
+const { ethers } = require("hardhat");
+const deployed = require("../deployed-addresses.json");
+
+async function main() {
+  const [signer] = await ethers.getSigners();
+  const vault = await ethers.getContractAt("AgentVault", deployed.AgentVault);
+  // Use keccak256 to match Python SDK: Web3.keccak(text=agent_id)
+  const agentId = ethers.keccak256(ethers.toUtf8Bytes("weather_agent"));
+  const recipient = "0x61254AEcF84eEdb890f07dD29f7F3cd3b8Eb2CBe";
+  const amount = ethers.parseUnits("1", 6);
+  // Vouchers are signed by the SDK's PRIVATE_KEY, the same key as this signer.
+  const expiresAt = Math.floor(Date.now() / 1000) + 7 * 86400;
+
+  console.log("Agent ID (bytes32):", agentId);
+  console.log("Opening payment channel...");
+  const tx = await vault.openChannel(agentId, recipient, signer.address, amount, expiresAt);
+  await tx.wait();
+  console.log("Channel opened:", tx.hash);
+
+  const channel = await vault.getChannel(agentId, recipient);
+  console.log("Deposited:", ethers.formatUnits(channel.deposited, 6), "USDC");
+  console.log("Expires at:", new Date(Number(channel.expiresAt) * 1000).toISOString());
+}
+
+main().catch(console.error);
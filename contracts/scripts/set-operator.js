@@ -0,0 +1,20 @@
+const { ethers } = require("hardhat");
+const deployed = require("../deployed-addresses.json");
+
+async function main() {
+  // OPERATOR=0x... npx hardhat run scripts/set-operator.js --network amoy  (ALLOWED=false to remove)
+  const operator = process.env.OPERATOR;
+  const allowed = process.env.ALLOWED !== "false";
+  if (!operator) {
+    throw new Error("Set OPERATOR to the signer address to allow or remove");
+  }
+  const vault = await ethers.getContractAt("AgentVault", deployed.AgentVault);
+
+  console.log(`${allowed ? "Allowing" : "Removing"} operator ${operator}...`);
+  const tx = await vault.setOperator(operator, allowed);
+  await tx.wait();
+  console.log("Operator updated:", tx.hash);
+  console.log("isOperator:", await vault.isOperator(operator));
+}
+
+main().catch(console.error);
@@ -1,5 +1,6 @@
 const { expect } = require("chai");
 const { ethers } = require("hardhat");
+const { time } = require("@nomicfoundation/hardhat-network-helpers");
 
 describe("AgentPay Smart Contracts", function () {
   let mockUSDC;
@@ -284,4 +285,291 @@ describe("AgentPay Smart Contracts", function () {
       expect(await agentVault.getDailySpent(agentId)).to.equal(payment);
     });
   });
+  describe("AgentVault - executeBatchPayment", function () {
+    let otherRecipient;
+
+    beforeEach(async function () {
+      otherRecipient = agentOperator;
+
+      const maxPerTx = ethers.parseUnits("100", 6);
+      const dailyCap = ethers.parseUnits("5000", 6);
+      const whitelist = [recipient.address, otherRecipient.address];
+      await policyRegistry.registerAgent(agentId, maxPerTx, dailyCap, whitelist);
+
+      const depositAmount = ethers.parseUnits("5000", 6);
+      await mockUSDC.approve(await agentVault.getAddress(), depositAmount);
+      await agentVault.deposit(agentId, depositAmount);
+    });
+
+    it("should emit one PaymentExecuted per item and sum transfers per recipient", async function () {
+      const amount = ethers.parseUnits("10", 6);
+      const tx = await agentVault.executeBatchPayment(
+        [agentId, agentId, agentId],
+        [recipient.address, otherRecipient.address, recipient.address],
+        [amount, amount, amount]
+      );
+      const receipt = await tx.wait();
+
+      const executed = receipt.logs
+        .map(log => agentVault.interface.parseLog(log))
+        .filter(event => event && event.name === "PaymentExecuted");
+      expect(executed.length).to.equal(3);
+      expect(executed[1].args.recipient).to.equal(otherRecipient.address);
+
+      expect(await mockUSDC.balanceOf(recipient.address)).to.equal(amount * 2n);
+      expect(await mockUSDC.balanceOf(otherRecipient.address)).to.equal(amount);
+      expect(await agentVault.getBalance(agentId)).to.equal(ethers.parseUnits("4970", 6));
+      expect(await agentVault.getDailySpent(agentId)).to.equal(amount * 3n);
+    });
+
+    it("should skip an item that breaks the policy and pay the rest", async function () {
+      const amount = ethers.parseUnits("10", 6);
+      const tooLarge = ethers.parseUnits("150", 6);
+
+      await expect(
+        agentVault.executeBatchPayment(
+          [agentId, agentId, agentId],
+          [recipient.address, recipient.address, unauthorized.address],
+          [amount, tooLarge, amount]
+        )
+      )
+        .to.emit(agentVault, "PaymentBlocked")
+        .withArgs(agentId, "ExceedsPerTxLimit");
+
+      expect(await mockUSDC.balanceOf(recipient.address)).to.equal(amount);
+      expect(await mockUSDC.balanceOf(unauthorized.address)).to.equal(0);
+      expect(await agentVault.getDailySpent(agentId)).to.equal(amount);
+    });
+
+    it("should revert with BatchLengthMismatch when arrays differ in length", async function () {
+      await expect(
+        agentVault.executeBatchPayment([agentId], [recipient.address, recipient.address], [1])
+      ).to.be.revertedWithCustomError(agentVault, "BatchLengthMismatch");
+    });
+
+    it("should revert if a non-operator calls executeBatchPayment", async function () {
+      await expect(
+        agentVault.connect(unauthorized).executeBatchPayment([agentId], [recipient.address], [1])
+      )
+        .to.be.revertedWithCustomError(agentVault, "NotOperator")
+        .withArgs(unauthorized.address);
+    });
+
+    it("should use less gas than the same payments sent one by one", async function () {
+      const n = 20;
+      const amount = ethers.parseUnits("0.001", 6);
+
+      let singleGas = 0n;
+      for (let i = 0; i < n; i++) {
+        const tx = await agentVault.executePayment(agentId, recipient.address, amount);
+        singleGas += (await tx.wait()).gasUsed;
+      }
+
+      const tx = await agentVault.executeBatchPayment(
+        Array(n).fill(agentId),
+        Array(n).fill(recipient.address),
+        Array(n).fill(amount)
+      );
+      const batchGas = (await tx.wait()).gasUsed;
+
+      console.log(
+        `      gas for ${n} payments: ${singleGas} one by one, ${batchGas} batched ` +
+          `(${(Number(batchGas) / n).toFixed(0)} per item, ${(100 - (Number(batchGas) * 100) / Number(singleGas)).toFixed(0)}% saved)`
+      );
+      expect(batchGas).to.be.lessThan(singleGas / 2n);
+    });
+  });
+  describe("AgentVault - operators", function () {
+    beforeEach(async function () {
+      const maxPerTx = ethers.parseUnits("100", 6);
+      const dailyCap = ethers.parseUnits("500", 6);
+      await policyRegistry.registerAgent(agentId, maxPerTx, dailyCap, [recipient.address]);
+
+      const depositAmount = ethers.parseUnits("1000", 6);
+      await mockUSDC.approve(await agentVault.getAddress(), depositAmount);
+      await agentVault.deposit(agentId, depositAmount);
+    });
+
+    it("should let an operator execute payments", async function () {
+      const amount = ethers.parseUnits("10", 6);
+      await expect(agentVault.setOperator(agentOperator.address, true))
+        .to.emit(agentVault, "OperatorUpdated")
+        .withArgs(agentOperator.address, true);
+
+      expect(await agentVault.isOperator(agentOperator.address)).to.equal(true);
+      expect(await agentVault.isOperator(owner.address)).to.equal(true);
+      await expect(agentVault.connect(agentOperator).executePayment(agentId, recipient.address, amount))
+        .to.emit(agentVault, "PaymentExecuted");
+      await expect(
+        agentVault.connect(agentOperator).executeBatchPayment([agentId], [recipient.address], [amount])
+      ).to.emit(agentVault, "PaymentExecuted");
+      expect(await mockUSDC.balanceOf(recipient.address)).to.equal(amount * 2n);
+    });
+
+    it("should revert with NotOperator once an operator is removed", async function () {
+      await agentVault.setOperator(agentOperator.address, true);
+      await agentVault.setOperator(agentOperator.address, false);
+
+      await expect(
+        agentVault.connect(agentOperator).executePayment(agentId, recipient.address, 1)
+      )
+        .to.be.revertedWithCustomError(agentVault, "NotOperator")
+        .withArgs(agentOperator.address);
+    });
+
+    it("should only let the owner manage operators", async function () {
+      await expect(
+        agentVault.connect(unauthorized).setOperator(unauthorized.address, true)
+      ).to.be.revertedWithCustomError(agentVault, "OwnableUnauthorizedAccount");
+    });
+
+    it("should keep channels owner only", async function () {
+      await agentVault.setOperator(agentOperator.address, true);
+      const expiresAt = (await time.latest()) + 86400;
+
+      await expect(
+        agentVault
+          .connect(agentOperator)
+          .openChannel(agentId, recipient.address, agentOperator.address, 1, expiresAt)
+      ).to.be.revertedWithCustomError(agentVault, "OwnableUnauthorizedAccount");
+    });
+  });
+
+  describe("AgentVault - payment channels", function () {
+    const voucherTypes = {
+      Voucher: [
+        { name: "agentId", type: "bytes32" },
+        { name: "recipient", type: "address" },
+        { name: "cumulativeAmount", type: "uint256" },
+      ],
+    };
+    let domain;
+    let expiresAt;
+
+    async function signVoucher(signer, cumulativeAmount) {
+      return signer.signTypedData(domain, voucherTypes, {
+        agentId,
+        recipient: recipient.address,
+        cumulativeAmount,
+      });
+    }
+
+    beforeEach(async function () {
+      const maxPerTx = ethers.parseUnits("100", 6);
+      const dailyCap = ethers.parseUnits("500", 6);
+      await policyRegistry.registerAgent(agentId, maxPerTx, dailyCap, [recipient.address]);
+
+      const depositAmount = ethers.parseUnits("1000", 6);
+      await mockUSDC.approve(await agentVault.getAddress(), depositAmount);
+      await agentVault.deposit(agentId, depositAmount);
+
+      domain = {
+        name: "AgentVault",
+        version: "1",
+        chainId: (await ethers.provider.getNetwork()).chainId,
+        verifyingContract: await agentVault.getAddress(),
+      };
+      expiresAt = (await time.latest()) + 3600;
+      await agentVault.openChannel(
+        agentId,
+        recipient.address,
+        agentOperator.address,
+        ethers.parseUnits("10", 6),
+        expiresAt
+      );
+    });
+
+    it("should lock the channel deposit against balance and daily cap", async function () {
+      const channel = await agentVault.getChannel(agentId, recipient.address);
+      expect(channel.signer).to.equal(agentOperator.address);
+      expect(channel.deposited).to.equal(ethers.parseUnits("10", 6));
+      expect(await agentVault.getBalance(agentId)).to.equal(ethers.parseUnits("990", 6));
+      expect(await agentVault.getDailySpent(agentId)).to.equal(ethers.parseUnits("10", 6));
+    });
+
+    it("should pay only the difference for each newer voucher", async function () {
+      const first = ethers.parseUnits("1", 6);
+      const second = ethers.parseUnits("2.5", 6);
+
+      await expect(agentVault.redeemVoucher(agentId, recipient.address, first, await signVoucher(agentOperator, first)))
+        .to.emit(agentVault, "VoucherRedeemed")
+        .withArgs(agentId, recipient.address, first, first);
+      // Anyone may redeem; the funds can only reach the channel's recipient.
+      await agentVault
+        .connect(unauthorized)
+        .redeemVoucher(agentId, recipient.address, second, await signVoucher(agentOperator, second));
+
+      expect(await mockUSDC.balanceOf(recipient.address)).to.equal(second);
+      expect((await agentVault.getChannel(agentId, recipient.address)).redeemed).to.equal(second);
+    });
+
+    it("should reject an old voucher once a newer one is redeemed", async function () {
+      const first = ethers.parseUnits("1", 6);
+      const second = ethers.parseUnits("2", 6);
+      const firstSignature = await signVoucher(agentOperator, first);
+      await agentVault.redeemVoucher(agentId, recipient.address, second, await signVoucher(agentOperator, second));
+
+      await expect(
+        agentVault.redeemVoucher(agentId, recipient.address, first, firstSignature)
+      ).to.be.revertedWithCustomError(agentVault, "VoucherAlreadyRedeemed");
+    });
+
+    it("should reject a voucher from another signer", async function () {
+      const amount = ethers.parseUnits("1", 6);
+      await expect(
+        agentVault.redeemVoucher(agentId, recipient.address, amount, await signVoucher(unauthorized, amount))
+      ).to.be.revertedWithCustomError(agentVault, "InvalidVoucherSignature");
+    });
+
+    it("should reject a voucher above the channel deposit", async function () {
+      const amount = ethers.parseUnits("11", 6);
+      await expect(
+        agentVault.redeemVoucher(agentId, recipient.address, amount, await signVoucher(agentOperator, amount))
+      ).to.be.revertedWithCustomError(agentVault, "VoucherExceedsDeposit");
+    });
+
+    it("should refund the unredeemed deposit only after expiry", async function () {
+      const amount = ethers.parseUnits("4", 6);
+      await agentVault.redeemVoucher(agentId, recipient.address, amount, await signVoucher(agentOperator, amount));
+
+      await expect(agentVault.closeChannel(agentId, recipient.address)).to.be.revertedWithCustomError(
+        agentVault,
+        "ChannelNotExpired"
+      );
+
+      await time.increaseTo(expiresAt);
+      await expect(agentVault.closeChannel(agentId, recipient.address))
+        .to.emit(agentVault, "ChannelClosed")
+        .withArgs(agentId, recipient.address, ethers.parseUnits("6", 6));
+      expect(await agentVault.getBalance(agentId)).to.equal(ethers.parseUnits("996", 6));
+
+      const later = ethers.parseUnits("5", 6);
+      await expect(
+        agentVault.redeemVoucher(agentId, recipient.address, later, await signVoucher(agentOperator, later))
+      ).to.be.revertedWithCustomError(agentVault, "VoucherExceedsDeposit");
+    });
+
+    it("should settle many calls in one redemption for less gas than per-call payments", async function () {
+      const calls = 50;
+      const price = ethers.parseUnits("0.001", 6);
+
+      let paymentGas = 0n;
+      for (let i = 0; i < calls; i++) {
+        const tx = await agentVault.executePayment(agentId, recipient.address, price);
+        paymentGas += (await tx.wait()).gasUsed;
+      }
+
+      const cumulative = price * BigInt(calls);
+      const tx = await agentVault.redeemVoucher(
+        agentId,
+        recipient.address,
+        cumulative,
+        await signVoucher(agentOperator, cumulative)
+      );
+      const voucherGas = (await tx.wait()).gasUsed;
+
+      console.log(`      gas for ${calls} paid calls: ${paymentGas} as payments, ${voucherGas} as one voucher redemption`);
+      expect(voucherGas * 10n).to.be.lessThan(paymentGas);
+    });
+  });
 });
@@ -42,6 +42,7 @@ interface Transaction {
   amount_usdc: number;
   tx_hash: string;
   status: string;
+  block_reason?: string | null;
   timestamp: number;
   tx_url?: string;
   block_number?: number;
@@ -229,7 +230,17 @@ export default function Dashboard() {
         const err = await res.json().catch(() => ({}));
         throw new Error(err?.error || 'Demo execution failed');
       }
-      await res.json();
+      const job = await res.json();
+      // The payment is broadcast; the backend records it once the receipt tracker sees it mined.
+      let status = job.status;
+      while (status === 'pending') {
+        await new Promise(resolve => setTimeout(resolve, 2000));
+        const current = await fetch(`${process.env.NEXT_PUBLIC_BACKEND_URL}${job.status_url}`).then(r => r.json());
+        status = current.status;
+        if (status === 'failed') {
+          throw new Error(current.error || 'Payment failed on chain');
+        }
+      }
       fetchExecutions();
       startPolling();
     } catch (err: unknown) {
@@ -514,7 +525,14 @@ export default function Dashboard() {
                       </a>
                     </td>
                     <td className="p-4">
-                      {tx.block_number ? (
+                      {['reverted', 'reorged', 'dropped'].includes(tx.status) ? (
+                        <span
+                          className="px-2 py-1 rounded text-xs bg-red-500/20 text-red-300"
+                          title={tx.block_reason ?? undefined}
+                        >
+                          {tx.status.charAt(0).toUpperCase() + tx.status.slice(1)}
+                        </span>
+                      ) : tx.status !== 'pending' && tx.block_number ? (
                         <span className="px-2 py-1 rounded text-xs bg-emerald-500/20 text-emerald-300">
                           Confirmed
                         </span>
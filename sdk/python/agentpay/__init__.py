@@ -7,7 +7,13 @@ class AgentPayClient:
         self.agent_id = agent_id
 
     def execute_payment(self, amount: float, recipient: str) -> dict:
-        resp = requests.post(f"{self.backend_url}/execute-demo", timeout=180)
+        # Returns a pending job as soon as the payment is broadcast.
+        resp = requests.post(f"{self.backend_url}/execute-demo", timeout=30)
+        resp.raise_for_status()
+        return resp.json()
+
+    def get_execution_job(self, job_id: str) -> dict:
+        resp = requests.get(f"{self.backend_url}/execute-demo/{job_id}", timeout=30)
         resp.raise_for_status()
         return resp.json()
 